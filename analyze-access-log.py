@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2017 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 3 (GPLv3). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv3
+# along with this software; if not, see
+# https://www.gnu.org/licenses/gpl-3.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv3. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+
+"""
+Correlation of access log of candlepin with results of performance test.
+Requests of the access log are mapped to API labels of results files and
+elapsed times measured by JMeter are decomposed to time of processing in
+candlepin and the rest (network, queueing in Tomcat and in JMeter).
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import logging
+import sys
+
+from jtl_access_log import DURATION_UNITS, LabelMatcher, aggregate_access_log, merge_groups, merged_stats, \
+    decompose_latency
+from jtl_compression import missing_module, open_input, open_output
+from jtl_stats import PERCENTILES, percentile_key, aggregate_files
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)-7s %(message)s")
+logger = logging.getLogger('analyze-access-log')
+
+
+def parse_options():
+    parser = argparse.ArgumentParser(description="Decompose latency of API calls to server and client side")
+    parser.add_argument("access_log",
+                        help="Access log of candlepin (plain or compressed)")
+    parser.add_argument("results_files", nargs="+",
+                        help="Results files of performance test (plain or compressed)")
+    parser.add_argument("--context", default="/candlepin", dest="context",
+                        help="Context path of candlepin removed from requested paths (default: /candlepin)")
+    parser.add_argument("--duration-unit", default="ms", choices=sorted(DURATION_UNITS), dest="duration_unit",
+                        help="Unit of time of processing of request, the last field of access log "
+                             "(default: ms, %%D of Tomcat 7 - 9)")
+    parser.add_argument("--window", default=10, type=float, dest="window",
+                        help="Length of time window, in which client and server times are joined, "
+                             "in seconds (default: 10)")
+    parser.add_argument("--clock-offset", default=0, type=float, dest="clock_offset",
+                        help="Seconds added to times of access log, when clocks of candlepin and "
+                             "JMeter differ (default: 0)")
+    parser.add_argument("-j", "--jobs", default=1, type=int, dest="jobs",
+                        help="Number of processes used for parsing of results files (default: 1)")
+    parser.add_argument("-o", "--output", default=None, dest="output",
+                        help="Write results with time windows to JSON file")
+    options = parser.parse_args()
+    if options.window <= 0:
+        parser.error("Length of time window has to be positive number.")
+    if options.jobs < 1:
+        parser.error("Number of jobs has to be positive number.")
+    return options
+
+
+def format_report(decompositions):
+    """
+    Format table of joined client and server times of all groups of labels
+    :param decompositions: dictionary group -> result of decompose_latency()
+    :return: text of report
+    """
+    keys = [percentile_key(percent) for percent in PERCENTILES if percent in (50, 95, 99)]
+    output_txt = "client avg, server avg, other avg (server %), {0} client (server), calls client (server), " \
+                 "API\n".format(", ".join(keys))
+    for group, result in sorted(decompositions.items()):
+        joined = result['joined']
+        if joined is None:
+            output_txt += "??, ??, ??, {0}, {1} ({2}), {3}\n".format(
+                ", ".join("??" for _ in keys),
+                result['client']['count'] if result['client'] else 0,
+                result['server']['count'] if result['server'] else 0,
+                group)
+            continue
+        client, server = joined['client'], joined['server']
+        output_txt += "{0}ms, {1}ms, {2}ms ({3}%), {4}, {5} ({6}), {7}\n".format(
+            client['average'], server['average'], joined['overhead_average'], joined['server_%'],
+            ", ".join("{0}ms ({1}ms)".format(client[key], server[key]) for key in keys),
+            client['count'], server['count'], group)
+    return output_txt
+
+
+def main():
+    options = parse_options()
+    missing = missing_module([options.access_log] + options.results_files)
+    if missing is not None:
+        logger.error("Reading of compressed file %s requires module %s" % missing)
+        sys.exit(1)
+    window = int(options.window * 1000)
+
+    client_stats, _ = aggregate_files(options.results_files, jobs=options.jobs, window=window)
+    matcher = LabelMatcher(client_stats.keys(), context=options.context)
+    with open_input(options.access_log) as access_log:
+        server_stats, summary = aggregate_access_log(access_log, matcher, window,
+                                                     duration_unit=options.duration_unit,
+                                                     clock_offset=int(options.clock_offset * 1000))
+    logger.info("Requests of access log: %d matched, %d not matched to any API label, %d invalid lines" % (
+        summary['matched'], summary['unmatched'], summary['invalid']))
+    for example in summary['unmatched_examples']:
+        logger.debug("Not matched request: %s" % example)
+
+    # API labels without requests in access log are reported too
+    decompositions = {}
+    for group, (labels, server_groups) in merge_groups(matcher.groups, client_stats.keys()).items():
+        decompositions[group] = decompose_latency(merged_stats(client_stats, labels, window),
+                                                  merged_stats(server_stats, server_groups, window), window)
+        decompositions[group]['labels'] = labels
+
+    print(format_report(decompositions), end="")
+    if options.output:
+        with open_output(options.output) as output_file:
+            json.dump({'summary': summary, 'labels': decompositions}, output_file, sort_keys=True, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2017 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 3 (GPLv3). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv3
+# along with this software; if not, see
+# https://www.gnu.org/licenses/gpl-3.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv3. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+
+"""
+Benchmark of import time and startup latency of parse-jtl.py. Every mode
+of parse-jtl.py is run several times on small generated results file and
+the script fails, when a mode is slower than allowed or when it imports
+numpy or matplotlib, which are not needed by the mode.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+PARSE_JTL = os.path.join(REPO_DIR, 'parse-jtl.py')
+
+# Modules with long import time, which are imported only when they are needed
+HEAVY_MODULES = ('numpy', 'matplotlib')
+
+# Modules of which import time is measured
+IMPORTED_MODULES = ('jtl_stats', 'jtl_columns', 'jtl_report', 'numpy', 'matplotlib')
+
+JTL_HEADER = "timeStamp,elapsed,label,responseCode,responseMessage,threadName,dataType,success," \
+             "failureMessage,bytes,sentBytes,grpThreads,allThreads,Latency,IdleTime,Connect\n"
+JTL_LABELS = ("GET consumers/{uuid}", "POST consumers/{uuid}/entitlements", "GET owners/{ownerkey}/consumers")
+
+# Run script with arguments and write heavy modules imported by the script to file
+MODULES_CHECK = """
+import json, runpy, sys
+sys.argv = sys.argv[1:]
+try:
+    runpy.run_path(sys.argv[0], run_name='__main__')
+except SystemExit:
+    pass
+with open(%r, 'w') as modules_file:
+    json.dump(sorted(set(name.split('.')[0] for name in sys.modules) & set(%r)), modules_file)
+"""
+
+IMPORT_TIME = """
+import time
+start = time.time()
+import %s
+print(time.time() - start)
+"""
+
+
+def parse_options():
+    parser = argparse.ArgumentParser(description="Benchmark of startup latency of parse-jtl.py")
+    parser.add_argument("--python", default=sys.executable, dest="python",
+                        help="Python interpreter used for running parse-jtl.py (default: current one)")
+    parser.add_argument("--repeat", type=int, default=5, dest="repeat",
+                        help="Number of runs of every mode (default: 5)")
+    parser.add_argument("--rows", type=int, default=10000, dest="rows",
+                        help="Number of rows of generated results file (default: 10000)")
+    parser.add_argument("--max-ms", type=float, default=None, dest="max_ms",
+                        help="Fail, when median run time of any mode is longer than this limit")
+    parser.add_argument("-o", "--output", default=None, dest="output",
+                        help="Write report to JSON file")
+    return parser.parse_args()
+
+
+def write_jtl(filename, rows, seed=1):
+    """
+    Write results file with random samples of several API calls
+    :param filename: name of JTL file
+    :param rows: number of samples
+    :param seed: seed of random generator, the same seed gives the same file
+    :return: None
+    """
+    generator = random.Random(seed)
+    timestamp = 1500000000000
+    with open(filename, 'w') as jtl_file:
+        jtl_file.write(JTL_HEADER)
+        for _ in range(rows):
+            elapsed = int(generator.lognormvariate(5, 1))
+            success = generator.random() > 0.01
+            timestamp += generator.randint(0, 20)
+            jtl_file.write('%d,%d,%s,%s,%s,Thread Group 1-%d,text,%s,,100,50,10,10,%d,0,1\n' % (
+                timestamp, elapsed, generator.choice(JTL_LABELS), "200" if success else "500",
+                "OK" if success else "Internal Server Error", generator.randint(1, 10),
+                "true" if success else "false", elapsed))
+
+
+def run_times(python, args, repeat):
+    """
+    Run parse-jtl.py repeatedly and measure wall time of every run
+    :return: list of times in miliseconds
+    """
+    times = []
+    with open(os.devnull, 'w') as devnull:
+        for _ in range(repeat):
+            start = time.time()
+            subprocess.call([python, PARSE_JTL] + args, stdout=devnull, stderr=devnull, cwd=REPO_DIR)
+            times.append((time.time() - start) * 1000.0)
+    return times
+
+
+def imported_heavy_modules(python, args, work_dir):
+    """
+    Run parse-jtl.py once and find out which heavy modules it imported
+    :return: list of names of modules
+    """
+    modules_filename = os.path.join(work_dir, 'modules.json')
+    with open(os.devnull, 'w') as devnull:
+        subprocess.call([python, '-c', MODULES_CHECK % (modules_filename, HEAVY_MODULES), PARSE_JTL] + args,
+                        stdout=devnull, stderr=devnull, cwd=REPO_DIR)
+    with open(modules_filename, 'r') as modules_file:
+        return json.load(modules_file)
+
+
+def import_time(python, module):
+    """
+    Measure import time of module in new interpreter
+    :return: time in miliseconds or None, when the module can not be imported
+    """
+    with open(os.devnull, 'w') as devnull:
+        try:
+            output = subprocess.check_output([python, '-c', IMPORT_TIME % module], stderr=devnull, cwd=REPO_DIR)
+        except subprocess.CalledProcessError:
+            return None
+    return round(float(output.decode('ascii').strip()) * 1000.0, 1)
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def main():
+    options = parse_options()
+    work_dir = tempfile.mkdtemp(prefix='benchmark-startup-')
+    try:
+        jtl_filename = os.path.join(work_dir, 'results.jtl')
+        baseline_filename = os.path.join(work_dir, 'baseline.dict')
+        expected_filename = os.path.join(work_dir, 'expected.dict')
+        write_jtl(jtl_filename, options.rows)
+        with open(baseline_filename, 'w') as baseline_file:
+            subprocess.check_call([options.python, PARSE_JTL, '-p', '--no-cache', jtl_filename],
+                                  stdout=baseline_file, cwd=REPO_DIR)
+        expected = dict((label, {'required_success': 0.0, 'allowed_deviance': 100.0}) for label in JTL_LABELS)
+        with open(expected_filename, 'w') as expected_file:
+            json.dump(expected, expected_file)
+
+        modes = [
+            ('help', ['--help']),
+            ('parse', ['-p', jtl_filename]),
+            ('pretty-print', ['--pretty-print', '--no-colors', jtl_filename, '-b', baseline_filename]),
+            ('compare', ['-c', '--no-colors', jtl_filename, '-b', baseline_filename, '-e', expected_filename]),
+        ]
+        report = {'python': options.python, 'rows': options.rows, 'modes': {}, 'imports': {}}
+        failures = []
+        for name, args in modes:
+            times = run_times(options.python, args, options.repeat)
+            heavy_modules = imported_heavy_modules(options.python, args, work_dir)
+            report['modes'][name] = {
+                'median_ms': round(median(times), 1),
+                'min_ms': round(min(times), 1),
+                'heavy_modules': heavy_modules,
+            }
+            print("{0:<14} median {1:8.1f}ms, min {2:8.1f}ms, heavy modules: {3}".format(
+                name, median(times), min(times), ", ".join(heavy_modules) or "none"))
+            if heavy_modules:
+                failures.append("Mode {0} imports {1}".format(name, ", ".join(heavy_modules)))
+            if options.max_ms is not None and median(times) > options.max_ms:
+                failures.append("Mode {0} takes {1:.1f}ms, limit is {2}ms".format(name, median(times), options.max_ms))
+
+        for module in IMPORTED_MODULES:
+            report['imports'][module] = import_time(options.python, module)
+            print("import {0:<12} {1}".format(
+                module, "not installed" if report['imports'][module] is None
+                else "{0:.1f}ms".format(report['imports'][module])))
+    finally:
+        shutil.rmtree(work_dir)
+
+    report['failures'] = failures
+    if options.output:
+        with open(options.output, 'w') as output_file:
+            json.dump(report, output_file, sort_keys=True, indent=2)
+    for failure in failures:
+        print(failure)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
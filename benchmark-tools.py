@@ -0,0 +1,398 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2017 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 3 (GPLv3). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv3
+# along with this software; if not, see
+# https://www.gnu.org/licenses/gpl-3.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv3. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+
+"""
+Benchmark suite of the analysis tools. Seeded synthetic results files are
+generated for every size with the same API labels, mix of API calls,
+average elapsed times and success rates as the shape file (baseline of
+candlepin-throughput test by default) together with history of results
+(directory of parsed results and SQLite history). Every phase (parsing
+with all backends, histograms, comparison, estimations) is run in its own
+process and its wall time, CPU time and peak RSS are written to JSON report.
+The report can be compared with report of previous run.
+
+Generated corpora are the same for the same seed, size and shape file,
+thus they are kept in --corpus-dir and reused by following runs.
+"""
+
+from __future__ import print_function
+
+import argparse
+import bisect
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from jtl_history import ResultsHistory
+from jtl_stats import PERCENTILES, percentile_key, module_available, significant
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+PARSE_JTL = os.path.join(REPO_DIR, 'parse-jtl.py')
+PARAM_ESTIMATOR = os.path.join(REPO_DIR, 'param_estimator.py')
+DEFAULT_SHAPE = os.path.join(REPO_DIR, 'candlepin-throughput', 'baseline', '2.3-baseline.json')
+
+JTL_HEADER = "timeStamp,elapsed,label,responseCode,responseMessage,threadName,dataType,success," \
+             "failureMessage,bytes,sentBytes,grpThreads,allThreads,Latency,IdleTime,Connect\n"
+
+# Standard deviation of logarithm of elapsed times of synthetic samples
+ELAPSED_SIGMA = 1.0
+
+# Relative standard deviation of results of runs in generated history of results
+RUN_DEVIANCE = 0.05
+
+WRITE_CHUNK_ROWS = 100000
+
+PHASES = ('parse-python', 'parse-numpy', 'parse-parallel', 'cache-write', 'cache-read', 'histograms', 'compare',
+          'estimate-baseline', 'estimate-deviances', 'estimate-history')
+
+
+def parse_size(text):
+    """Convert size with optional suffix k or M (e.g. 10M) to number"""
+    multipliers = {'k': 1000, 'K': 1000, 'm': 1000 * 1000, 'M': 1000 * 1000}
+    if text[-1] in multipliers:
+        return int(float(text[:-1]) * multipliers[text[-1]])
+    return int(text)
+
+
+def parse_options():
+    parser = argparse.ArgumentParser(description="Benchmark suite of parse-jtl.py and param_estimator.py")
+    parser.add_argument("--sizes", default="1M,10M,100M", dest="sizes",
+                        help="Comma separated numbers of rows of generated results files (default: 1M,10M,100M)")
+    parser.add_argument("--seed", type=int, default=1, dest="seed",
+                        help="Seed of generated results files and history (default: 1)")
+    parser.add_argument("--shape", default=DEFAULT_SHAPE, dest="shape",
+                        help="Baseline with API labels, counts, averages and success rates of generated "
+                             "samples (default: baseline of candlepin-throughput 2.3)")
+    parser.add_argument("--runs", type=int, default=100, dest="runs",
+                        help="Number of runs in generated history of results (default: 100)")
+    parser.add_argument("--threads", type=int, default=100, dest="threads",
+                        help="Number of simulated JMeter threads (default: 100)")
+    parser.add_argument("--corpus-dir", default=None, dest="corpus_dir",
+                        help="Directory with generated corpora, which are reused by following runs "
+                             "(default: temporary directory)")
+    parser.add_argument("--phases", default=",".join(PHASES), dest="phases",
+                        help="Comma separated phases to run (default: all of {0})".format(", ".join(PHASES)))
+    parser.add_argument("-j", "--jobs", type=int, default=4, dest="jobs",
+                        help="Number of processes of parse-parallel phase (default: 4)")
+    parser.add_argument("--python", default=sys.executable, dest="python",
+                        help="Python interpreter used for running the tools (default: current one)")
+    parser.add_argument("-o", "--output", default=None, dest="output",
+                        help="Write report to JSON file")
+    parser.add_argument("--compare", default=None, dest="compare",
+                        help="Report of previous run, wall times of phases are compared with it")
+    parser.add_argument("--max-slowdown", type=float, default=None, dest="max_slowdown",
+                        help="With --compare, fail when any phase is slower by more than this percentage")
+    options = parser.parse_args()
+    try:
+        options.sizes = [parse_size(size) for size in options.sizes.split(',')]
+    except ValueError:
+        parser.error("Sizes have to be numbers with optional suffix k or M.")
+    options.phases = options.phases.split(',')
+    unknown = [phase for phase in options.phases if phase not in PHASES]
+    if unknown:
+        parser.error("Unknown phases: {0}".format(", ".join(unknown)))
+    if options.max_slowdown is not None and options.compare is None:
+        parser.error("Option --max-slowdown requires --compare.")
+    return options
+
+
+def load_shape(filename):
+    """
+    Load shape of generated samples from baseline
+    :return: list of tuples (label, cumulative weight, mu of lognormal distribution, success rate)
+    """
+    with open(filename, 'r') as shape_file:
+        baseline = json.load(shape_file)
+    shape = []
+    cumulative = 0.0
+    for label, result in sorted(baseline.items()):
+        if not result.get('count'):
+            continue
+        cumulative += result['count']
+        # Mean of lognormal distribution is exp(mu + sigma^2 / 2)
+        mu = math.log(max(result['average'], 1)) - ELAPSED_SIGMA ** 2 / 2.0
+        shape.append((label, cumulative, mu, float(result.get('success', result['count'])) / result['count']))
+    return [(label, weight / cumulative, mu, success) for label, weight, mu, success in shape]
+
+
+def write_jtl(filename, rows, shape, seed, threads):
+    """
+    Write results file with samples of API labels of shape. Samples of all threads
+    are interleaved, time between samples is average elapsed time divided by number
+    of threads.
+    :param filename: name of JTL file
+    :param rows: number of samples
+    :param shape: shape returned by load_shape()
+    :param seed: seed of random generator, the same seed gives the same file
+    :param threads: number of simulated threads
+    :return: None
+    """
+    generator = random.Random(seed)
+    weights = [weight for _, weight, _, _ in shape]
+    # Labels with separators or quotes are quoted
+    labels = [('"%s"' % label.replace('"', '""') if ',' in label or '"' in label else label, mu, success)
+              for label, _, mu, success in shape]
+    mean_elapsed = sum((weight - previous) * math.exp(mu + ELAPSED_SIGMA ** 2 / 2.0)
+                       for weight, previous, (_, mu, _) in zip(weights, [0.0] + weights[:-1], labels))
+    mean_gap = mean_elapsed / threads
+    timestamp = 1500000000000.0
+    # Only methods implemented in the same way in Python 2 and 3 are used, thus files are the same
+    uniform, lognormal, exponential = generator.random, generator.lognormvariate, generator.expovariate
+    with open(filename, 'w') as jtl_file:
+        jtl_file.write(JTL_HEADER)
+        written = 0
+        while written < rows:
+            lines = []
+            for _ in range(min(WRITE_CHUNK_ROWS, rows - written)):
+                label, mu, success_rate = labels[min(bisect.bisect(weights, uniform()), len(labels) - 1)]
+                elapsed = int(lognormal(mu, ELAPSED_SIGMA))
+                timestamp += exponential(1.0 / mean_gap)
+                thread = int(uniform() * threads) + 1
+                if uniform() < success_rate:
+                    lines.append('%d,%d,%s,200,OK,Thread Group 1-%d,text,true,,1000,200,%d,%d,%d,0,1\n' % (
+                        timestamp, elapsed, label, thread, threads, threads, elapsed))
+                else:
+                    lines.append('%d,%d,%s,500,Internal Server Error,Thread Group 1-%d,text,false,,100,200,'
+                                 '%d,%d,%d,0,1\n' % (timestamp, elapsed, label, thread, threads,
+                                                     threads, elapsed))
+            jtl_file.write(''.join(lines))
+            written += len(lines)
+
+
+def write_history(directory, history_filename, results, runs, seed):
+    """
+    Write history of results: parsed results of runs with random deviances from results
+    to directory (input of param_estimator.py -d) and to SQLite history of results
+    :param results: dictionary with parsed results
+    :param runs: number of runs
+    :return: None
+    """
+    generator = random.Random(seed)
+    os.mkdir(directory)
+    history = ResultsHistory(history_filename)
+    try:
+        for run in range(runs):
+            run_results = {}
+            for label, result in sorted(results.items()):
+                factor = max(generator.gauss(1.0, RUN_DEVIANCE), 0.5)
+                run_result = dict(result)
+                for key in ['average'] + [percentile_key(percent) for percent in PERCENTILES]:
+                    if key in run_result:
+                        run_result[key] = int(run_result[key] * factor)
+                if 'throughput' in run_result:
+                    run_result['throughput'] = significant(run_result['throughput'] / factor)
+                run_result['elapsed'] = run_result['average'] * run_result['count']
+                run_results[label] = run_result
+            with open(os.path.join(directory, 'run-%04d.json' % run), 'w') as run_file:
+                json.dump(run_results, run_file, sort_keys=True)
+            history.add_run('benchmark', 'master', run_results, timestamp=1500000000 + run * 3600,
+                            source='run-%04d.json' % run)
+    finally:
+        history.close()
+
+
+def run_tool(python, args, log_filename):
+    """
+    Run tool in new process and measure its resources
+    :param args: script and its arguments
+    :param log_filename: file for standard error output of the tool
+    :return: dictionary with wall_s, user_s, sys_s, peak_rss_mb and exit_code
+    """
+    with open(os.devnull, 'w') as devnull, open(log_filename, 'w') as log_file:
+        start = time.time()
+        process = subprocess.Popen([python] + args, stdout=devnull, stderr=log_file, cwd=REPO_DIR)
+        _, status, usage = os.wait4(process.pid, 0)
+        wall = time.time() - start
+    # Maximal resident set size is in kilobytes on Linux and in bytes on macOS
+    peak_rss = usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+    return {
+        'wall_s': round(wall, 3),
+        'user_s': round(usage.ru_utime, 3),
+        'sys_s': round(usage.ru_stime, 3),
+        'peak_rss_mb': round(peak_rss / (1024.0 * 1024.0), 1),
+        'exit_code': os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status),
+    }
+
+
+def prepare_corpus(options, shape, rows):
+    """
+    Generate results file, baseline, expected results and history of results of one size,
+    when they were not generated yet
+    :return: dictionary with names of files and time of generating in seconds (None, when reused)
+    """
+    prefix = os.path.join(options.corpus_dir, '%s-seed%d-rows%d-threads%d-runs%d' % (
+        os.path.splitext(os.path.basename(options.shape))[0], options.seed, rows, options.threads, options.runs))
+    corpus = {
+        'jtl': prefix + '.jtl',
+        'baseline': prefix + '-baseline.json',
+        'expected': prefix + '-expected.json',
+        'history_dir': prefix + '-history',
+        'history': prefix + '-history.sqlite',
+        'generate_s': None,
+    }
+    if os.path.exists(corpus['history']):
+        return corpus
+    start = time.time()
+    write_jtl(corpus['jtl'], rows, shape, options.seed, options.threads)
+    with open(corpus['baseline'], 'w') as baseline_file:
+        subprocess.check_call([options.python, PARSE_JTL, '-p', '--no-cache', corpus['jtl']],
+                              stdout=baseline_file, cwd=REPO_DIR)
+    with open(corpus['baseline'], 'r') as baseline_file:
+        baseline = json.load(baseline_file)
+    expected = dict((label, {'required_success': 0.0, 'allowed_deviance': 100.0}) for label in baseline)
+    with open(corpus['expected'], 'w') as expected_file:
+        json.dump(expected, expected_file, sort_keys=True)
+    if os.path.isdir(corpus['history_dir']):
+        shutil.rmtree(corpus['history_dir'])
+    write_history(corpus['history_dir'], corpus['history'], baseline, options.runs, options.seed)
+    corpus['generate_s'] = round(time.time() - start, 3)
+    return corpus
+
+
+def phase_args(phase, corpus, options, work_dir):
+    """
+    Return arguments of tool run in phase or None, when the phase is not supported
+    by installed modules
+    """
+    jtl = corpus['jtl']
+    has_numpy = module_available('numpy')
+    if phase == 'parse-python':
+        return [PARSE_JTL, '-p', '--no-cache', '--backend', 'python', jtl]
+    if phase == 'parse-numpy':
+        return [PARSE_JTL, '-p', '--no-cache', '--backend', 'numpy', jtl] if has_numpy else None
+    if phase == 'parse-parallel':
+        return [PARSE_JTL, '-p', '--no-cache', '-j', str(options.jobs), jtl]
+    if phase in ('cache-write', 'cache-read'):
+        if not has_numpy:
+            return None
+        # Columnar cache is written by the first parsing and read by the second one
+        if phase == 'cache-write' and os.path.isdir(jtl + '.columns'):
+            shutil.rmtree(jtl + '.columns')
+        return [PARSE_JTL, '-p', '--backend', 'numpy', jtl]
+    if phase == 'histograms':
+        if not has_numpy:
+            return None
+        return [PARSE_JTL, '-p', '--no-cache', jtl, '--generate-histograms', os.path.join(work_dir, 'histograms.html')]
+    if phase == 'compare':
+        return [PARSE_JTL, '-c', '-n', '--no-cache', jtl, '-b', corpus['baseline'], '-e', corpus['expected']]
+    if phase in ('estimate-baseline', 'estimate-deviances'):
+        return [PARAM_ESTIMATOR, '-d', corpus['history_dir'], '-t', phase.split('-')[1]]
+    if phase == 'estimate-history':
+        return [PARAM_ESTIMATOR, '--history', corpus['history'], '--test', 'benchmark', '--branch', 'master',
+                '--last', str(options.runs), '-t', 'deviances']
+    return None
+
+
+def compare_reports(report, previous, max_slowdown):
+    """
+    Print changes of wall times of phases against previous report
+    :return: list of messages about phases slower than max_slowdown
+    """
+    failures = []
+    for size, phases in sorted(report['sizes'].items(), key=lambda item: int(item[0])):
+        previous_phases = previous.get('sizes', {}).get(size, {})
+        for phase, result in sorted(phases.items()):
+            previous_result = previous_phases.get(phase)
+            if not previous_result or not previous_result.get('wall_s'):
+                continue
+            change = (result['wall_s'] - previous_result['wall_s']) * 100.0 / previous_result['wall_s']
+            print("{0:>11} rows {1:<20} {2:9.3f}s (previous {3:9.3f}s, {4:+6.1f}%)".format(
+                size, phase, result['wall_s'], previous_result['wall_s'], change))
+            if max_slowdown is not None and change > max_slowdown:
+                failures.append("Phase {0} of {1} rows is slower by {2:.1f}%, limit is {3}%".format(
+                    phase, size, change, max_slowdown))
+    return failures
+
+
+def git_commit():
+    """Return commit of the repository or None, when it is not known"""
+    try:
+        with open(os.devnull, 'w') as devnull:
+            return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR,
+                                           stderr=devnull).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    options = parse_options()
+    shape = load_shape(options.shape)
+    temporary_corpus = options.corpus_dir is None
+    if temporary_corpus:
+        options.corpus_dir = tempfile.mkdtemp(prefix='benchmark-corpus-')
+    elif not os.path.isdir(options.corpus_dir):
+        os.makedirs(options.corpus_dir)
+    work_dir = tempfile.mkdtemp(prefix='benchmark-tools-')
+    report = {
+        'python': options.python,
+        'platform': platform.platform(),
+        'cpus': multiprocessing.cpu_count(),
+        'commit': git_commit(),
+        'seed': options.seed,
+        'shape': os.path.basename(options.shape),
+        'runs': options.runs,
+        'generate_s': {},
+        'sizes': {},
+    }
+    failures = []
+    try:
+        for rows in options.sizes:
+            corpus = prepare_corpus(options, shape, rows)
+            report['generate_s'][str(rows)] = corpus['generate_s']
+            phases = report['sizes'][str(rows)] = {}
+            for phase in options.phases:
+                args = phase_args(phase, corpus, options, work_dir)
+                if args is None:
+                    continue
+                result = run_tool(options.python, args, os.path.join(work_dir, phase + '.log'))
+                if phase.startswith(('parse', 'cache', 'histograms', 'compare')):
+                    result['rows_per_s'] = int(rows / max(result['wall_s'], 0.001))
+                phases[phase] = result
+                print("{0:>11} rows {1:<20} {2:9.3f}s, cpu {3:9.3f}s, peak rss {4:8.1f}MB{5}".format(
+                    rows, phase, result['wall_s'], result['user_s'] + result['sys_s'], result['peak_rss_mb'],
+                    "" if result['exit_code'] == 0 else ", exit code {0}".format(result['exit_code'])))
+                if result['exit_code'] != 0:
+                    failures.append("Phase {0} of {1} rows failed with exit code {2}".format(
+                        phase, rows, result['exit_code']))
+    finally:
+        shutil.rmtree(work_dir)
+        if temporary_corpus:
+            shutil.rmtree(options.corpus_dir)
+
+    if options.output:
+        with open(options.output, 'w') as output_file:
+            json.dump(report, output_file, sort_keys=True, indent=2)
+    if options.compare:
+        with open(options.compare, 'r') as previous_file:
+            failures.extend(compare_reports(report, json.load(previous_file), options.max_slowdown))
+    for failure in failures:
+        print(failure)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
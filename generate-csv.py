@@ -28,18 +28,45 @@ The script requires a config json with an array of csvs where configuration of e
 }
 
 Currently it ensures no overlap in owners between any of the csvs or between any record within a csv.
+With --stream, rows are fetched in batches from server-side cursors, thus memory usage does not
+depend on the limit of rows. With --jobs, owners are hash-partitioned between csvs up front and all
+csvs are generated concurrently over a pool of connections. With --cache-dir, generated csvs are
+stored in a cache keyed by --snapshot of the database and configuration of the csvs, and they are
+restored from the cache without connecting to the database, when the same snapshot is used again.
+
+With --synthetic, no database is used at all. Columns of every csv are taken from its projection
+and their values are generated by a seeded random generator, e.g. "uuid", "id", "owner_key",
+"owner_id", "sku", "quantity", "serial" or constant for literals. The generator of a column is
+guessed from its name and expression, or it can be set in the configuration of the csv:
+ "synthetic": {"column_name": "generator_name"}
+Every csv gets its own range of synthetic owners.
 '''
 
+import csv
+import hashlib
+import itertools
 import logging
 import json
-import MySQLdb
-import psycopg2
+import os
+import random
+import re
+import shutil
+import threading
 
 from argparse import ArgumentParser
+from multiprocessing.pool import ThreadPool
+
+from jtl_profile import Profiler, add_profile_arguments
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)-7s %(message)s")
 logger = logging.getLogger('generate-csv')
 
+# Size of buffer of written csv files
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# Session temporary table with ids of owners used by already written csvs
+EXCLUDED_OWNERS_TABLE = "generate_csv_excluded_owners"
+
 
 def parse_options():
     usage = "%(prog)s [options] config_file"
@@ -69,61 +96,574 @@ def parse_options():
                         choices=["mysql","postgres"],
                         default="mysql",
                         help="The database type")
+    parser.add_argument("-s", "--stream",
+                        dest="stream",
+                        action="store_true",
+                        default=False,
+                        help="Fetch rows from server-side cursors (MySQLdb SSCursor, psycopg2 named cursor)")
+    parser.add_argument("-b", "--batch-size",
+                        dest="batch_size",
+                        type=int,
+                        default=1000,
+                        help="The number of rows fetched from the database at once")
+    parser.add_argument("-j", "--jobs",
+                        dest="jobs",
+                        type=int,
+                        default=1,
+                        help="The number of csvs generated concurrently (default: 1)")
+    parser.add_argument("--cache-dir",
+                        dest="cache_dir",
+                        default=None,
+                        help="The directory with cache of generated csvs")
+    parser.add_argument("--snapshot",
+                        dest="snapshot",
+                        default=None,
+                        help="The name of snapshot of the database, which is a part of keys of cached csvs")
+    parser.add_argument("--cache-max-size",
+                        dest="cache_max_size",
+                        type=int,
+                        default=1024,
+                        help="The maximal size of the cache in MiB, least recently used csvs are evicted "
+                             "(default: 1024)")
+    parser.add_argument("--synthetic",
+                        dest="synthetic",
+                        action="store_true",
+                        default=False,
+                        help="Generate synthetic csvs without database")
+    parser.add_argument("--seed",
+                        dest="seed",
+                        type=int,
+                        default=0,
+                        help="The seed of random generator of synthetic csvs (default: 0)")
+    parser.add_argument("--rows-per-owner",
+                        dest="rows_per_owner",
+                        type=int,
+                        default=1,
+                        help="The number of rows of one owner in synthetic csvs without group (default: 1)")
+    add_profile_arguments(parser)
 
     (options, args) = parser.parse_known_args()
     if len(args) != 1:
         parser.error("You must provide a config file name with sql")
+    if options.batch_size <= 0:
+        parser.error("The batch size has to be positive number")
+    if options.jobs <= 0:
+        parser.error("The number of jobs has to be positive number")
+    if options.rows_per_owner <= 0:
+        parser.error("The number of rows per owner has to be positive number")
+    if options.cache_dir and not options.snapshot:
+        parser.error("You must provide name of database snapshot to use cache of csvs")
     return (options, args)
 
 def get_connection(options):
+    # Database drivers are imported only when they are used, thus --synthetic works without them
     if options.type == 'mysql':
+        import MySQLdb
         return MySQLdb.connect(options.host, options.username, options.password, options.database)
     elif options.type == 'postgres':
+        import psycopg2
         return psycopg2.connect(host=options.host, database=options.database, user=options.username, password=options.password)
     else:
         raise TypeError('Unsupported database type: %s' % options.type)
 
-def main():
-    (options, args) = parse_options()
+def get_cursor(conn, options, name):
+    """
+    Create cursor for one query. Server-side cursors keep result of the query in
+    the database and rows are transferred to the client only when they are fetched.
+    :param conn: connection to the database
+    :param options: command line options
+    :param name: name of server-side cursor of postgres
+    :return: cursor
+    """
+    if not options.stream:
+        return conn.cursor()
+    if options.type == 'mysql':
+        import MySQLdb.cursors
+        return conn.cursor(MySQLdb.cursors.SSCursor)
+    # Named cursor of psycopg2 is server-side cursor
+    return conn.cursor(name)
+
+def fetch_batches(cursor, batch_size):
+    """
+    Fetch rows of executed query in batches
+    :param cursor: cursor with executed query
+    :param batch_size: maximal number of rows in one batch
+    :return: generator of lists of rows
+    """
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield rows
+
+def create_excluded_owners_table(conn):
+    """
+    Create temporary table of owners, which can not be used by next csvs. The table
+    exists only in the current session and its primary key is used by anti-joins.
+    :param conn: connection to the database
+    :return: None
+    """
+    cursor = conn.cursor()
+    cursor.execute("create temporary table " + EXCLUDED_OWNERS_TABLE +
+                   " (excluded_owner_id varchar(255) not null primary key)")
+    cursor.close()
+
+def exclude_owners(conn, owner_ids, batch_size):
+    """
+    Bulk insert owners used by written csv to the table of excluded owners
+    :param conn: connection to the database
+    :param owner_ids: set of ids of owners, which are not excluded yet
+    :param batch_size: maximal number of rows inserted by one statement
+    :return: None
+    """
+    owner_ids = list(owner_ids)
+    cursor = conn.cursor()
+    for i in xrange(0, len(owner_ids), batch_size):
+        owner_id_batch = owner_ids[i:i + batch_size]
+        cursor.execute("insert into " + EXCLUDED_OWNERS_TABLE + " (excluded_owner_id) values " +
+                       ",".join(["(%s)"] * len(owner_id_batch)), owner_id_batch)
+    cursor.close()
+
+class CsvCache(object):
+    """
+    Cache of generated csvs. Every csv is stored under a hash of everything its
+    rows depend on, thus the same snapshot of the database and the same
+    configuration give the same key. Least recently used csvs are evicted,
+    when the size of the cache exceeds its maximal size.
+    """
+
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    @staticmethod
+    def key(*parts):
+        """Compute key of csv from all values its rows depend on"""
+        return hashlib.sha1(json.dumps(parts, sort_keys=True)).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.csv')
+
+    def restore(self, key, file_name):
+        """
+        Copy cached csv to the csv file
+        :return: True, when the csv was in the cache
+        """
+        path = self.path(key)
+        with self.lock:
+            if not os.path.exists(path):
+                return False
+            # Time of modification is time of last use of the cached csv
+            os.utime(path, None)
+        print "Restoring file : %s from cache ...." % file_name
+        shutil.copyfile(path, file_name)
+        return True
+
+    def store(self, key, file_name):
+        """
+        Copy generated csv file to the cache and evict least recently used csvs
+        """
+        path = self.path(key)
+        temporary_path = '%s.%d.tmp' % (path, threading.current_thread().ident)
+        shutil.copyfile(file_name, temporary_path)
+        with self.lock:
+            os.rename(temporary_path, path)
+            self.evict()
+
+    def evict(self):
+        cached = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.csv'):
+                stat = os.stat(os.path.join(self.directory, name))
+                cached.append((stat.st_mtime, stat.st_size, name))
+        cached.sort()
+        size = sum(item[1] for item in cached)
+        # The most recently stored csv is never evicted
+        for _, csv_size, name in cached[:-1]:
+            if size <= self.max_size:
+                break
+            logger.info("Evicting %s from cache of csvs" % name)
+            os.remove(os.path.join(self.directory, name))
+            size -= csv_size
+
+class ConnectionPool(object):
+    """
+    Pool of connections to the database, every worker thread gets its own connection
+    """
+
+    def __init__(self, options):
+        self.options = options
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = []
+
+    def get(self):
+        """Return connection of the current thread"""
+        if not hasattr(self.local, 'conn'):
+            self.local.conn = get_connection(self.options)
+            with self.lock:
+                self.connections.append(self.local.conn)
+        return self.local.conn
+
+    def close(self):
+        for conn in self.connections:
+            conn.close()
+
+def owner_partition(db_type, owner_id_column, partition, partitions):
+    """
+    Create condition selecting owners of one hash partition. Every owner belongs
+    to exactly one partition, thus csvs of different partitions never share owners.
+    :param db_type: mysql or postgres
+    :param owner_id_column: column with id of owner
+    :param partition: index of partition
+    :param partitions: number of partitions
+    :return: sql condition
+    """
+    if db_type == 'mysql':
+        owner_hash = "mod(crc32(" + owner_id_column + "), %d)" % partitions
+    else:
+        owner_hash = "abs(mod(hashtext(" + owner_id_column + "::text), %d))" % partitions
+    return owner_hash + " = %d" % partition
+
+def build_query(csv_config, options, owner_condition):
+    """
+    Create query of one csv
+    :param csv_config: configuration of the csv
+    :param options: command line options
+    :param owner_condition: sql condition ensuring that owners are not used by other csvs
+    :return: sql query
+    """
+    owner_id_column = csv_config['owner_id_column']
+    query = "select " + csv_config['projection'] + ", " + owner_id_column + \
+            " from " + csv_config['from'] + \
+            " where "
+    if 'selection' in csv_config:
+        query += csv_config['selection'] + " and "
+    query += owner_condition
+    if 'group' in csv_config:
+        query += ' group by ' + csv_config['group']
+    query += " limit " + csv_limit(csv_config, options)
+    return query
+
+def csv_limit(csv_config, options):
+    """Return the number of rows of the csv"""
+    if 'limit' in csv_config:
+        return csv_config['limit']
+    return str(options.limit)
+
+def csv_cache_key(csv_config, options, *dependencies):
+    """
+    Compute key of csv in the cache of csvs
+    :param csv_config: configuration of the csv
+    :param options: command line options
+    :param dependencies: other values rows of the csv depend on
+    :return: key
+    """
+    return CsvCache.key(options.snapshot, options.type, options.database, csv_config,
+                        csv_limit(csv_config, options), *dependencies)
+
+def owners_digest(digest, owner_ids):
+    """
+    Add owners of a csv to hash of owners of previous csvs
+    :param digest: hashlib object with hash of owners of previous csvs
+    :param owner_ids: set of ids of owners used by the csv
+    :return: None
+    """
+    digest.update("\n".join(sorted(owner_ids)) + "\n\n")
+
+def read_owner_ids(file_name):
+    """
+    Read ids of owners from the last column of csv file
+    :return: set of ids of owners
+    """
+    with open(file_name, 'rb') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        return set(row[-1] for row in reader)
+
+def write_csv(conn, options, number, file_name, query):
+    """
+    Execute query of one csv and write its rows to the csv file
+    :param conn: connection to the database
+    :param options: command line options
+    :param number: index of the csv in configuration
+    :param file_name: name of the csv file
+    :param query: sql query
+    :return: tuple (set of ids of owners used by the csv, number of written rows)
+    """
+    print "Writing file : %s ...." % file_name
+    cursor = get_cursor(conn, options, 'generate_csv_%d' % number)
+    cursor.execute(query)
+    batches = fetch_batches(cursor, options.batch_size)
+    # Server-side cursor of postgres describes columns after the first fetch
+    first_batch = next(batches, [])
+    owner_ids = set()
+    written_rows = 0
+    with open(file_name, 'wb', WRITE_BUFFER_SIZE) as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow([i[0] for i in cursor.description])
+        for rows in itertools.chain([first_batch], batches):
+            owner_ids.update(str(row[-1]) for row in rows)
+            writer.writerows(rows)
+            written_rows += len(rows)
+    cursor.close()
+    return owner_ids, written_rows
+
+def generate_serially(csvs, options, cache=None, profiler=None):
+    """
+    Generate csvs one by one, owners of every csv are excluded from next csvs.
+    The database is connected only when some csv is not in the cache.
+    Every csv is measured as a phase of profiler.
+    """
+    if profiler is None:
+        profiler = Profiler()
+    conn = None
+    # Owners of csvs restored from the cache before connecting to the database
+    pending_owner_ids = set()
+    # Hash of owners actually used by previous csvs. Queries do not order rows, thus
+    # a regenerated (e.g. evicted) csv can use other owners than its cached version
+    # and cached csvs following it, which exclude the old owners, must not be used.
+    previous_owners = hashlib.sha1()
+    key = None
+    for number, csv_config in enumerate(csvs):
+        file_name = csv_config['name']
+        if cache is not None:
+            # Rows of the csv depend on owners of all previous csvs
+            key = csv_cache_key(csv_config, options, 'serial', previous_owners.hexdigest())
+        with profiler.phase(file_name) as phase:
+            if cache is not None and cache.restore(key, file_name):
+                owner_ids = read_owner_ids(file_name)
+            else:
+                if conn is None:
+                    conn = get_connection(options)
+                    create_excluded_owners_table(conn)
+                    exclude_owners(conn, pending_owner_ids, options.batch_size)
+                # anti-join with owners of previous csvs keeps the query of the same size, name of the
+                # column of excluded owners differs from columns of queried tables
+                owner_condition = "not exists (select 1 from " + EXCLUDED_OWNERS_TABLE + " excluded" + \
+                                  " where excluded.excluded_owner_id = " + csv_config['owner_id_column'] + ")"
+                query = build_query(csv_config, options, owner_condition)
+                owner_ids, written_rows = write_csv(conn, options, number, file_name, query)
+                phase.add_rows(written_rows)
+                if cache is not None:
+                    cache.store(key, file_name)
+        owners_digest(previous_owners, owner_ids)
+        if conn is None:
+            pending_owner_ids.update(owner_ids)
+        else:
+            with profiler.phase('exclude-owners') as phase:
+                phase.add_rows(len(owner_ids))
+                exclude_owners(conn, owner_ids, options.batch_size)
+    if conn is not None:
+        conn.close()
+
+def generate_concurrently(csvs, options, cache=None, profiler=None):
+    """
+    Generate all csvs concurrently. Every csv uses only owners of its own
+    hash partition, thus no csv depends on owners used by other csvs.
+    Csvs overlap in time, thus all of them are measured as one phase of profiler.
+    """
+    if profiler is None:
+        profiler = Profiler()
+    pool = ConnectionPool(options)
+    threads = ThreadPool(min(options.jobs, len(csvs)))
+
+    def generate(number):
+        csv_config = csvs[number]
+        key = None
+        if cache is not None:
+            key = csv_cache_key(csv_config, options, 'partition', number, len(csvs))
+            if cache.restore(key, csv_config['name']):
+                return 0
+        owner_condition = owner_partition(options.type, csv_config['owner_id_column'], number, len(csvs))
+        _, written_rows = write_csv(pool.get(), options, number, csv_config['name'],
+                                    build_query(csv_config, options, owner_condition))
+        if cache is not None:
+            cache.store(key, csv_config['name'])
+        return written_rows
+
+    try:
+        with profiler.phase('generate') as phase:
+            phase.add_rows(sum(threads.map(generate, range(len(csvs)))))
+    finally:
+        threads.close()
+        threads.join()
+        pool.close()
+
+def random_hex(rng, count, digits):
+    """Generate count random hexadecimal strings of the same number of digits at once"""
+    if count == 0:
+        return []
+    values = '%0*x' % (count * digits, rng.getrandbits(count * digits * 4))
+    return [values[i:i + digits] for i in xrange(0, count * digits, digits)]
+
+def uuid_values(rng, owners):
+    return ['%s-%s-%s-%s-%s' % (value[:8], value[8:12], value[12:16], value[16:20], value[20:])
+            for value in random_hex(rng, len(owners), 32)]
+
+def random_numbers(upper, pattern='%d'):
+    """Create generator of random numbers from 1 to upper"""
+    return lambda rng, owners: [pattern % (1 + int(rng.random() * upper)) for _ in owners]
+
+# Generators of values of synthetic columns. Every generator gets random generator
+# of the csv and numbers of owners of a batch of rows and returns values of the rows.
+SYNTHETIC_GENERATORS = {
+    'uuid': uuid_values,
+    'id': lambda rng, owners: random_hex(rng, len(owners), 32),
+    'owner_id': lambda rng, owners: ['%032x' % owner for owner in owners],
+    'owner_key': lambda rng, owners: [str(owner) for owner in owners],
+    'sku': random_numbers(100, 'SKU%04d'),
+    'quantity': random_numbers(1000),
+}
+
+# The first synthetic owner, owners of csvs follow each other
+SYNTHETIC_FIRST_OWNER = 1000000
+
+def split_projection(projection):
+    """
+    Split projection of query to expressions of columns. Commas inside
+    of parentheses and quotes do not separate columns.
+    :return: list of expressions
+    """
+    expressions = []
+    depth = 0
+    quote = None
+    start = 0
+    for i, char in enumerate(projection):
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"":
+            quote = char
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            expressions.append(projection[start:i].strip())
+            start = i + 1
+    expressions.append(projection[start:].strip())
+    return expressions
+
+def column_name(expression):
+    """Return name of column of expression like the database names it"""
+    match = re.match(r"(.*)\s+as\s+(\w+)$", expression, re.IGNORECASE | re.DOTALL)
+    if match:
+        return match.group(2)
+    return re.split(r"[\s.]", expression)[-1]
+
+def serial_numbers():
+    """Create generator of increasing serial numbers"""
+    serials = itertools.count(1)
+    return lambda rng, owners: [str(next(serials)) for _ in owners]
+
+def synthetic_generator(expression, name, generator_name=None):
+    """
+    Find generator of values of synthetic column
+    :param expression: sql expression of the column
+    :param name: name of the column
+    :param generator_name: name of generator set in configuration of the csv
+    :return: function (random generator, numbers of owners of rows) -> values of rows
+    """
+    if generator_name is not None:
+        return SYNTHETIC_GENERATORS[generator_name]
+    match = re.match(r"(.*)\s+as\s+\w+$", expression, re.IGNORECASE | re.DOTALL)
+    if match:
+        expression = match.group(1).strip()
+    literal = re.match(r"^'([^']*)'$", expression)
+    if literal:
+        value = literal.group(1)
+        return lambda rng, owners: [value] * len(owners)
+    # e.g. FLOOR( 1 + RAND( ) * 60 )
+    random_range = re.search(r"rand\(\s*\)\s*\*\s*(\d+)", expression, re.IGNORECASE)
+    if random_range:
+        return random_numbers(int(random_range.group(1)))
+    text = (expression + ' ' + name).lower()
+    if 'uuid' in text:
+        generator_name = 'uuid'
+    elif 'account' in text or 'ownerkey' in text or 'owner_key' in text:
+        generator_name = 'owner_key'
+    elif 'owner_id' in text:
+        generator_name = 'owner_id'
+    elif 'serial' in text:
+        return serial_numbers()
+    elif 'quantity' in text or 'available' in text:
+        generator_name = 'quantity'
+    elif 'sku' in text or 'product_id' in text:
+        generator_name = 'sku'
+    else:
+        generator_name = 'id'
+    return SYNTHETIC_GENERATORS[generator_name]
+
+def write_synthetic_csv(csv_config, options, number, first_owner):
+    """
+    Write synthetic csv. Owners of the csv are first_owner and following owners.
+    Values are generated by columns for batches of rows.
+    :param csv_config: configuration of the csv
+    :param options: command line options
+    :param number: index of the csv in configuration, it is a part of seed of the csv
+    :param first_owner: number of the first owner of the csv
+    :return: number of the first owner, which is not used by the csv
+    """
+    file_name = csv_config['name']
+    print "Writing file : %s ...." % file_name
+    generator_names = csv_config.get('synthetic', {})
+    owner_id_column = csv_config['owner_id_column']
+    expressions = split_projection(csv_config['projection']) + [owner_id_column]
+    names = [column_name(expression) for expression in expressions]
+    generators = [synthetic_generator(expression, name, generator_names.get(name))
+                  for expression, name in zip(expressions[:-1], names[:-1])]
+    generators.append(SYNTHETIC_GENERATORS['owner_id'])
+    rows_per_owner = 1 if 'group' in csv_config else options.rows_per_owner
+    rows = int(csv_limit(csv_config, options))
+    rng = random.Random(options.seed * 1000003 + number)
+
+    with open(file_name, 'wb', WRITE_BUFFER_SIZE) as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(names)
+        for start in xrange(0, rows, options.batch_size):
+            owners = [first_owner + row // rows_per_owner
+                      for row in xrange(start, min(start + options.batch_size, rows))]
+            writer.writerows(zip(*[generator(rng, owners) for generator in generators]))
+    return first_owner + (rows + rows_per_owner - 1) // rows_per_owner
+
+def generate_synthetic(csvs, options, profiler=None):
+    """
+    Generate synthetic csvs, every csv gets its own range of owners
+    """
+    if profiler is None:
+        profiler = Profiler()
+    first_owner = SYNTHETIC_FIRST_OWNER
+    for number, csv_config in enumerate(csvs):
+        with profiler.phase(csv_config['name']) as phase:
+            phase.add_rows(int(csv_limit(csv_config, options)))
+            first_owner = write_synthetic_csv(csv_config, options, number, first_owner)
+
+def generate_csvs(options, args, profiler):
     input_file = args[0]
     logger.debug("Opening %s" % input_file)
     csvs = json.load(open(input_file))['csvs']
-    conn = get_connection(options)
-    cursor = conn.cursor()
-    owner_ids = ["'0'"]
-    for csv in csvs:
-        file_name = csv['name']
-        owner_id_column = csv['owner_id_column']
-        f = open(file_name, 'w+')
-        query = "select " + csv['projection'] + ", " + owner_id_column + \
-                " from " + csv['from'] + \
-                " where "
-        if 'selection' in csv:
-            query += csv['selection'] + " and "
-        # split up owner ids into batches of 999
-        owner_id_batches = [owner_ids[i:i + 999] for i in xrange(0, len(owner_ids), 999)]
-        for i, owner_id_batch in enumerate(owner_id_batches):
-            if i != 0:
-                query += " and "
-            query += owner_id_column + " not in (" + ",".join(owner_id_batch) + ")"
-        if 'group' in csv:
-            query += ' group by ' + csv['group']
-        if 'limit' in csv:
-            limit = csv['limit']
-        else:
-            limit = str(options.limit)
-        query += " limit " + limit
-        print "Writing file : %s ...." % file_name
-        cursor.execute(query)
-        fields = ','.join([i[0] for i in cursor.description])
-        f.write(fields + "\n")
-        rows = cursor.fetchall()
-        for row in rows:
-            owner_ids.append("'" + str(row[-1]) + "'")
-            f.write(','.join(row) + "\n")
-        f.close()
-    cursor.close()
-    conn.close()
+    if options.synthetic:
+        generate_synthetic(csvs, options, profiler)
+        return
+    cache = None
+    if options.cache_dir:
+        cache = CsvCache(options.cache_dir, options.cache_max_size * 1024 * 1024)
+    if options.jobs > 1 and len(csvs) > 1:
+        generate_concurrently(csvs, options, cache, profiler)
+    else:
+        generate_serially(csvs, options, cache, profiler)
+
+def main():
+    (options, args) = parse_options()
+    profiler = Profiler.from_options(options, 'generate-csv')
+    try:
+        generate_csvs(options, args, profiler)
+    finally:
+        profiler.finish()
 
 if __name__ == "__main__":
     main()
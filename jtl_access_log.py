@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2017 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 3 (GPLv3). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv3
+# along with this software; if not, see
+# https://www.gnu.org/licenses/gpl-3.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv3. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+
+"""
+Streaming analysis of access log of candlepin (Tomcat AccessLogValve in
+common or combined format with time of processing of request as the last
+field, e.g. %h %l %u %t "%r" %s %b %D). Requests are mapped to labels of
+JMeter samples, e.g. "GET consumers/{uuid}/entitlements?{params}" and
+server-side times are aggregated per label in time windows, thus memory
+usage depends on the number of labels and the length of test, not on the
+size of the log.
+
+Labels, which can not be distinguished by method, path and query of request
+(e.g. the same request with different name of sample), are merged to one
+group of labels. Groups sharing any label are merged too, thus every label
+is in exactly one group.
+"""
+
+import calendar
+import re
+
+from jtl_stats import LabelStats, decode_line
+
+ACCESS_LOG_LINE = re.compile(r'^\S+ \S+ \S+ \[(?P<time>[^\]]+)\] "(?P<method>[A-Z]+) (?P<url>\S+)[^"]*" '
+                             r'(?P<status>\d{3}) \S+(?P<rest>.*)$')
+
+# Time of processing of request is the last numeric field of line
+DURATION = re.compile(r'(\d+(?:\.\d+)?)\s*$')
+
+# Milliseconds in units of time of processing: %D is in milliseconds (microseconds
+# since Tomcat 10) and %T is in seconds
+DURATION_UNITS = {'ms': 1.0, 'us': 0.001, 's': 1000.0}
+
+MONTHS = dict((month, index) for index, month in enumerate(
+    ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'), 1))
+
+# Separator of labels in name of group of labels
+GROUP_SEPARATOR = ' | '
+
+# Number of examples of requests, which do not match any label
+UNMATCHED_EXAMPLES = 10
+
+
+def parse_timestamp(text):
+    """
+    Parse time of access log, e.g. 18/Oct/2017:10:00:00 +0200
+    :return: milliseconds since epoch
+    """
+    day, month, rest = text.split('/', 2)
+    year, hour, minute, second = rest[:13].split(':')
+    offset = rest[14:]
+    seconds = calendar.timegm((int(year), MONTHS[month], int(day), int(hour), int(minute), int(second)))
+    if offset:
+        sign = -1 if offset[0] == '-' else 1
+        seconds -= sign * (int(offset[1:3]) * 3600 + int(offset[3:5]) * 60)
+    return seconds * 1000
+
+
+class LabelTemplate(object):
+    """
+    Template of requests of one label, e.g. "GET owners/{ownerkey}/consumers?{params}".
+    Placeholders in braces match any path segment or query value, query {params}
+    matches any query and template without query matches requests with any query.
+    """
+
+    def __init__(self, label):
+        self.label = label
+        self.method, _, template = label.partition(' ')
+        # Suffix of label, e.g. " (post-bind)", is not a part of template
+        template = template.split(' ')[0]
+        path, _, query = template.partition('?')
+        self.segments = len(path.strip('/').split('/'))
+        self.literal_length = len(re.sub(r'\{[^}]*\}', '', path))
+        self.path = self._compile(path.strip('/'), '[^/]+', anchored=True)
+        self.query = None
+        if query:
+            self.query = self._compile(query, '[^&]*', anchored=False)
+
+    @staticmethod
+    def _compile(template, placeholder, anchored):
+        parts = re.split(r'\{[^}]*\}', template)
+        pattern = placeholder.join(re.escape(part) for part in parts)
+        if anchored:
+            pattern = '^%s/?$' % pattern
+        return re.compile(pattern)
+
+    def matches(self, path, query):
+        """Return True, when request with given path (without context) and query matches template"""
+        if not self.path.match(path):
+            return False
+        return self.query is None or (query != '' and self.query.search(query) is not None)
+
+
+class LabelMatcher(object):
+    """
+    Mapping of requests to groups of labels. Only templates with the same method
+    and number of path segments are tried for every request. When more templates
+    match, then templates with the longest literal part of path are used.
+    """
+
+    def __init__(self, labels, context='/candlepin'):
+        self.context = context.rstrip('/')
+        self.templates = {}
+        for label in labels:
+            template = LabelTemplate(label)
+            self.templates.setdefault((template.method, template.segments), []).append(template)
+        # Name of group -> list of labels
+        self.groups = {}
+
+    def match(self, method, url):
+        """
+        Find group of labels of request
+        :param method: HTTP method
+        :param url: requested URL with query
+        :return: name of group or None, when no label matches the request
+        """
+        path, _, query = url.partition('?')
+        if self.context and path.startswith(self.context):
+            path = path[len(self.context):]
+        path = path.strip('/')
+        candidates = self.templates.get((method, len(path.split('/'))), ())
+        matched = [template for template in candidates if template.matches(path, query)]
+        if not matched:
+            return None
+        longest = max(template.literal_length for template in matched)
+        labels = sorted(template.label for template in matched if template.literal_length == longest)
+        group = GROUP_SEPARATOR.join(labels)
+        if group not in self.groups:
+            self.groups[group] = labels
+        return group
+
+
+def aggregate_access_log(lines, matcher, window, duration_unit='ms', clock_offset=0):
+    """
+    Aggregate times of processing of requests in access log per group of labels
+    :param lines: iterable of lines of access log read in binary mode
+    :param matcher: instance of LabelMatcher
+    :param window: length of time window in milliseconds
+    :param duration_unit: unit of time of processing ('ms', 'us' or 's')
+    :param clock_offset: milliseconds added to times of access log (difference of clocks)
+    :return: tuple (dictionary group -> LabelStats with time windows, dictionary with
+             numbers of matched, unmatched and invalid lines and examples of unmatched requests)
+    """
+    scale = DURATION_UNITS[duration_unit]
+    results = {}
+    summary = {'matched': 0, 'unmatched': 0, 'invalid': 0, 'unmatched_examples': []}
+    # Requests logged in the same second have the same time
+    last_time, last_timestamp = None, None
+    for line in lines:
+        line = decode_line(line)
+        request = ACCESS_LOG_LINE.match(line)
+        duration = DURATION.search(request.group('rest')) if request else None
+        if duration is None:
+            summary['invalid'] += 1
+            continue
+        group = matcher.match(request.group('method'), request.group('url'))
+        if group is None:
+            summary['unmatched'] += 1
+            if len(summary['unmatched_examples']) < UNMATCHED_EXAMPLES:
+                summary['unmatched_examples'].append("%s %s" % (request.group('method'), request.group('url')))
+            continue
+        summary['matched'] += 1
+        if request.group('time') != last_time:
+            last_time = request.group('time')
+            last_timestamp = parse_timestamp(last_time) + clock_offset
+        try:
+            stats = results[group]
+        except KeyError:
+            stats = results[group] = LabelStats(window=window)
+        stats.add(int(round(float(duration.group(1)) * scale)), int(request.group('status')) < 400, last_timestamp)
+    return results, summary
+
+
+def merge_groups(groups, labels):
+    """
+    Merge groups of labels sharing any label, labels without group get their own group
+    :param groups: dictionary name of group -> list of labels (see LabelMatcher.groups)
+    :param labels: all labels
+    :return: dictionary name of merged group -> tuple (list of labels, list of names of merged groups)
+    """
+    merged = []
+    for name, group_labels in sorted(groups.items()):
+        labels_set, names = set(group_labels), [name]
+        for other in [other for other in merged if other[0] & labels_set]:
+            merged.remove(other)
+            labels_set |= other[0]
+            names.extend(other[1])
+        merged.append((labels_set, names))
+    grouped_labels = set(label for labels_set, _ in merged for label in labels_set)
+    merged.extend((set([label]), []) for label in labels if label not in grouped_labels)
+    return dict((GROUP_SEPARATOR.join(sorted(labels_set)), (sorted(labels_set), names))
+                for labels_set, names in merged)
+
+
+def merged_stats(label_stats, labels, window):
+    """
+    Merge accumulators of labels of one group
+    :param label_stats: dictionary label (or group) -> LabelStats with time windows
+    :param labels: list of merged labels (or groups)
+    :return: LabelStats of the group
+    """
+    stats = LabelStats(window=window)
+    for label in labels:
+        if label in label_stats:
+            stats.merge(label_stats[label])
+    return stats
+
+
+def decompose_latency(client_stats, server_stats, window):
+    """
+    Decompose elapsed time measured by JMeter to time of processing in candlepin
+    and the rest (network, Tomcat connector queue and JMeter). Only time windows
+    with both client and server samples are compared.
+    :param client_stats: LabelStats of JMeter samples with time windows
+    :param server_stats: LabelStats of requests of access log with time windows
+    :param window: length of time window in milliseconds
+    :return: dictionary with results
+    """
+    joined_client, joined_server = LabelStats(), LabelStats()
+    windows = []
+    for start in sorted(set(client_stats.windows) & set(server_stats.windows)):
+        client_window, server_window = client_stats.windows[start], server_stats.windows[start]
+        joined_client.merge(client_window)
+        joined_server.merge(server_window)
+        windows.append({
+            'timestamp': start,
+            'client_count': client_window.count,
+            'server_count': server_window.count,
+            'client_average': client_window.elapsed // client_window.count,
+            'server_average': server_window.elapsed // server_window.count,
+        })
+    result = {
+        'client': client_stats.to_dict() if client_stats.count else None,
+        'server': server_stats.to_dict() if server_stats.count else None,
+        'window_seconds': window / 1000.0,
+        'windows': windows,
+        'joined': None,
+    }
+    if windows:
+        client, server = joined_client.to_dict(), joined_server.to_dict()
+        result['joined'] = {
+            'client': client,
+            'server': server,
+            'overhead_average': client['average'] - server['average'],
+            'server_%': round(server['average'] * 100.0 / max(client['average'], 1), 1),
+        }
+    return result
@@ -0,0 +1,408 @@
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2017 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 3 (GPLv3). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv3
+# along with this software; if not, see
+# https://www.gnu.org/licenses/gpl-3.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv3. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+
+"""
+Columnar cache of parsed JTL files and vectorized aggregation of columns
+(numpy backend of parsing JTL files).
+
+The cache is a directory next to the JTL file (results.jtl.columns) with
+raw little-endian arrays, which are memory-mapped when the cache is used:
+
+ * part-N.label      uint16 codes of labels (index to list of labels of the part)
+ * part-N.elapsed    int32 elapsed times
+ * part-N.timestamp  int64 timestamps
+ * part-N.success    bitmask of successful samples
+ * meta.json         key of the JTL file, labels and number of rows of parts
+
+Every worker parsing a byte range of the JTL file writes its own part.
+The meta.json file is written as the last one, thus cache without it
+is not valid. This module requires numpy.
+"""
+
+import csv
+import hashlib
+import io
+import itertools
+import json
+import os
+import shutil
+
+import numpy as np
+
+from jtl_stats import LABEL, ELAPSED, TIMESTAMP, SUCCESS, CACHE_SUFFIX, LabelStats, LatencyHistogram, \
+    decode_line, merge_results
+
+CACHE_VERSION = 1
+
+# Number of bytes at the beginning and at the end of JTL file used for content hash
+HASH_BLOCK_SIZE = 1024 * 1024
+
+COLUMNS = (
+    ('label', '<u2'),
+    ('elapsed', '<i4'),
+    ('timestamp', '<i8'),
+)
+
+# Upper limit of indexes of LatencyHistogram buckets for int32 values
+BUCKET_LIMIT = 1 << 16
+
+# Number of rows converted to arrays at once by the numpy backend,
+# it has to be multiple of 8 to keep bitmask of cache aligned
+LOAD_CHUNK_ROWS = 64 * 1024
+
+# np.loadtxt supports quoted fields since numpy 1.23
+LOADTXT_QUOTECHAR = tuple(int(v) for v in np.__version__.split('.')[:2]) >= (1, 23)
+LOADTXT_LABEL_WIDTH = 128
+LOADTXT_DTYPE = [
+    ('timestamp', '<i8'),
+    ('elapsed', '<i4'),
+    ('label', 'U%d' % LOADTXT_LABEL_WIDTH),
+    ('success', 'U5'),
+]
+
+
+def cache_dir(filename):
+    """Return name of cache directory of JTL file"""
+    return filename + CACHE_SUFFIX
+
+
+def cache_key(filename):
+    """
+    Compute key identifying content of JTL file: size, time of modification and
+    hash of the first and the last block of the file
+    :return: Dictionary with key
+    """
+    stat = os.stat(filename)
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as jtl_file:
+        digest.update(jtl_file.read(HASH_BLOCK_SIZE))
+        if stat.st_size > HASH_BLOCK_SIZE:
+            jtl_file.seek(max(HASH_BLOCK_SIZE, stat.st_size - HASH_BLOCK_SIZE))
+            digest.update(jtl_file.read(HASH_BLOCK_SIZE))
+    return {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha1': digest.hexdigest()}
+
+
+def start_cache(filename):
+    """
+    Prepare empty cache directory of JTL file for writing of parts
+    :return: Name of cache directory or None, when it can not be created
+    """
+    directory = cache_dir(filename)
+    try:
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+        os.mkdir(directory)
+    except (IOError, OSError):
+        return None
+    return directory
+
+
+def finish_cache(filename, directory, parts):
+    """
+    Write metadata of cache, which makes the cache valid
+    :param parts: list of metadata of parts returned by ColumnsWriter.close()
+    :return: None
+    """
+    meta = {'version': CACHE_VERSION, 'key': cache_key(filename), 'parts': parts}
+    with open(os.path.join(directory, 'meta.json'), 'w') as meta_file:
+        json.dump(meta, meta_file)
+
+
+class ColumnsWriter(object):
+    """
+    Writer of one part of cache. Rows are buffered and appended to raw
+    column files in chunks.
+    """
+
+    # Has to be multiple of 8 to keep bitmask of chunks aligned
+    CHUNK_ROWS = 64 * 1024
+
+    def __init__(self, directory, part):
+        self.directory = directory
+        self.part = part
+        self.labels = {}
+        self.rows = 0
+        self.buffers = dict((name, []) for name, _ in COLUMNS)
+        self.buffers['success'] = []
+        self.files = dict((name, open(self._path(name), 'wb')) for name in self.buffers)
+
+    def _path(self, name):
+        return os.path.join(self.directory, 'part-%d.%s' % (self.part, name))
+
+    def _label_code(self, label):
+        try:
+            return self.labels[label]
+        except KeyError:
+            code = self.labels[label] = len(self.labels)
+            return code
+
+    def _flush(self):
+        for name, dtype in COLUMNS:
+            np.asarray(self.buffers[name], dtype=dtype).tofile(self.files[name])
+            self.buffers[name] = []
+        np.packbits(np.asarray(self.buffers['success'], dtype=np.bool_)).tofile(self.files['success'])
+        self.buffers['success'] = []
+
+    def record(self, rows):
+        """
+        Generator recording rows to cache, rows are passed through unchanged
+        :param rows: iterable of parsed rows
+        :return: Generator of rows
+        """
+        for row in rows:
+            self.buffers['label'].append(self._label_code(row[LABEL]))
+            self.buffers['elapsed'].append(int(row[ELAPSED]))
+            self.buffers['timestamp'].append(int(row[TIMESTAMP]))
+            self.buffers['success'].append(row[SUCCESS] == "true")
+            self.rows += 1
+            if len(self.buffers['success']) == self.CHUNK_ROWS:
+                self._flush()
+            yield row
+
+    def write_columns(self, labels, codes, elapsed, timestamps, success):
+        """
+        Write chunk of columns (see read_column_chunks) directly to column files.
+        Only the last chunk may have number of rows, which is not multiple of 8.
+        :return: None
+        """
+        mapping = np.asarray([self._label_code(label) for label in labels], dtype=np.int64)
+        mapping[codes].astype('<u2').tofile(self.files['label'])
+        np.asarray(elapsed, dtype='<i4').tofile(self.files['elapsed'])
+        np.asarray(timestamps, dtype='<i8').tofile(self.files['timestamp'])
+        np.packbits(success).tofile(self.files['success'])
+        self.rows += len(codes)
+
+    def close(self):
+        """
+        Flush buffered rows and close column files
+        :return: Dictionary with metadata of the part or None, when there
+                 are too many labels for uint16 codes
+        """
+        self._flush()
+        for column_file in self.files.values():
+            column_file.close()
+        if len(self.labels) > np.iinfo(np.uint16).max:
+            return None
+        labels = sorted(self.labels, key=self.labels.get)
+        return {'part': self.part, 'rows': self.rows, 'labels': labels}
+
+
+def load_cache(filename):
+    """
+    Load valid cache of JTL file
+    :return: List of tuples (labels, codes, elapsed, timestamps, success) of all
+             parts with memory-mapped arrays or None, when there is no valid cache
+    """
+    directory = cache_dir(filename)
+    try:
+        with open(os.path.join(directory, 'meta.json'), 'r') as meta_file:
+            meta = json.load(meta_file)
+    except (IOError, OSError, ValueError):
+        return None
+    if meta.get('version') != CACHE_VERSION or meta.get('key') != cache_key(filename):
+        return None
+    if any(part is None for part in meta['parts']):
+        return None
+
+    parts = []
+    for part in meta['parts']:
+        if part['rows'] == 0:
+            continue
+        path = os.path.join(directory, 'part-%d.' % part['part'])
+        columns = [np.memmap(path + name, dtype=dtype, mode='r', shape=(part['rows'],))
+                   for name, dtype in COLUMNS]
+        success_bits = np.memmap(path + 'success', dtype=np.uint8, mode='r')
+        success = np.unpackbits(success_bits)[:part['rows']].astype(np.bool_)
+        parts.append((part['labels'], columns[0], columns[1], columns[2], success))
+    return parts
+
+
+def bucket_indexes(values):
+    """
+    Vectorized LatencyHistogram.bucket_index
+    :param values: array of non-negative integers
+    :return: Array of indexes of buckets
+    """
+    values = values.astype(np.int64)
+    # Exponent of frexp is equal to bit length of positive integer
+    exponents = np.frexp(values)[1].astype(np.int64)
+    shifts = np.maximum(exponents - LatencyHistogram.SUB_BUCKET_BITS, 0)
+    return (shifts << LatencyHistogram.SUB_BUCKET_HALF_BITS) + (values >> shifts)
+
+
+def grouped_stats(groups, elapsed, success, timestamps=None):
+    """
+    Compute accumulators of samples grouped by group identifiers. Samples are
+    sorted by groups (stable sort keeps order of samples in the file) and all
+    values are computed with reductions of the sorted arrays.
+    :param groups: array of integer identifiers of groups
+    :param elapsed: array of elapsed times
+    :param success: boolean array of successful samples
+    :param timestamps: array of starts of samples, time span of every group is computed, when it is set
+    :return: Dictionary group identifier -> LabelStats
+    """
+    if len(groups) == 0:
+        return {}
+    order = np.argsort(groups, kind='mergesort')
+    groups = groups[order]
+    elapsed = np.asarray(elapsed)[order]
+    success = np.asarray(success)[order]
+
+    starts = np.flatnonzero(np.concatenate(([True], groups[1:] != groups[:-1])))
+    counts = np.diff(np.append(starts, len(groups)))
+    sums = np.add.reduceat(elapsed.astype(np.int64), starts)
+    successes = np.add.reduceat(success.astype(np.int64), starts)
+    minimums = np.minimum.reduceat(elapsed, starts)
+    maximums = np.maximum.reduceat(elapsed, starts)
+    if timestamps is not None:
+        timestamps = np.asarray(timestamps, dtype=np.int64)[order]
+        first_starts = np.minimum.reduceat(timestamps, starts)
+        last_ends = np.maximum.reduceat(timestamps + elapsed, starts)
+
+    # Histogram buckets of all groups at once: (position of group, bucket) pairs
+    positions = np.repeat(np.arange(len(starts), dtype=np.int64), counts)
+    pairs, pair_counts = np.unique(positions * BUCKET_LIMIT + bucket_indexes(elapsed), return_counts=True)
+
+    stats_list = []
+    for i in range(len(starts)):
+        stats = LabelStats()
+        stats.count = int(counts[i])
+        stats.elapsed = int(sums[i])
+        stats.success = int(successes[i])
+        stats.min = int(minimums[i])
+        stats.max = int(maximums[i])
+        if timestamps is not None:
+            stats.start = int(first_starts[i])
+            stats.end = int(last_ends[i])
+        stats.histogram.total = stats.count
+        stats_list.append(stats)
+    for pair, count in zip(pairs.tolist(), pair_counts.tolist()):
+        stats_list[pair // BUCKET_LIMIT].histogram.counts[pair % BUCKET_LIMIT] = count
+
+    return dict(zip(groups[starts].tolist(), stats_list))
+
+
+def aggregate_columns(labels, codes, elapsed, timestamps, success, window=None):
+    """
+    Compute per-label accumulators from columns of JTL file
+    :param labels: list of labels indexed by codes
+    :param window: length of time windows of timeline in milliseconds
+    :return: Dictionary label -> LabelStats
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    results = {}
+    for code, stats in grouped_stats(codes, elapsed, success, timestamps=timestamps).items():
+        stats.window = window
+        stats.windows = {} if window else None
+        results[labels[code]] = stats
+
+    if window and len(codes) > 0:
+        window_starts = np.asarray(timestamps) - np.asarray(timestamps) % window
+        first_start = int(window_starts.min())
+        window_count = (int(window_starts.max()) - first_start) // window + 1
+        groups = codes * window_count + (window_starts - first_start) // window
+        for group, window_stats in grouped_stats(groups, elapsed, success, timestamps=timestamps).items():
+            code, index = divmod(group, window_count)
+            results[labels[code]].windows[first_start + index * window] = window_stats
+
+    return results
+
+
+def load_cached_results(filename, window=None):
+    """
+    Compute per-label accumulators from valid cache of JTL file
+    :return: Dictionary label -> LabelStats or None, when there is no valid cache
+    """
+    parts = load_cache(filename)
+    if parts is None:
+        return None
+    results = {}
+    for labels, codes, elapsed, timestamps, success in parts:
+        merge_results(results, aggregate_columns(labels, codes, elapsed, timestamps, success, window=window))
+    return results
+
+
+def label_codes(labels):
+    """
+    Encode labels to integer codes
+    :param labels: list of labels
+    :return: tuple (list of distinct labels, array of codes)
+    """
+    distinct_labels = sorted(set(labels))
+    codes_dict = dict((label, code) for code, label in enumerate(distinct_labels))
+    codes = np.fromiter(map(codes_dict.__getitem__, labels), dtype=np.int64, count=len(labels))
+    return distinct_labels, codes
+
+
+def load_chunk(text):
+    """
+    Load columns of lines of JTL file to typed arrays. The C parser of
+    np.loadtxt is used, when it supports quoted fields, the csv module
+    is used otherwise, or when lines can not be loaded by np.loadtxt.
+    :param text: decoded lines
+    :return: tuple (labels, codes, elapsed, timestamps, success)
+    """
+    if LOADTXT_QUOTECHAR:
+        try:
+            table = np.loadtxt(io.StringIO(text), delimiter=',', quotechar='"', comments=None, ndmin=1,
+                               usecols=(TIMESTAMP, ELAPSED, LABEL, SUCCESS), dtype=LOADTXT_DTYPE)
+        except ValueError:
+            table = None
+        if table is not None:
+            labels, codes = label_codes(table['label'].tolist())
+            # Longer labels would be truncated
+            if max(len(label) for label in labels) < LOADTXT_LABEL_WIDTH:
+                return labels, codes, table['elapsed'], table['timestamp'], table['success'] == "true"
+    columns = list(zip(*csv.reader(text.splitlines(True))))
+    labels, codes = label_codes(columns[LABEL])
+    elapsed = np.asarray(columns[ELAPSED]).astype(np.int32)
+    timestamps = np.asarray(columns[TIMESTAMP]).astype(np.int64)
+    success = np.asarray(columns[SUCCESS]) == "true"
+    return labels, codes, elapsed, timestamps, success
+
+
+def read_column_chunks(lines, chunk_rows=LOAD_CHUNK_ROWS):
+    """
+    Generator of columns of lines of JTL file converted to typed arrays in bulk,
+    chunk by chunk. Rows with quoted new lines must not be split between chunks.
+    :param lines: iterable of lines (without header) read from file in binary mode
+    :param chunk_rows: number of rows in one chunk
+    :return: Generator of tuples (labels, codes, elapsed, timestamps, success)
+    """
+    lines = iter(lines)
+    while True:
+        chunk = list(itertools.islice(lines, chunk_rows))
+        if not chunk:
+            return
+        yield load_chunk(decode_line(b''.join(chunk)))
+
+
+def aggregate_lines_vectorized(lines, window=None, writer=None):
+    """
+    Numpy backend of jtl_stats.aggregate_rows(): lines are converted to
+    columns in chunks and every chunk is aggregated with vectorized operations
+    :param lines: iterable of lines (without header) read from file in binary mode
+    :param window: length of time windows of timeline in milliseconds
+    :param writer: instance of ColumnsWriter, which writes columns to cache
+    :return: Dictionary label -> LabelStats
+    """
+    results = {}
+    for labels, codes, elapsed, timestamps, success in read_column_chunks(lines):
+        if writer is not None:
+            writer.write_columns(labels, codes, elapsed, timestamps, success)
+        merge_results(results, aggregate_columns(labels, codes, elapsed, timestamps, success, window=window))
+    return results
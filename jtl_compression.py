@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2017 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 3 (GPLv3). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv3
+# along with this software; if not, see
+# https://www.gnu.org/licenses/gpl-3.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv3. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+
+"""
+Transparent compression of results files. Compressed input files (gzip, xz
+or zstd) are detected by magic bytes, not by names, and they are decompressed
+while they are read, thus decompressed copy of the file is never written.
+Output files are compressed, when their names end with .gz, .xz or .zst.
+
+Gzip is always available, xz requires lzma module (backports.lzma on Python 2)
+and zstd requires zstandard module.
+"""
+
+import io
+import json
+import os
+import sys
+
+PY3 = sys.version_info[0] >= 3
+
+# Size of buffer of decompressed data, big reads make decompression faster
+READ_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Magic bytes at the beginning of compressed files
+MAGIC_BYTES = (
+    (b'\x1f\x8b', 'gzip'),
+    (b'\xfd7zXZ\x00', 'xz'),
+    (b'\x28\xb5\x2f\xfd', 'zstd'),
+)
+
+# Suffixes of names of output files, which are compressed
+SUFFIXES = {
+    '.gz': 'gzip',
+    '.xz': 'xz',
+    '.zst': 'zstd',
+}
+
+# Modules required by compressions
+MODULES = {
+    'gzip': 'gzip',
+    'xz': 'lzma',
+    'zstd': 'zstandard',
+}
+
+
+def detect_compression(filename):
+    """
+    Detect compression of file from its first bytes
+    :param filename: name of file
+    :return: 'gzip', 'xz', 'zstd' or None, when the file is not compressed
+    """
+    with open(filename, 'rb') as input_file:
+        head = input_file.read(max(len(magic) for magic, _ in MAGIC_BYTES))
+    for magic, compression in MAGIC_BYTES:
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def is_compressed(filename):
+    """Return True, when file is compressed by any supported compression"""
+    return detect_compression(filename) is not None
+
+
+def import_lzma():
+    try:
+        import lzma
+    except ImportError:
+        from backports import lzma
+    return lzma
+
+
+def missing_module(filenames):
+    """
+    Find module required by compression of any file, which is not installed
+    :param filenames: list of names of files
+    :return: tuple (filename, name of module) or None, when all files can be read
+    """
+    for filename in filenames:
+        # Files, which do not exist yet, are not compressed
+        if not os.path.isfile(filename):
+            continue
+        compression = detect_compression(filename)
+        if compression is None:
+            continue
+        try:
+            if compression == 'xz':
+                import_lzma()
+            else:
+                __import__(MODULES[compression])
+        except ImportError:
+            return filename, MODULES[compression]
+    return None
+
+
+def compressed_file(filename, compression, mode):
+    """
+    Open compressed file in binary mode
+    :param compression: 'gzip', 'xz' or 'zstd'
+    :param mode: 'rb' or 'wb'
+    :return: file object
+    """
+    if compression == 'gzip':
+        import gzip
+        return gzip.GzipFile(filename, mode)
+    if compression == 'xz':
+        return import_lzma().LZMAFile(filename, mode)
+    import zstandard
+    raw_file = open(filename, mode)
+    if mode == 'rb':
+        # Files compressed by zstd command line tool can consist of several frames
+        return zstandard.ZstdDecompressor().stream_reader(raw_file, read_size=READ_BUFFER_SIZE,
+                                                         read_across_frames=True, closefd=True)
+    return zstandard.ZstdCompressor().stream_writer(raw_file, closefd=True)
+
+
+def open_input(filename):
+    """
+    Open plain or compressed file for reading in binary mode. Compressed
+    file is decompressed in blocks of READ_BUFFER_SIZE bytes.
+    :param filename: name of file
+    :return: file object, which can be iterated by lines
+    """
+    compression = detect_compression(filename)
+    if compression is None:
+        return open(filename, 'rb')
+    return io.BufferedReader(compressed_file(filename, compression, 'rb'), buffer_size=READ_BUFFER_SIZE)
+
+
+def open_output(filename):
+    """
+    Open file for writing of text, the file is compressed, when its
+    name ends with one of SUFFIXES
+    :param filename: name of file
+    :return: file object
+    """
+    compression = SUFFIXES.get(os.path.splitext(filename)[1])
+    if compression is None:
+        return open(filename, 'w')
+    output_file = compressed_file(filename, compression, 'wb')
+    if PY3:
+        return io.TextIOWrapper(output_file, encoding='utf-8')
+    return output_file
+
+
+def load_json(filename):
+    """
+    Load JSON from plain or compressed file
+    :param filename: name of file
+    :return: loaded data
+    """
+    with open_input(filename) as input_file:
+        return json.loads(input_file.read().decode('utf-8'))
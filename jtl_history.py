@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2017 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 3 (GPLv3). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv3
+# along with this software; if not, see
+# https://www.gnu.org/licenses/gpl-3.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv3. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+
+"""
+Append-only history of results of performance tests stored in SQLite
+database. Every run of a test is stored with name of the test, candlepin
+branch and time of the run. Aggregated results and histograms of elapsed
+times of every API label are stored in rows indexed by run and label,
+thus the last runs of one test and branch are loaded without reading
+results of other runs.
+"""
+
+import json
+import sqlite3
+import time
+
+from jtl_stats import PERCENTILES, percentile_key, LatencyHistogram
+
+SCHEMA = """
+create table if not exists runs (
+    id integer primary key autoincrement,
+    test text not null,
+    branch text not null,
+    timestamp integer not null,
+    source text
+);
+create index if not exists runs_test_branch_timestamp on runs (test, branch, timestamp);
+create table if not exists results (
+    run_id integer not null references runs (id),
+    label text not null,
+    count integer not null,
+    success integer not null,
+    elapsed integer,
+    average integer not null,
+    success_pct integer not null,
+    min integer,
+    max integer,
+    throughput real,
+    concurrency real,
+    percentiles text,
+    histogram text,
+    primary key (run_id, label)
+);
+create index if not exists results_label_run on results (label, run_id);
+"""
+
+RESULT_COLUMNS = ('label', 'count', 'success', 'elapsed', 'average', 'success_pct', 'min', 'max',
+                  'throughput', 'concurrency', 'percentiles', 'histogram')
+
+# Columns added to results table after its creation: name -> type
+ADDED_COLUMNS = (('throughput', 'real'), ('concurrency', 'real'))
+
+# Values required in results of every label
+REQUIRED_KEYS = ('count', 'success', 'average', 'success_%')
+
+
+def results_error(results):
+    """
+    Check structure of results parsed by parse-jtl.py -p
+    :param results: loaded JSON data
+    :return: description of the first problem or None, when the results are valid
+    """
+    if not isinstance(results, dict) or not results:
+        return "it is not a non-empty dictionary of API calls"
+    for label, result in sorted(results.items()):
+        if not isinstance(result, dict):
+            return "results of API call %s are not a dictionary" % label
+        missing = [key for key in REQUIRED_KEYS if not isinstance(result.get(key), (int, float))]
+        if missing:
+            return "results of API call %s have no numeric %s" % (label, ", ".join(missing))
+    return None
+
+
+class ResultsHistory(object):
+    """
+    History of results of performance tests. Runs are only appended,
+    existing runs are never changed.
+    """
+
+    def __init__(self, filename):
+        self.connection = sqlite3.connect(filename)
+        self.connection.executescript(SCHEMA)
+        self._add_columns()
+
+    def _add_columns(self):
+        """
+        Add new columns to results table of history created by older version
+        :return: None
+        """
+        existing = set(row[1] for row in self.connection.execute("pragma table_info(results)"))
+        with self.connection:
+            for name, column_type in ADDED_COLUMNS:
+                if name not in existing:
+                    self.connection.execute("alter table results add column %s %s" % (name, column_type))
+
+    def close(self):
+        self.connection.close()
+
+    def add_run(self, test, branch, results, timestamp=None, source=None):
+        """
+        Append results of one run of performance test
+        :param test: name of the test, e.g. candlepin-throughput
+        :param branch: candlepin branch or version, e.g. 2.3
+        :param results: dictionary label -> dictionary with results (see LabelStats.to_dict()),
+                        histograms are stored, when results contain them
+        :param timestamp: time of the run in seconds since epoch (default: now)
+        :param source: name of results file of the run
+        :return: id of the run
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        with self.connection:
+            cursor = self.connection.execute(
+                "insert into runs (test, branch, timestamp, source) values (?, ?, ?, ?)",
+                (test, branch, int(timestamp), source))
+            run_id = cursor.lastrowid
+            self.connection.executemany(
+                "insert into results (run_id, %s) values (?, %s)" % (
+                    ", ".join(RESULT_COLUMNS), ", ".join("?" * len(RESULT_COLUMNS))),
+                [(run_id, label, result['count'], result['success'], result.get('elapsed'),
+                  result['average'], result['success_%'], result.get('min'), result.get('max'),
+                  result.get('throughput'), result.get('concurrency'),
+                  json.dumps(dict((percentile_key(percent), result[percentile_key(percent)])
+                                  for percent in PERCENTILES if percentile_key(percent) in result)),
+                  json.dumps(result['histogram']) if result.get('histogram') is not None else None)
+                 for label, result in results.items()])
+        return run_id
+
+    def last_runs(self, test, branch=None, last=None):
+        """
+        Find the last runs of test
+        :param test: name of the test
+        :param branch: candlepin branch, runs of all branches are used, when it is None
+        :param last: maximal number of runs, all runs are returned, when it is None
+        :return: list of tuples (id, test, branch, timestamp, source) from the newest run
+        """
+        query = "select id, test, branch, timestamp, source from runs where test = ?"
+        parameters = [test]
+        if branch is not None:
+            query += " and branch = ?"
+            parameters.append(branch)
+        query += " order by timestamp desc, id desc"
+        if last is not None:
+            query += " limit ?"
+            parameters.append(last)
+        return self.connection.execute(query, parameters).fetchall()
+
+    def load_results(self, run_ids, label=None):
+        """
+        Load results of runs
+        :param run_ids: list of ids of runs
+        :param label: load only results of this API label
+        :return: dictionary run id -> label -> dictionary with results
+        """
+        results = dict((run_id, {}) for run_id in run_ids)
+        if not run_ids:
+            return results
+        query = "select run_id, %s from results where run_id in (%s)" % (
+            ", ".join(RESULT_COLUMNS), ", ".join("?" * len(run_ids)))
+        parameters = list(run_ids)
+        if label is not None:
+            query += " and label = ?"
+            parameters.append(label)
+        for row in self.connection.execute(query, parameters):
+            values = dict(zip(RESULT_COLUMNS, row[1:]))
+            result = {
+                'count': values['count'],
+                'num_calls': values['count'],
+                'success': values['success'],
+                'elapsed': values['elapsed'],
+                'average': values['average'],
+                'success_%': values['success_pct'],
+                'min': values['min'],
+                'max': values['max'],
+            }
+            # Throughput is not available in results of older versions of parse-jtl.py
+            for key in ('throughput', 'concurrency'):
+                if values[key] is not None:
+                    result[key] = values[key]
+            result.update(json.loads(values['percentiles'] or '{}'))
+            if values['histogram'] is not None:
+                result['histogram'] = json.loads(values['histogram'])
+            results[row[0]][values['label']] = result
+        return results
+
+    def merged_histograms(self, test, branch=None, last=None):
+        """
+        Merge histograms of elapsed times of the last runs of test
+        :param test: name of the test
+        :param branch: candlepin branch, runs of all branches are used, when it is None
+        :param last: maximal number of runs
+        :return: dictionary label -> LatencyHistogram
+        """
+        histograms = {}
+        runs = self.last_runs(test, branch, last)
+        for run_results in self.load_results([run[0] for run in runs]).values():
+            for label, result in run_results.items():
+                if result.get('histogram'):
+                    histograms.setdefault(label, LatencyHistogram()).merge(
+                        LatencyHistogram.from_pairs(result['histogram']))
+        return histograms
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2017 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 3 (GPLv3). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv3
+# along with this software; if not, see
+# https://www.gnu.org/licenses/gpl-3.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv3. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+
+"""
+Instrumentation of phases of command line tools. With --profile, wall time,
+CPU time, rows processed, rows/s and peak memory of every phase are written
+to JSON summary. With --profile-dump, the whole run is profiled by cProfile
+(pstats file readable by python -m pstats or snakeviz) or by sampling profiler
+(collapsed stacks of all threads readable by flamegraph.pl or speedscope).
+
+CPU time of child processes (e.g. parsing with -j) is counted, when the
+children are finished. Peak memory is the high-water mark of resident memory
+of the process at the end of the phase, thus only phases, which raise it,
+have non-zero growth of peak memory.
+"""
+
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+PROFILERS = ('cprofile', 'sampling')
+
+# Seconds between samples of stacks of sampling profiler
+SAMPLING_INTERVAL = 0.005
+
+
+def add_profile_arguments(parser):
+    """Add options of profiling to argparse parser"""
+    parser.add_argument("--profile", default=None, dest="profile",
+                        help="Write JSON summary with wall and CPU time, rows, rows/s and peak memory "
+                             "of phases to file ('-' for stderr)")
+    parser.add_argument("--profile-dump", default=None, dest="profile_dump",
+                        help="Write profile of the whole run to file, pstats of cProfile or collapsed "
+                             "stacks of sampling profiler")
+    parser.add_argument("--profiler", default="cprofile", choices=PROFILERS, dest="profiler",
+                        help="Profiler used by --profile-dump, cProfile profiles only the main thread "
+                             "(default: cprofile)")
+
+
+# Linux reports peak memory in KiB, macOS in bytes
+MAXRSS_UNIT = 1024.0 * 1024.0 if sys.platform == 'darwin' else 1024.0
+
+
+class Measurement(object):
+    """
+    Wall time, CPU time and peak memory (MiB) at one moment. Peak memory
+    is not measured and CPU time has resolution of clock ticks, when
+    module resource is not available (Windows).
+    """
+
+    def __init__(self):
+        self.wall = time.time()
+        if resource is None:
+            times = os.times()
+            self.cpu, self.children_cpu = times[0] + times[1], times[2] + times[3]
+            self.peak_rss, self.children_peak_rss = None, None
+            return
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        self.cpu = usage.ru_utime + usage.ru_stime
+        self.children_cpu = children.ru_utime + children.ru_stime
+        self.peak_rss = usage.ru_maxrss / MAXRSS_UNIT
+        # The largest finished child process
+        self.children_peak_rss = children.ru_maxrss / MAXRSS_UNIT
+
+
+class Phase(object):
+    """
+    Accumulated measurements of one phase. Phases of the same name, e.g.
+    phase repeated for every file, are accumulated to one record.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.children_cpu = 0.0
+        self.rows = 0
+        self.peak_rss = None
+        self.peak_rss_growth = 0.0
+
+    def add_rows(self, count):
+        """Add number of rows processed by the phase"""
+        self.rows += count
+
+    def add_measurements(self, start, end):
+        self.calls += 1
+        self.wall += end.wall - start.wall
+        self.cpu += end.cpu - start.cpu
+        self.children_cpu += end.children_cpu - start.children_cpu
+        if end.peak_rss is not None:
+            self.peak_rss = end.peak_rss
+            self.peak_rss_growth += end.peak_rss - start.peak_rss
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'calls': self.calls,
+            'wall_seconds': round(self.wall, 6),
+            'cpu_seconds': round(self.cpu, 6),
+            'children_cpu_seconds': round(self.children_cpu, 6),
+            'rows': self.rows,
+            'rows_per_second': round(self.rows / self.wall, 1) if self.rows and self.wall > 0 else None,
+            'peak_rss_mb': round(self.peak_rss, 1) if self.peak_rss is not None else None,
+            'peak_rss_growth_mb': round(self.peak_rss_growth, 1),
+        }
+
+
+class SamplingProfiler(object):
+    """
+    Sampling profiler, which periodically records stacks of all threads in
+    a background thread, thus it adds no overhead to profiled code except of
+    holding of GIL during sampling. Samples are taken in wall time, thus time
+    spent by waiting (e.g. for the database) is visible too.
+    """
+
+    def __init__(self, interval=SAMPLING_INTERVAL):
+        import threading
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler')
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = self._thread.ident
+        while not self._stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append('%s:%s' % (os.path.basename(code.co_filename), code.co_name))
+                    frame = frame.f_back
+                key = ';'.join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def dump(self, filename):
+        """Write collapsed stacks, one line "frame;frame;... count" per stack"""
+        with open(filename, 'w') as dump_file:
+            for stack, count in sorted(self.stacks.items()):
+                dump_file.write('%s %d\n' % (stack, count))
+
+
+class Profiler(object):
+    """
+    Recorder of phases of one run of a tool. Profiler without summary file
+    and dump file is disabled and its phases measure nothing.
+    """
+
+    def __init__(self, tool=None, summary=None, dump=None, profiler='cprofile'):
+        self.tool = tool
+        self.summary = summary
+        self.dump = dump
+        self.phases = []
+        self._phases_by_name = {}
+        self._start = Measurement() if summary else None
+        self._profile = None
+        if dump and profiler == 'cprofile':
+            import cProfile
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        elif dump:
+            self._profile = SamplingProfiler()
+            self._profile.start()
+
+    @classmethod
+    def from_options(cls, options, tool):
+        """Create profiler from options added by add_profile_arguments()"""
+        return cls(tool, summary=options.profile, dump=options.profile_dump, profiler=options.profiler)
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Measure phase of the run, rows processed by the phase are added
+        to the yielded Phase by add_rows()
+        """
+        try:
+            record = self._phases_by_name[name]
+        except KeyError:
+            record = self._phases_by_name[name] = Phase(name)
+            self.phases.append(record)
+        if self._start is None:
+            yield record
+            return
+        start = Measurement()
+        try:
+            yield record
+        finally:
+            record.add_measurements(start, Measurement())
+
+    def to_dict(self):
+        end = Measurement()
+        return {
+            'tool': self.tool,
+            'argv': sys.argv[1:],
+            'python': '%d.%d.%d' % sys.version_info[:3],
+            'wall_seconds': round(end.wall - self._start.wall, 6),
+            'cpu_seconds': round(end.cpu - self._start.cpu, 6),
+            'children_cpu_seconds': round(end.children_cpu - self._start.children_cpu, 6),
+            'peak_rss_mb': round(end.peak_rss, 1) if end.peak_rss is not None else None,
+            'children_peak_rss_mb': round(end.children_peak_rss, 1) if end.children_peak_rss is not None else None,
+            'phases': [phase.to_dict() for phase in self.phases if phase.calls],
+        }
+
+    def finish(self):
+        """Stop profiling and write summary and dump of profile"""
+        if self._profile is not None:
+            if hasattr(self._profile, 'disable'):
+                self._profile.disable()
+                self._profile.dump_stats(self.dump)
+            else:
+                self._profile.stop()
+                self._profile.dump(self.dump)
+            self._profile = None
+        if self.summary:
+            summary_txt = json.dumps(self.to_dict(), sort_keys=True, indent=2, separators=(',', ': '))
+            if self.summary == '-':
+                sys.stderr.write(summary_txt + '\n')
+            else:
+                with open(self.summary, 'w') as summary_file:
+                    summary_file.write(summary_txt + '\n')
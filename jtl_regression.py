@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2017 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 3 (GPLv3). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv3
+# along with this software; if not, see
+# https://www.gnu.org/licenses/gpl-3.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv3. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+
+"""
+Two-sample tests of regression of elapsed times computed from histograms
+(see jtl_stats.LatencyHistogram). Both histograms use the same buckets,
+thus the tests iterate over buckets instead of samples and they take the
+same time for thousands and millions of samples. Values in one bucket
+are treated as ties.
+
+Effect size is the probability that elapsed time of current run is
+bigger than elapsed time of baseline (Vargha-Delaney A, 0.5 means no
+difference, 0.56, 0.64 and 0.71 are small, medium and large effects).
+"""
+
+import math
+
+METHODS = ('mannwhitney', 'ks')
+
+# Number of terms of series of Kolmogorov distribution
+KS_SERIES_TERMS = 100
+
+
+def merged_buckets(current, baseline):
+    """
+    Iterate over buckets of both histograms from the lowest one
+    :return: generator of tuples (count of current, count of baseline)
+    """
+    for index in sorted(set(current.counts) | set(baseline.counts)):
+        yield current.counts.get(index, 0), baseline.counts.get(index, 0)
+
+
+def mann_whitney(current, baseline):
+    """
+    Mann-Whitney U test with correction for ties
+    :param current: histogram of current elapsed times
+    :param baseline: histogram of baseline elapsed times
+    :return: tuple (U statistic of current sample, two-sided p-value)
+    """
+    current_total, baseline_total = current.total, baseline.total
+    u_statistic = 0.0
+    ties = 0.0
+    baseline_below = 0
+    for current_count, baseline_count in merged_buckets(current, baseline):
+        u_statistic += current_count * (baseline_below + 0.5 * baseline_count)
+        baseline_below += baseline_count
+        tied = float(current_count + baseline_count)
+        ties += tied ** 3 - tied
+    total = float(current_total + baseline_total)
+    variance = current_total * baseline_total / 12.0 * ((total + 1) - ties / (total * (total - 1)))
+    if variance <= 0:
+        return u_statistic, 1.0
+    z_score = (u_statistic - current_total * baseline_total / 2.0) / math.sqrt(variance)
+    return u_statistic, math.erfc(abs(z_score) / math.sqrt(2))
+
+
+def kolmogorov_smirnov(current, baseline):
+    """
+    Two-sample Kolmogorov-Smirnov test with asymptotic p-value
+    :param current: histogram of current elapsed times
+    :param baseline: histogram of baseline elapsed times
+    :return: tuple (D statistic, p-value)
+    """
+    current_cdf = baseline_cdf = 0.0
+    distance = 0.0
+    for current_count, baseline_count in merged_buckets(current, baseline):
+        current_cdf += float(current_count) / current.total
+        baseline_cdf += float(baseline_count) / baseline.total
+        distance = max(distance, abs(current_cdf - baseline_cdf))
+    effective = math.sqrt(float(current.total) * baseline.total / (current.total + baseline.total))
+    statistic = (effective + 0.12 + 0.11 / effective) * distance
+    if statistic < 0.2:
+        return distance, 1.0
+    p_value = 2.0 * sum((-1) ** (term - 1) * math.exp(-2.0 * term ** 2 * statistic ** 2)
+                        for term in range(1, KS_SERIES_TERMS + 1))
+    return distance, min(max(p_value, 0.0), 1.0)
+
+
+def normal_quantile(probability):
+    """Return quantile of standard normal distribution (bisection of its CDF)"""
+    low, high = -10.0, 10.0
+    for _ in range(100):
+        middle = (low + high) / 2.0
+        if 0.5 * math.erfc(-middle / math.sqrt(2)) < probability:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2.0
+
+
+def superiority_interval(effect, current_total, baseline_total, confidence):
+    """
+    Confidence interval of probability of superiority (Hanley-McNeil standard error)
+    :param effect: probability that current value is bigger than baseline value
+    :param confidence: confidence level in percents
+    :return: tuple (lower, upper) bound
+    """
+    q1 = effect / (2.0 - effect)
+    q2 = 2.0 * effect ** 2 / (1.0 + effect)
+    variance = (effect * (1.0 - effect) + (current_total - 1) * (q1 - effect ** 2) +
+                (baseline_total - 1) * (q2 - effect ** 2)) / (float(current_total) * baseline_total)
+    margin = normal_quantile(0.5 + confidence / 200.0) * math.sqrt(max(variance, 0.0))
+    return max(effect - margin, 0.0), min(effect + margin, 1.0)
+
+
+def regression_test(current, baseline, method='mannwhitney', alpha=0.01, min_effect=0.56, confidence=95.0):
+    """
+    Test, whether elapsed times of current run are bigger than elapsed times of baseline
+    :param current: histogram of current elapsed times
+    :param baseline: histogram of baseline elapsed times
+    :param method: 'mannwhitney' or 'ks'
+    :param alpha: significance level of the test
+    :param min_effect: minimal probability of superiority of current elapsed times considered as regression
+    :param confidence: confidence level of interval of effect size in percents
+    :return: dictionary with statistic, p_value, effect, interval (lower, upper) and regression (bool)
+    """
+    u_statistic, p_value = mann_whitney(current, baseline)
+    statistic = u_statistic
+    if method == 'ks':
+        statistic, p_value = kolmogorov_smirnov(current, baseline)
+    effect = u_statistic / (float(current.total) * baseline.total)
+    return {
+        'method': method,
+        'statistic': statistic,
+        'p_value': p_value,
+        'effect': effect,
+        'interval': superiority_interval(effect, current.total, baseline.total, confidence),
+        'regression': p_value < alpha and effect >= min_effect,
+    }
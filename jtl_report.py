@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2017 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 3 (GPLv3). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv3
+# along with this software; if not, see
+# https://www.gnu.org/licenses/gpl-3.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv3. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+
+"""
+Rendering of histograms of elapsed times of API calls.
+
+Bins of histograms are computed from buckets of LatencyHistogram of every
+API call, thus raw elapsed times of samples are never kept in memory. Every
+API call is rendered to its own page of PDF file (requires matplotlib)
+or to its own SVG chart of HTML file (requires only numpy).
+"""
+
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+# Normalize to 15 buckets for each histogram
+BIN_COUNT = 15
+
+# Size of one page (two charts) of PDF file in inches
+PAGE_SIZE = (20, 5)
+
+# Size of one chart of HTML file in pixels
+SVG_WIDTH = 640
+SVG_HEIGHT = 320
+SVG_MARGIN = 50
+
+
+def bucket_arrays(histogram, minimum, maximum):
+    """
+    Convert buckets of histogram to arrays, ranges of buckets are limited
+    by the minimal and the maximal elapsed time
+    :param histogram: LatencyHistogram
+    :return: tuple (array of the lowest values, array of the highest values, array of counts)
+    """
+    indexes = sorted(histogram.counts)
+    ranges = np.asarray([histogram.bucket_range(index) for index in indexes], dtype=np.float64).reshape(-1, 2)
+    lows = np.maximum(ranges[:, 0], minimum)
+    highs = np.minimum(ranges[:, 1], maximum)
+    counts = np.asarray([histogram.counts[index] for index in indexes], dtype=np.float64)
+    return lows, highs, counts
+
+
+def count_below(lows, highs, counts, value):
+    """
+    Estimate number of samples lower than value, samples of every bucket
+    are spread uniformly over integer values of the bucket
+    :return: float
+    """
+    widths = highs - lows + 1
+    return float(np.sum(counts * np.clip(np.ceil(value) - lows, 0, widths) / widths))
+
+
+def compute_chart(title, lows, highs, counts):
+    """
+    Compute bins of one histogram from buckets of elapsed times
+    :return: Dictionary with title, counts and edges of bins
+    """
+    minimum, maximum = lows.min(), highs.max()
+    if minimum == maximum:
+        # The same range as np.histogram() uses for equal values
+        minimum, maximum = minimum - 0.5, maximum + 0.5
+    edges = np.linspace(minimum, maximum, BIN_COUNT + 1)
+    below = [count_below(lows, highs, counts, edge) for edge in edges[:-1]] + [counts.sum()]
+    # Cumulative counts are rounded, thus counts of bins are integers and their sum is the number of samples
+    bins = np.diff(np.round(below)).astype(np.int64)
+    return {'title': title, 'counts': bins.tolist(), 'edges': edges.tolist()}
+
+
+def describe(lows, highs, counts):
+    """
+    Estimate average, median and standard deviation of samples in buckets.
+    Values lower than LatencyHistogram.SUB_BUCKET_COUNT are exact, errors of
+    bigger values are limited by width of buckets.
+    :return: tuple (average, median, standard deviation)
+    """
+    total = counts.sum()
+    middles = (lows + highs) / 2.0
+    average = float(np.sum(counts * middles) / total)
+    # Variance of integer values spread uniformly over a bucket is added to variance of middles of buckets
+    variance = np.sum(counts * ((middles - average) ** 2 + ((highs - lows + 1) ** 2 - 1) / 12.0)) / total
+    cumulative = np.cumsum(counts)
+    index = min(int(np.searchsorted(cumulative, total / 2.0)), len(counts) - 1)
+    fraction = (total / 2.0 - (cumulative[index] - counts[index])) / counts[index]
+    median = lows[index] + fraction * (highs[index] - lows[index])
+    return average, median, float(np.sqrt(variance))
+
+
+def compute_page(key, histogram, minimum, maximum):
+    """
+    Compute histograms of all samples of API call and of samples
+    up to 95 percentile (outliers are removed). Bins are computed from
+    buckets of LatencyHistogram, thus raw elapsed times are not needed.
+    :param key: API call
+    :param histogram: LatencyHistogram of elapsed times of all samples
+    :param minimum: the minimal elapsed time
+    :param maximum: the maximal elapsed time
+    :return: Dictionary with API call and list of charts
+    """
+    lows, highs, counts = bucket_arrays(histogram, minimum, maximum)
+    average, median, std_dev = describe(lows, highs, counts)
+    charts = [compute_chart(
+        key + " (sample size: {samples})\n avg = {avg}, median = {median}, "
+              "std_dev={std_dev}".format(
+                  samples=histogram.total,
+                  avg=int(average),
+                  median=int(median),
+                  std_dev=int(std_dev)
+              ),
+        lows, highs, counts
+    )]
+
+    # Remove outliers (over over 95 percentile) and plot that as well
+    # Middle of bucket can be out of the range of elapsed times
+    percentile = min(max(histogram.percentile(95), minimum), maximum)
+    widths = highs - lows + 1
+    kept_widths = np.clip(percentile - lows, 0, widths)
+    kept = kept_widths > 0
+
+    # Skip plot if there is no data
+    if kept.any():
+        lows_minimized = lows[kept]
+        highs_minimized = np.minimum(highs[kept], percentile - 1)
+        counts_minimized = counts[kept] * kept_widths[kept] / widths[kept]
+        average, median, std_dev = describe(lows_minimized, highs_minimized, counts_minimized)
+        charts.append(compute_chart(
+            key + " up to 95 percentile (sample size: {samples})\n avg = {avg}, median = {median}, "
+                  "std_dev={std_dev}, percentile cutoff={percentile}".format(
+                      avg=int(average),
+                      median=int(median),
+                      std_dev=int(std_dev),
+                      percentile=percentile,
+                      samples=int(round(counts_minimized.sum()))
+                  ),
+            lows_minimized, highs_minimized, counts_minimized
+        ))
+    return {'key': key, 'charts': charts}
+
+
+def compute_pages(result_set, histograms):
+    """
+    Compute histograms of all API calls. Bins are computed from bounded
+    histograms in a fraction of time needed to start a pool of processes,
+    thus they are computed in this process.
+    :param result_set: dictionary with results (the minimal and the maximal elapsed times are used)
+    :param histograms: dictionary API call -> LatencyHistogram
+    :return: List of pages sorted by API calls
+    """
+    return [compute_page(key, histogram, result_set[key]['min'], result_set[key]['max'])
+            for key, histogram in sorted(histograms.items()) if histogram.total]
+
+
+def draw_page(page):
+    """
+    Draw charts of one page to new matplotlib figure. The figure is not
+    managed by pyplot, thus it is released as soon as it is not used.
+    :return: instance of matplotlib.figure.Figure
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=PAGE_SIZE)
+    FigureCanvasAgg(figure)
+    for number, chart in enumerate(page['charts']):
+        axes = figure.add_subplot(1, 2, number + 1)
+        edges = np.asarray(chart['edges'])
+        axes.bar(edges[:-1], chart['counts'], width=np.diff(edges), align='edge')
+        axes.set_xlabel("Miliseconds")
+        axes.set_ylabel("Sample Count")
+        axes.set_title(chart['title'])
+        axes.grid(True)
+    figure.tight_layout()
+    return figure
+
+
+def write_pdf(filename, pages):
+    """
+    Write every page to its own page of PDF file. Charts are drawn as vector
+    graphics, thus pages are drawn one by one in this process.
+    :param filename: name of PDF file
+    :param pages: list of pages returned by compute_pages()
+    :return: None
+    """
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    with PdfPages(filename) as pdf:
+        for page in pages:
+            pdf.savefig(draw_page(page))
+
+
+def svg_chart(chart):
+    """
+    Render one histogram to SVG
+    :return: SVG element (text)
+    """
+    counts = chart['counts']
+    edges = chart['edges']
+    max_count = max(max(counts), 1)
+    plot_width = SVG_WIDTH - 2 * SVG_MARGIN
+    plot_height = SVG_HEIGHT - 2 * SVG_MARGIN
+    bar_width = float(plot_width) / len(counts)
+
+    elements = []
+    for number, count in enumerate(counts):
+        height = plot_height * float(count) / max_count
+        elements.append(
+            '<rect x="%.1f" y="%.1f" width="%.1f" height="%.1f" fill="#1f77b4">'
+            '<title>%d - %d ms: %d</title></rect>' % (
+                SVG_MARGIN + number * bar_width, SVG_MARGIN + plot_height - height,
+                max(bar_width - 1, 1), height, edges[number], edges[number + 1], count))
+    # Axes with minimal, middle and maximal values
+    bottom = SVG_MARGIN + plot_height
+    elements.append('<line x1="%d" y1="%d" x2="%d" y2="%d" stroke="black"/>' % (
+        SVG_MARGIN, bottom, SVG_MARGIN + plot_width, bottom))
+    elements.append('<line x1="%d" y1="%d" x2="%d" y2="%d" stroke="black"/>' % (
+        SVG_MARGIN, SVG_MARGIN, SVG_MARGIN, bottom))
+    for fraction in (0.0, 0.5, 1.0):
+        elements.append('<text x="%.1f" y="%d" font-size="11" text-anchor="middle">%d</text>' % (
+            SVG_MARGIN + fraction * plot_width, bottom + 15, edges[0] + fraction * (edges[-1] - edges[0])))
+        elements.append('<text x="%d" y="%.1f" font-size="11" text-anchor="end">%d</text>' % (
+            SVG_MARGIN - 5, bottom - fraction * plot_height, fraction * max_count))
+    elements.append('<text x="%d" y="%d" font-size="11" text-anchor="middle">Miliseconds</text>' % (
+        SVG_MARGIN + plot_width // 2, SVG_HEIGHT - 10))
+    for number, line in enumerate(chart['title'].split('\n')):
+        elements.append('<text x="%d" y="%d" font-size="12" text-anchor="middle">%s</text>' % (
+            SVG_WIDTH // 2, 15 + 14 * number, escape(line.strip())))
+    return '<svg xmlns="http://www.w3.org/2000/svg" width="%d" height="%d">%s</svg>' % (
+        SVG_WIDTH, SVG_HEIGHT, ''.join(elements))
+
+
+def write_html(filename, pages):
+    """
+    Write histograms of all pages to HTML file with inline SVG charts
+    :param filename: name of HTML file
+    :param pages: list of pages returned by compute_pages()
+    :return: None
+    """
+    with open(filename, 'w') as html_file:
+        html_file.write('<!DOCTYPE html>\n<html><head><meta charset="utf-8">'
+                        '<title>Histograms of elapsed times</title></head><body>\n')
+        for page in pages:
+            html_file.write('<h2>%s</h2>\n<div>' % escape(page['key']))
+            for chart in page['charts']:
+                html_file.write(svg_chart(chart))
+            html_file.write('</div>\n')
+        html_file.write('</body></html>\n')
+
+
+def write_report(filename, result_set, histograms):
+    """
+    Write histograms of all API calls to HTML file, when name of the file
+    ends with .html or .htm, or to PDF file otherwise
+    :param filename: name of the file
+    :param result_set: dictionary with results
+    :param histograms: dictionary API call -> LatencyHistogram
+    :return: None
+    """
+    pages = compute_pages(result_set, histograms)
+    if filename.endswith('.html') or filename.endswith('.htm'):
+        write_html(filename, pages)
+    else:
+        write_pdf(filename, pages)
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2017 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 3 (GPLv3). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv3
+# along with this software; if not, see
+# https://www.gnu.org/licenses/gpl-3.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv3. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+
+"""
+Index of the slowest and failed samples of every API label. The index is
+built in the same streaming pass as aggregation of results and it keeps
+only a bounded heap of the top_k slowest samples and the first max_failed
+failed samples of every label, thus its size does not depend on the size
+of results files. Every indexed sample keeps byte offset of its row in
+the results file, thus the original row can be read without scanning of
+the file again (offsets in compressed files are offsets in decompressed
+data, thus the file is decompressed up to the row).
+"""
+
+import heapq
+import time
+
+from jtl_compression import open_input, is_compressed
+from jtl_stats import TIMESTAMP, ELAPSED, LABEL, RESPONSE_CODE, RESPONSE_MESSAGE, THREAD_NAME, SUCCESS, \
+    decode_line, parse_timestamp
+
+# Default number of the slowest samples kept for every label
+TOP_K = 10
+
+# Default number of failed samples kept for every label
+MAX_FAILED = 100
+
+# Fields of indexed sample, source is position of the results file in list of files
+SAMPLE_FIELDS = ('elapsed', 'source', 'offset', 'timestamp', 'thread_name', 'response_code', 'response_message',
+                 'success')
+
+# Size of blocks skipped, when compressed file is read up to a row
+SKIP_BLOCK_SIZE = 1024 * 1024
+
+
+class LineOffsets(object):
+    """
+    Iterable of lines read in binary mode, which keeps offset of the end
+    of the last line read from it
+    """
+
+    def __init__(self, lines, offset):
+        self.lines = lines
+        self.offset = offset
+
+    def __iter__(self):
+        for line in self.lines:
+            self.offset += len(line)
+            yield line
+
+
+class LabelSamples(object):
+    """
+    The slowest and failed samples of one label. Samples with the same
+    elapsed time are ordered by their position in results files, thus the
+    kept samples do not depend on splitting of files between processes.
+    """
+
+    def __init__(self, top_k=TOP_K, max_failed=MAX_FAILED):
+        self.top_k = top_k
+        self.max_failed = max_failed
+        # Heap of tuples (elapsed, -source, -offset, sample), the fastest kept sample is the first
+        self.slowest = []
+        self.failed = []
+        self.failed_count = 0
+
+    def _push(self, item):
+        if len(self.slowest) < self.top_k:
+            heapq.heappush(self.slowest, item)
+        elif item > self.slowest[0]:
+            heapq.heapreplace(self.slowest, item)
+
+    def add(self, sample):
+        """
+        Add sample (tuple of SAMPLE_FIELDS) to the index
+        :return: None
+        """
+        self._push((sample[0], -sample[1], -sample[2], sample))
+        if not sample[7]:
+            self.failed_count += 1
+            if len(self.failed) < self.max_failed:
+                self.failed.append(sample)
+
+    def merge(self, other):
+        """
+        Merge samples of the same label from following part of results
+        :param other: LabelSamples
+        :return: None
+        """
+        for item in other.slowest:
+            self._push(item)
+        self.failed.extend(other.failed[:max(self.max_failed - len(self.failed), 0)])
+        self.failed_count += other.failed_count
+
+    def slowest_samples(self):
+        """Return list of the slowest samples from the slowest one"""
+        return [item[3] for item in sorted(self.slowest, reverse=True)]
+
+
+class SampleIndex(object):
+    """
+    Index of samples of all labels of results files
+    """
+
+    def __init__(self, top_k=TOP_K, max_failed=MAX_FAILED, source=0, files=None):
+        self.top_k = top_k
+        self.max_failed = max_failed
+        # Position of recorded results file in files
+        self.source = source
+        self.files = files or []
+        self.labels = {}
+
+    def record(self, rows, lines):
+        """
+        Generator recording rows to the index, rows are passed through unchanged
+        :param rows: iterable of parsed rows, which are read from lines
+        :param lines: LineOffsets with lines of the rows
+        :return: Generator of rows
+        """
+        labels = self.labels
+        source = self.source
+        top_k = self.top_k
+        offset = lines.offset
+        for row in rows:
+            label = row[LABEL]
+            try:
+                label_samples = labels[label]
+            except KeyError:
+                label_samples = labels[label] = LabelSamples(top_k, self.max_failed)
+            elapsed = int(row[ELAPSED])
+            success = row[SUCCESS] == "true"
+            # Later sample with the same elapsed time as the fastest kept one is not kept
+            if not success or len(label_samples.slowest) < top_k or elapsed > label_samples.slowest[0][0]:
+                # Formatted timestamp is kept as it is
+                timestamp = parse_timestamp(row[TIMESTAMP])
+                label_samples.add((elapsed, source, offset, row[TIMESTAMP] if timestamp is None else timestamp,
+                                   row[THREAD_NAME], row[RESPONSE_CODE], row[RESPONSE_MESSAGE], success))
+            yield row
+            # Parser of CSV reads lines of the next row only when the row is requested
+            offset = lines.offset
+
+    def merge(self, other):
+        """
+        Merge index of following part of results
+        :param other: SampleIndex
+        :return: None
+        """
+        for label, other_samples in other.labels.items():
+            if label not in self.labels:
+                self.labels[label] = LabelSamples(self.top_k, self.max_failed)
+            self.labels[label].merge(other_samples)
+
+    def sample_to_dict(self, sample):
+        result = dict(zip(SAMPLE_FIELDS, sample))
+        result['file'] = self.files[result.pop('source')]
+        return result
+
+    def to_dict(self):
+        return {
+            'files': self.files,
+            'top_k': self.top_k,
+            'max_failed': self.max_failed,
+            'labels': dict((label, {
+                'slowest': [self.sample_to_dict(sample) for sample in label_samples.slowest_samples()],
+                'failed': [self.sample_to_dict(sample) for sample in label_samples.failed],
+                'failed_count': label_samples.failed_count,
+            }) for label, label_samples in self.labels.items()),
+        }
+
+
+def format_sample(sample):
+    """
+    Format indexed sample to one line
+    :param sample: dictionary with sample (see SampleIndex.sample_to_dict)
+    :return: text
+    """
+    timestamp = sample['timestamp']
+    if isinstance(timestamp, int):
+        timestamp = "%s.%03d" % (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp // 1000)), timestamp % 1000)
+    return "%dms at %s, thread %s, response %s %s (%s:%d)" % (
+        sample['elapsed'], timestamp, sample['thread_name'], sample['response_code'], sample['response_message'],
+        sample['file'], sample['offset'])
+
+
+def read_lines_at(filename, offsets):
+    """
+    Read lines of results file starting at byte offsets
+    :param filename: name of plain or compressed results file
+    :param offsets: iterable of offsets of lines
+    :return: dictionary offset -> line without line terminator
+    """
+    lines = {}
+    compressed = is_compressed(filename)
+    with open_input(filename) as jtl_file:
+        position = 0
+        # Compressed file is read only forward
+        for offset in sorted(set(offsets)):
+            if not compressed:
+                jtl_file.seek(offset)
+            else:
+                while position < offset:
+                    data = jtl_file.read(min(offset - position, SKIP_BLOCK_SIZE))
+                    if not data:
+                        break
+                    position += len(data)
+            line = jtl_file.readline()
+            position += len(line)
+            lines[offset] = decode_line(line).rstrip('\r\n')
+    return lines
@@ -0,0 +1,678 @@
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2017 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 3 (GPLv3). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv3
+# along with this software; if not, see
+# https://www.gnu.org/licenses/gpl-3.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv3. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+
+"""
+Streaming aggregation of JMeter results (JTL files in CSV format).
+
+Results are read one row at a time and only fixed-size accumulators
+are kept for every API label, so memory usage does not depend on
+the size of the results file.
+"""
+
+import csv
+import multiprocessing
+import os
+import sys
+
+from jtl_compression import open_input, is_compressed
+
+# Indexes of columns in the default JMeter CSV output
+TIMESTAMP = 0
+ELAPSED = 1
+LABEL = 2
+RESPONSE_CODE = 3
+RESPONSE_MESSAGE = 4
+THREAD_NAME = 5
+SUCCESS = 7
+
+PY3 = sys.version_info[0] >= 3
+
+# Percentiles of elapsed times reported for every API label
+PERCENTILES = (50, 90, 95, 99, 99.9)
+
+# Time windows with throughput lower than this fraction of the median
+# throughput at the beginning and at the end of test are warm-up and ramp-down
+STEADY_STATE_FRACTION = 0.8
+
+# Label of results of all API labels together (the same as in JMeter aggregate report)
+TOTAL_LABEL = 'TOTAL'
+
+# Suffix of directory with columnar cache of JTL file (see jtl_columns)
+CACHE_SUFFIX = '.columns'
+
+# Importing of numpy takes longer than aggregation of small JTL files, thus the numpy
+# backend and columnar cache are used by default only for files of at least this size
+NUMPY_MIN_FILE_SIZE = 16 * 1024 * 1024
+
+# Estimated ratio of sizes of decompressed and compressed JTL files
+COMPRESSION_RATIO = 8
+
+
+def percentile_key(percent):
+    """Return name of result key for given percentile (e.g. 'p99.9')"""
+    return 'p%g' % percent
+
+
+def significant(value, digits=4):
+    """
+    Round value to significant digits, rates lower than 1 are not quantized
+    like by rounding to decimal places (e.g. 0.0213 req/s instead of 0.02 req/s)
+    """
+    return float('%.*g' % (digits, value))
+
+
+class LatencyHistogram(object):
+    """
+    Log-bucketed histogram of elapsed times (in milliseconds). Values lower
+    than SUB_BUCKET_COUNT are counted exactly, bigger values are counted in
+    buckets with width at most 1 / 2 ** SUB_BUCKET_HALF_BITS (1/64) of the
+    lowest value of the bucket, thus the middle of bucket (see percentile())
+    differs from any value of the bucket at most by 1/128 of the value.
+    Histograms are mergeable and the number of buckets is bounded by the
+    magnitude of the largest value, not by the number of values.
+    """
+
+    SUB_BUCKET_BITS = 7
+    SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+    SUB_BUCKET_HALF_BITS = SUB_BUCKET_BITS - 1
+
+    def __init__(self):
+        # Sparse mapping: bucket index -> number of values
+        self.counts = {}
+        self.total = 0
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        """
+        Create histogram from list of [bucket index, count] (see LabelStats.to_dict())
+        :return: instance of LatencyHistogram
+        """
+        histogram = cls()
+        for index, count in pairs:
+            histogram.counts[index] = histogram.counts.get(index, 0) + count
+            histogram.total += count
+        return histogram
+
+    @classmethod
+    def bucket_index(cls, value):
+        """Return index of bucket for given value"""
+        if value < cls.SUB_BUCKET_COUNT:
+            return value
+        shift = value.bit_length() - cls.SUB_BUCKET_BITS
+        return (shift << cls.SUB_BUCKET_HALF_BITS) + (value >> shift)
+
+    @classmethod
+    def bucket_range(cls, index):
+        """
+        Return range of values stored in bucket with given index
+        :return: tuple (lowest value, highest value)
+        """
+        if index < cls.SUB_BUCKET_COUNT:
+            return index, index
+        shift = (index >> cls.SUB_BUCKET_HALF_BITS) - 1
+        lowest = (index - (shift << cls.SUB_BUCKET_HALF_BITS)) << shift
+        return lowest, lowest + (1 << shift) - 1
+
+    def add(self, value, count=1):
+        """Record value (non-negative integer) in the histogram"""
+        index = self.bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.total += count
+
+    def merge(self, other):
+        """Add all values of other histogram to this histogram"""
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+
+    def percentile(self, percent):
+        """
+        Return value at given percentile. The value is the middle of bucket,
+        where the percentile is located.
+        :param percent: percentile in range 0 - 100
+        :return: integer value or None, when histogram is empty
+        """
+        if self.total == 0:
+            return None
+        # Rank of the value (1-based) in the sorted list of all values
+        rank = max(1, -(-self.total * percent // 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                lowest, highest = self.bucket_range(index)
+                return (lowest + highest) // 2
+        lowest, highest = self.bucket_range(max(self.counts))
+        return (lowest + highest) // 2
+
+
+class LabelStats(object):
+    """
+    Accumulator of results of one API label
+    """
+
+    def __init__(self, window=None):
+        self.count = 0
+        self.elapsed = 0
+        self.success = 0
+        self.min = None
+        self.max = None
+        # Start of the first sample and end of the last sample in milliseconds,
+        # when timestamps of samples are known
+        self.start = None
+        self.end = None
+        self.histogram = LatencyHistogram()
+        # Accumulators of time windows (start of window -> LabelStats),
+        # when length of window (milliseconds) is set
+        self.window = window
+        self.windows = {} if window else None
+
+    def add(self, elapsed, success, timestamp=None):
+        """
+        Add one sample
+        :param elapsed: elapsed time in milliseconds
+        :param success: True, when the sample was successful
+        :param timestamp: start of the sample in milliseconds or None, throughput is computed
+                          and time windows are updated only by samples with timestamps
+        :return: None
+        """
+        self.count += 1
+        self.elapsed += elapsed
+        if success:
+            self.success += 1
+        if self.min is None or elapsed < self.min:
+            self.min = elapsed
+        if self.max is None or elapsed > self.max:
+            self.max = elapsed
+        if timestamp is not None:
+            if self.start is None or timestamp < self.start:
+                self.start = timestamp
+            if self.end is None or timestamp + elapsed > self.end:
+                self.end = timestamp + elapsed
+        self.histogram.add(elapsed)
+        if self.windows is not None and timestamp is not None:
+            start = timestamp - timestamp % self.window
+            try:
+                window_stats = self.windows[start]
+            except KeyError:
+                window_stats = self.windows[start] = LabelStats()
+            window_stats.add(elapsed, success, timestamp)
+
+    def merge(self, other):
+        """
+        Merge results of other accumulator to this accumulator
+        :param other: instance of LabelStats
+        :return: None
+        """
+        self.count += other.count
+        self.elapsed += other.elapsed
+        self.success += other.success
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+        if other.start is not None and (self.start is None or other.start < self.start):
+            self.start = other.start
+        if other.end is not None and (self.end is None or other.end > self.end):
+            self.end = other.end
+        self.histogram.merge(other.histogram)
+        if self.windows is not None and other.windows is not None:
+            for start, window_stats in other.windows.items():
+                if start not in self.windows:
+                    self.windows[start] = LabelStats()
+                self.windows[start].merge(window_stats)
+
+    def trimmed(self, first, last):
+        """
+        Create accumulator with samples of time windows in the range <first, last>,
+        the histogram of elapsed times is merged only from the included windows
+        :param first: start of the first included window
+        :param last: start of the last included window
+        :return: New instance of LabelStats
+        """
+        stats = LabelStats(window=self.window)
+        for start, window_stats in self.windows.items():
+            if first <= start <= last:
+                stats.windows[start] = window_stats
+                stats.merge(window_stats)
+        return stats
+
+    def to_dict(self, histogram=False, span=None):
+        """
+        Convert accumulated values to dictionary with results
+        :param histogram: add sparse histogram of elapsed times as list of [bucket index, count]
+        :param span: tuple (start, end) of the whole test in milliseconds, throughput and concurrency
+                     are computed over it, thus values of all labels add up to values of the whole
+                     test, time span of samples of this accumulator is used by default
+        :return: Dictionary with results of the label
+        """
+        result = {
+            'count': self.count,
+            'elapsed': self.elapsed,
+            'success': self.success,
+            'success_%': (self.success * 100) // self.count,
+            'average': self.elapsed // self.count,
+            'num_calls': self.count,
+            'min': self.min,
+            'max': self.max,
+        }
+        for percent in PERCENTILES:
+            value = self.histogram.percentile(percent)
+            # Bucket middle can not be out of range of measured values
+            result[percentile_key(percent)] = min(max(value, self.min), self.max)
+        if self.start is not None:
+            # Throughput in requests per second and effective concurrency (Little's law: average
+            # number of requests in progress is throughput multiplied by average elapsed time)
+            start, end = span or (self.start, self.end)
+            duration = max(end - start, 1)
+            result['throughput'] = significant(self.count * 1000.0 / duration)
+            result['concurrency'] = significant(float(self.elapsed) / duration)
+        if histogram:
+            result['histogram'] = [[index, count] for index, count in sorted(self.histogram.counts.items())]
+        return result
+
+
+def module_available(name):
+    """
+    Check that module can be imported without importing it
+    :param name: name of top-level module
+    :return: True, when the module is installed
+    """
+    if PY3:
+        import importlib.util
+        return importlib.util.find_spec(name) is not None
+    import imp
+    try:
+        imp.find_module(name)
+    except ImportError:
+        return False
+    return True
+
+
+def numpy_worthwhile(filenames):
+    """
+    Check that JTL files are big enough to benefit from numpy backend
+    :param filenames: list of names of JTL files
+    :return: True, when total size of the files (decompressed size of compressed files
+             is estimated) is at least NUMPY_MIN_FILE_SIZE
+    """
+    return sum(os.path.getsize(filename) * (COMPRESSION_RATIO if is_compressed(filename) else 1)
+               for filename in filenames) >= NUMPY_MIN_FILE_SIZE
+
+
+def decode_line(line):
+    """Convert line read from binary file to type required by csv module"""
+    if PY3:
+        return line.decode('utf-8', 'replace')
+    return line
+
+
+def read_rows(jtl_file, skip_header=True):
+    """
+    Generator of parsed rows of JTL file opened in binary mode
+    :param jtl_file: file object or other iterable of lines
+    :param skip_header: skip first row with names of columns
+    :return: Generator of lists of column values
+    """
+    reader = csv.reader(decode_line(line) for line in jtl_file)
+    if skip_header:
+        next(reader, None)
+    for row in reader:
+        yield row
+
+
+def parse_timestamp(text):
+    """
+    Parse timestamp of sample in milliseconds since epoch
+    :param text: value of timestamp column
+    :return: integer or None, when timestamp is formatted (JMeter property
+             jmeter.save.saveservice.timestamp_format is not ms)
+    """
+    try:
+        return int(text)
+    except ValueError:
+        return None
+
+
+def aggregate_rows(rows, results=None, window=None):
+    """
+    Add rows of JTL file to per-label accumulators. Samples with formatted
+    timestamps are aggregated without timestamps (see parse_timestamp()).
+    :param rows: iterable of parsed rows
+    :param results: dictionary label -> LabelStats to update
+    :param window: length of time windows of timeline in milliseconds
+    :return: Dictionary label -> LabelStats
+    """
+    if results is None:
+        results = {}
+    for row in rows:
+        label = row[LABEL]
+        try:
+            stats = results[label]
+        except KeyError:
+            stats = results[label] = LabelStats(window=window)
+        stats.add(int(row[ELAPSED]), row[SUCCESS] == "true", parse_timestamp(row[TIMESTAMP]))
+    return results
+
+
+def merge_results(results, other):
+    """
+    Merge dictionary of accumulators to another one
+    :param results: dictionary label -> LabelStats to update
+    :param other: dictionary label -> LabelStats
+    :return: Updated dictionary results
+    """
+    for label, stats in other.items():
+        if label not in results:
+            # Do not share accumulators between dictionaries
+            results[label] = LabelStats(window=stats.window)
+        results[label].merge(stats)
+    return results
+
+
+def total_stats(results):
+    """
+    Merge accumulators of all API labels
+    :param results: dictionary label -> LabelStats
+    :return: LabelStats of all samples or None, when there are no samples
+    """
+    if not results:
+        return None
+    total = LabelStats()
+    for stats in results.values():
+        total.merge(stats)
+    return total
+
+
+def detect_steady_state(results, steady_fraction=STEADY_STATE_FRACTION):
+    """
+    Detect warm-up and ramp-down of the test from throughput of all API labels
+    in time windows. Windows at the beginning and at the end of the test with
+    throughput lower than steady_fraction of the median throughput are not part
+    of the steady state.
+    :param results: dictionary label -> LabelStats with time windows
+    :param steady_fraction: fraction of the median throughput
+    :return: tuple (start of the first steady window, start of the last steady window)
+             or None, when there are no samples
+    """
+    totals = {}
+    window = None
+    for stats in results.values():
+        window = stats.window
+        for start, window_stats in stats.windows.items():
+            totals[start] = totals.get(start, 0) + window_stats.count
+    if not totals:
+        return None
+    # Windows without any sample have zero throughput
+    starts = list(range(min(totals), max(totals) + window, window))
+    counts = sorted(totals.get(start, 0) for start in starts)
+    threshold = counts[len(counts) // 2] * steady_fraction
+    steady_starts = [start for start in starts if totals.get(start, 0) >= threshold]
+    return steady_starts[0], steady_starts[-1]
+
+
+def trim_results(results, first, last):
+    """
+    Create accumulators only with samples of time windows in the range <first, last>
+    :param results: dictionary label -> LabelStats with time windows
+    :return: New dictionary label -> LabelStats
+    """
+    trimmed_results = {}
+    for label, stats in results.items():
+        trimmed_stats = stats.trimmed(first, last)
+        if trimmed_stats.count > 0:
+            trimmed_results[label] = trimmed_stats
+    return trimmed_results
+
+
+def read_lines(jtl_file, start, end):
+    """
+    Generator of lines of file opened in binary mode, which start in
+    the byte range <start, end)
+    :param jtl_file: file object
+    :param start: offset of the first line
+    :param end: offset, where the range ends
+    :return: Generator of lines
+    """
+    jtl_file.seek(start)
+    offset = start
+    for line in jtl_file:
+        if offset >= end:
+            break
+        offset += len(line)
+        yield line
+
+
+def epoch_timestamps(filename):
+    """
+    Check that timestamps of JTL file are in milliseconds since epoch
+    :param filename: name of JTL file
+    :return: False, when timestamp of the first sample is formatted
+    """
+    with open_input(filename) as jtl_file:
+        row = next(read_rows(jtl_file), None)
+    return row is None or parse_timestamp(row[TIMESTAMP]) is not None
+
+
+def split_file(filename, chunks):
+    """
+    Split JTL file to byte ranges aligned to beginnings of lines. The first
+    line with names of columns is not part of any range. Rows with quoted
+    new line characters must not be present in the file.
+    :param filename: name of JTL file
+    :param chunks: required number of ranges
+    :return: List of tuples (start, end)
+    """
+    size = os.path.getsize(filename)
+    with open(filename, 'rb') as jtl_file:
+        jtl_file.readline()
+        header_end = jtl_file.tell()
+        boundaries = [header_end]
+        for i in range(1, chunks):
+            target = header_end + (size - header_end) * i // chunks
+            if target <= boundaries[-1]:
+                continue
+            # Move to the beginning of the next line
+            jtl_file.seek(target - 1)
+            jtl_file.readline()
+            boundary = jtl_file.tell()
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+        boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+
+
+def aggregate_range(args):
+    """
+    Aggregate rows of one byte range of JTL file. It is used by workers
+    of the process pool, thus it has only one argument.
+    :param args: tuple (filename, start, end, window, columns_part, backend, samples), the
+                 whole file is aggregated, when start is None (compressed file is decompressed),
+                 rows are also written to part of columnar cache (see jtl_columns), when
+                 columns_part (directory, part) is set, and the slowest and failed samples are
+                 indexed (see jtl_samples), when samples (top_k, max_failed, source) is set
+    :return: tuple (dictionary label -> LabelStats, metadata of cache part or None, SampleIndex or None)
+    """
+    filename, start, end, window, columns_part, backend, samples = args
+    with open_input(filename) if start is None else open(filename, 'rb') as jtl_file:
+        if start is None:
+            lines = iter(jtl_file)
+            # Skip line with names of columns
+            start = len(next(lines, b''))
+        else:
+            lines = read_lines(jtl_file, start, end)
+        if samples is not None:
+            import jtl_samples
+            lines = jtl_samples.LineOffsets(lines, start)
+        rows = read_rows(lines, skip_header=False)
+        if samples is not None:
+            index = jtl_samples.SampleIndex(*samples)
+            return aggregate_rows(index.record(rows, lines), window=window), None, index
+        if columns_part is None and backend != 'numpy':
+            return aggregate_rows(rows, window=window), None, None
+        # Columnar cache and numpy backend require numpy, thus they are imported only when used
+        import jtl_columns
+        writer = None
+        if columns_part is not None:
+            writer = jtl_columns.ColumnsWriter(*columns_part)
+        if backend == 'numpy':
+            results = jtl_columns.aggregate_lines_vectorized(lines, window=window,
+                                                             writer=writer)
+        else:
+            results = aggregate_rows(writer.record(rows), window=window)
+        if writer is None:
+            return results, None, None
+        return results, writer.close(), None
+
+
+def aggregate_files(filenames, jobs=1, window=None, cache=False, backend='python',
+                    samples=None):
+    """
+    Aggregate all rows of JTL files, e.g. results of several JMeter load
+    generators running the same test. When more jobs are requested, then
+    every file is split to byte ranges processed by a pool of worker
+    processes. Compressed files can not be split, every compressed file is
+    decompressed and processed by one worker process. Partial results are merged in the order of files and ranges,
+    thus the result is the same as aggregation in one process. Files with formatted
+    timestamps are parsed by python backend without cache, because columns of
+    cache and numpy backend have timestamps in milliseconds.
+    :param filenames: list of names of JTL files
+    :param jobs: number of worker processes
+    :param window: length of time windows of timeline in milliseconds
+    :param cache: use columnar cache of JTL files and write it, when it is not valid (requires numpy),
+                  small files without cache are parsed without numpy (see NUMPY_MIN_FILE_SIZE)
+    :param backend: 'python' aggregates rows one by one, 'numpy' aggregates chunks of rows
+                    with vectorized operations (requires numpy)
+    :param samples: SampleIndex (see jtl_samples) updated by the slowest and failed samples
+                    of the files, all files are parsed by python backend without cache
+    :return: tuple (dictionary label -> LabelStats of all files,
+                    dictionary filename -> dictionary label -> LabelStats)
+    """
+    source_results = {}
+    cache_dirs = {}
+    parsed_filenames = filenames
+    cached_filenames = []
+    if samples is not None:
+        # Cache has neither offsets of rows nor columns of indexed samples
+        cache, backend = False, 'python'
+        samples.files = list(filenames)
+    formatted_filenames = []
+    if cache or backend == 'numpy':
+        formatted_filenames = [filename for filename in filenames if not epoch_timestamps(filename)]
+    if cache:
+        cached_filenames = [filename for filename in filenames if filename not in formatted_filenames and
+                            (os.path.isdir(filename + CACHE_SUFFIX) or numpy_worthwhile([filename]))]
+    if cached_filenames:
+        import jtl_columns
+        parsed_filenames = []
+        for filename in filenames:
+            if filename not in cached_filenames:
+                parsed_filenames.append(filename)
+                continue
+            cached_results = jtl_columns.load_cached_results(filename, window=window)
+            if cached_results is None:
+                parsed_filenames.append(filename)
+                cache_dirs[filename] = jtl_columns.start_cache(filename)
+            else:
+                source_results[filename] = cached_results
+
+    tasks = []
+    for source, filename in enumerate(parsed_filenames):
+        if jobs <= 1 or is_compressed(filename):
+            ranges = [(None, None)]
+        else:
+            ranges = split_file(filename, jobs)
+        samples_part = None
+        if samples is not None:
+            samples_part = (samples.top_k, samples.max_failed, source)
+        for part, (start, end) in enumerate(ranges):
+            columns_part = None
+            if cache_dirs.get(filename) is not None:
+                columns_part = (cache_dirs[filename], part)
+            tasks.append((filename, start, end, window, columns_part,
+                          'python' if filename in formatted_filenames else backend, samples_part))
+
+    if jobs <= 1:
+        partial_results = [aggregate_range(task) for task in tasks]
+    else:
+        pool = multiprocessing.Pool(min(jobs, max(len(tasks), 1)))
+        try:
+            partial_results = pool.map(aggregate_range, tasks)
+        finally:
+            pool.close()
+            pool.join()
+
+    cache_parts = {}
+    for filename in parsed_filenames:
+        source_results[filename] = {}
+    for task, (partial_result, cache_part, samples_part) in zip(tasks, partial_results):
+        merge_results(source_results[task[0]], partial_result)
+        cache_parts.setdefault(task[0], []).append(cache_part)
+        if samples_part is not None:
+            samples.merge(samples_part)
+    for filename, parts in cache_parts.items():
+        if cache_dirs.get(filename) is not None:
+            jtl_columns.finish_cache(filename, cache_dirs[filename], parts)
+
+    results = {}
+    for filename in filenames:
+        merge_results(results, source_results[filename])
+    return results, source_results
+
+
+class JtlTail(object):
+    """
+    Incremental reader of JTL file, which is still written by JMeter. Every
+    call of read_rows() returns only rows written since the previous call.
+    Incomplete last line is kept until the rest of the line is written.
+    """
+
+    CHUNK_SIZE = 16 * 1024 * 1024
+
+    def __init__(self, filename):
+        self.filename = filename
+        # Offset of the first byte, which was not read yet
+        self.offset = 0
+        self.header_skipped = False
+        self.partial_line = b''
+
+    def read_rows(self):
+        """
+        Generator of new complete rows of the file. Nothing is returned,
+        when the file does not exist yet.
+        :return: Generator of lists of column values
+        """
+        try:
+            jtl_file = open(self.filename, 'rb')
+        except (IOError, OSError):
+            return
+        with jtl_file:
+            jtl_file.seek(self.offset)
+            while True:
+                data = jtl_file.read(self.CHUNK_SIZE)
+                if not data:
+                    break
+                self.offset += len(data)
+                data = self.partial_line + data
+                end = data.rfind(b'\n') + 1
+                self.partial_line = data[end:]
+                lines = data[:end].splitlines(True)
+                if not self.header_skipped and lines:
+                    lines = lines[1:]
+                    self.header_skipped = True
+                for row in read_rows(lines, skip_header=False):
+                    yield row
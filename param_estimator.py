@@ -21,13 +21,109 @@ This script is used for estimating deviance and baseline of performance
 results from several existing results. Computed values are stored in
 configuration files. These values are used as parameters in next
 performance tests.
+
+Results of all runs are stacked to arrays for every API call. Baseline
+can be mean, median or trimmed mean of the runs and allowed deviance
+can be maximal, percentile or MAD-based deviance of the runs. Bootstrap
+confidence intervals make estimations stable, when there are few runs.
+
+With --state, running mean and variance of every value of every API call
+are kept in state file and updated by new results (--add) in time
+proportional to the number of API calls. Values older than the window
+of runs are removed from the running state. Names of added files are kept
+in the state file, thus the same results are never added twice.
 """
 
 from __future__ import print_function
 
 import json
 import argparse
+import logging
 import os
+import sys
+
+import numpy as np
+
+from jtl_compression import load_json, open_output
+from jtl_history import ResultsHistory, results_error
+from jtl_profile import Profiler, add_profile_arguments
+from jtl_stats import PERCENTILES, percentile_key, significant
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)-7s %(message)s")
+logger = logging.getLogger('param_estimator')
+
+# Scale of median absolute deviation consistent with standard deviation of normal distribution
+MAD_SCALE = 1.4826
+
+STATE_VERSION = 2
+
+# Values of results, which are estimated separately from elapsed times: throughput
+# must not decrease and effective concurrency must not increase over allowed deviance
+THROUGHPUT_KEYS = ('throughput', 'concurrency')
+
+# Lower bounds of denominators of relative deviances: elapsed times are in whole
+# milliseconds, but throughput and concurrency of API calls are often lower than 1
+ELAPSED_FLOOR = 1
+THROUGHPUT_FLOOR = 1e-9
+
+
+class RunningStats(object):
+    """
+    Running count, mean and variance of values (Welford's method). When
+    window is set, values of the window are kept, thus the oldest value
+    can be removed from the running mean and variance.
+    """
+
+    def __init__(self, window=0):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.window = window
+        self.values = []
+
+    def add(self, value):
+        """Add value and remove the oldest value, when the window is full"""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if self.window:
+            self.values.append(value)
+            while len(self.values) > self.window:
+                self.remove(self.values.pop(0))
+
+    def remove(self, value):
+        """Remove value added before"""
+        if self.count <= 1:
+            self.count, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        self.count -= 1
+        delta = value - self.mean
+        self.mean -= delta / self.count
+        # Rounding errors can not make variance negative
+        self.m2 = max(self.m2 - delta * (value - self.mean), 0.0)
+
+    @property
+    def stddev(self):
+        """Sample standard deviation"""
+        if self.count < 2:
+            return 0.0
+        return (self.m2 / (self.count - 1)) ** 0.5
+
+    def to_dict(self):
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2, 'values': self.values}
+
+    @classmethod
+    def from_dict(cls, data, window):
+        """Create running stats from saved state, values over the window are removed"""
+        stats = cls(window)
+        stats.count, stats.mean, stats.m2 = data['count'], data['mean'], data['m2']
+        stats.values = list(data['values'])
+        if not window:
+            stats.values = []
+        while window and len(stats.values) > window:
+            stats.remove(stats.values.pop(0))
+        return stats
 
 
 class Estimator(object):
@@ -35,33 +131,37 @@ class Estimator(object):
     Class for estimating deviance and baseline of performance results
     """
 
-    def __init__(self, options):
+    def __init__(self, options, profiler=None):
         # Command line options
         self.options = options
+        # Profiler measuring phases of estimation
+        self.profiler = profiler if profiler is not None else Profiler()
         # All results of all loaded performance tests
         self.perf_test_results = {}
         # Success rates of particular tests
         self.success_rates = {}
         # Average elapsed times of particular tests
         self.avg_elapsed_times = {}
+        # Percentiles of elapsed times of particular tests
+        self.percentiles = {}
+        # Throughputs and effective concurrencies of particular tests
+        self.throughputs = {}
         # Computed estimations for partucalar tests
         self.estimations = {}
 
     def _add_perf_test_result(self, filename):
         """
         Add result of perf test result to dictionary of results
-        :param filename: filename with perf test result
+        :param filename: filename with perf test result (plain or compressed)
         :return: None
         """
-        with open(filename, 'r') as perf_res_file:
-            try:
-                perf_test_result = json.load(perf_res_file)
-            except ValueError:
-                pass
-                # print('Loading file: %s [FAILED]' % filename)
-            else:
-                self.perf_test_results[filename] = perf_test_result
-                # print('Loading file: %s [DONE]' % filename)
+        try:
+            perf_test_result = load_json(filename)
+        except ValueError:
+            logger.debug("Loading file: %s [FAILED]" % filename)
+        else:
+            self.perf_test_results[filename] = perf_test_result
+            logger.debug("Loading file: %s [DONE]" % filename)
 
     def _read_results(self):
         """
@@ -77,6 +177,20 @@ class Estimator(object):
         for filename in file_list:
             self._add_perf_test_result(filename)
 
+    def _read_history(self):
+        """
+        Load results of the last runs of the test from history of results
+        :return: None
+        """
+        history = ResultsHistory(self.options.history)
+        try:
+            runs = history.last_runs(self.options.test, self.options.branch, self.options.last)
+            results = history.load_results([run[0] for run in runs])
+        finally:
+            history.close()
+        for run_id, run_results in results.items():
+            self.perf_test_results['run-%d' % run_id] = run_results
+
     def _estimate(self):
         """
         Compute estimation
@@ -94,30 +208,101 @@ class Estimator(object):
         """
         for result in self.perf_test_results.values():
             for api_call, api_call_result in result.items():
-                # print(api_call, api_call_result)
-                # Get average elapsed time of the performance test
-                avg_elapsed_time = api_call_result['average']
-                # Number of iteration of the performance test
-                count = api_call_result['count']
-                # Number of success iterations
-                success = api_call_result['success']
-                # Do not use value from file, because it is rounded. Compute it.
-                success_rate = float(success) / float(count)
+                values = self._result_values(api_call_result)
                 # Append results to lists
                 api_call_suc_rates = self.success_rates.setdefault(api_call, [])
-                api_call_suc_rates.append(success_rate)
+                api_call_suc_rates.append(values.pop('success_rate'))
                 api_call_avg_elap_time = self.avg_elapsed_times.setdefault(api_call, [])
-                api_call_avg_elap_time.append(avg_elapsed_time)
+                api_call_avg_elap_time.append(values.pop('average'))
+                api_call_percentiles = self.percentiles.setdefault(api_call, {})
+                api_call_throughputs = self.throughputs.setdefault(api_call, {})
+                for key, value in values.items():
+                    if key in THROUGHPUT_KEYS:
+                        api_call_throughputs.setdefault(key, []).append(value)
+                    else:
+                        api_call_percentiles.setdefault(key, []).append(value)
 
-    def _compute_avg_elap_time(self, api_call):
-        """Compute average elapsed time for given API call"""
-        elapsed_times = self.avg_elapsed_times[api_call]
-        return float(sum(elapsed_times)) / len(elapsed_times)
+    @staticmethod
+    def _result_values(api_call_result):
+        """
+        Get values used for estimations from result of API call
+        :return: dictionary with success_rate, average, percentiles, throughput and concurrency
+        """
+        # Number of iteration of the performance test
+        count = api_call_result['count']
+        # Number of success iterations
+        success = api_call_result['success']
+        values = {
+            # Do not use value from file, because it is rounded. Compute it.
+            'success_rate': float(success) / float(count),
+            # Average elapsed time of the performance test
+            'average': api_call_result['average'],
+        }
+        # Percentiles are not available in results of older versions of parse-jtl.py
+        for percent in PERCENTILES:
+            key = percentile_key(percent)
+            if key in api_call_result:
+                values[key] = api_call_result[key]
+        for key in THROUGHPUT_KEYS:
+            if key in api_call_result:
+                values[key] = api_call_result[key]
+        return values
 
-    def _compute_avg_success_rate(self, api_call):
-        """"Compute average success rate for given API call"""
-        success_rates = self.success_rates[api_call]
-        return float(sum(success_rates)) / len(success_rates)
+    def _center(self, values):
+        """
+        Compute baseline of runs (mean, median or trimmed mean)
+        :param values: 2D array, every row contains values of all runs
+        :return: 1D array with baseline of every row
+        """
+        if self.options.method == 'median':
+            return np.median(values, axis=-1)
+        if self.options.method == 'trimmed':
+            trimmed = int(self.options.trim * values.shape[-1])
+            if values.shape[-1] - 2 * trimmed > 0:
+                return np.sort(values, axis=-1)[:, trimmed:values.shape[-1] - trimmed].mean(axis=-1)
+        return values.mean(axis=-1)
+
+    def _deviance(self, values, floor=ELAPSED_FLOOR):
+        """
+        Compute relative deviance of runs from their baseline
+        :param values: 2D array, every row contains values of all runs
+        :param floor: lower bound of values, by which deviances are divided
+        :return: 1D array with deviance of every row
+        """
+        center = self._center(values)
+        if self.options.deviance == 'mad':
+            median = np.median(values, axis=-1)
+            mad = MAD_SCALE * np.median(np.abs(values - median[:, np.newaxis]), axis=-1)
+            return self.options.mad_factor * mad / np.maximum(center, floor)
+        deviances = np.abs(center[:, np.newaxis] - values) / np.maximum(values, floor)
+        if self.options.deviance == 'percentile':
+            return np.percentile(deviances, self.options.deviance_percentile, axis=-1)
+        return deviances.max(axis=-1)
+
+    def _bootstrap(self, statistic, values):
+        """
+        Compute bootstrap confidence interval of statistic of runs
+        :param statistic: function computing statistic of every row of 2D array
+        :param values: 1D array with values of all runs
+        :return: tuple (lower, upper) bound of confidence interval
+        """
+        random_state = np.random.RandomState(self.options.seed)
+        samples = random_state.randint(0, len(values), size=(self.options.bootstrap, len(values)))
+        alpha = (100.0 - self.options.confidence) / 2.0
+        lower, upper = np.percentile(statistic(values[samples]), [alpha, 100.0 - alpha])
+        return float(lower), float(upper)
+
+    def _estimate_value(self, statistic, values):
+        """
+        Compute statistic of runs, when bootstrap is used, then the upper bound
+        of its confidence interval is returned too
+        :return: tuple (value, confidence interval or None)
+        """
+        values = np.asarray(values, dtype=float)
+        value = float(statistic(values[np.newaxis, :])[0])
+        if self.options.bootstrap <= 0:
+            return value, None
+        return value, self._bootstrap(statistic, values)
 
     def _estimate_baseline(self):
         """
@@ -126,18 +311,35 @@ class Estimator(object):
         """
         self._gather_required_data()
 
+        margin = self.options.margin
         for api_call in self.success_rates.keys():
-            # Compute average success rate
-            avg_suc_rate = self._compute_avg_success_rate(api_call)
+            # Compute baseline of success rate
+            suc_rate, _ = self._estimate_value(self._center, self.success_rates[api_call])
 
-            # Compute average elapsed time
-            avg_elapsed_time = self._compute_avg_elap_time(api_call)
+            # Compute baseline of elapsed time
+            elapsed_time, interval = self._estimate_value(self._center, self.avg_elapsed_times[api_call])
 
             # Save values
             self.estimations[api_call] = {
-                'average': round(avg_elapsed_time + 5.0, 2),
-                'success_%': round(100.0 * avg_suc_rate - 5.0, 2),
+                'average': round(elapsed_time + margin, 2),
+                'success_%': round(100.0 * suc_rate - margin, 2),
             }
+            intervals = {}
+            if interval is not None:
+                intervals['average'] = [round(bound, 2) for bound in interval]
+            for key, elapsed_times in self.percentiles[api_call].items():
+                elapsed_time, interval = self._estimate_value(self._center, elapsed_times)
+                self.estimations[api_call][key] = round(elapsed_time + margin, 2)
+                if interval is not None:
+                    intervals[key] = [round(bound, 2) for bound in interval]
+            # Margin in milliseconds is not applicable to throughput and concurrency
+            for key, throughputs in self.throughputs[api_call].items():
+                throughput, interval = self._estimate_value(self._center, throughputs)
+                self.estimations[api_call][key] = significant(throughput)
+                if interval is not None:
+                    intervals[key] = [significant(bound) for bound in interval]
+            if intervals:
+                self.estimations[api_call]['confidence_interval'] = intervals
 
     def _estimate_deviances(self):
         """
@@ -146,23 +348,43 @@ class Estimator(object):
         """
         self._gather_required_data()
 
+        margin = self.options.margin
         for api_call in self.success_rates.keys():
-            # Compute average success rate
-            avg_suc_rate = self._compute_avg_success_rate(api_call)
+            # Compute baseline of success rate
+            suc_rate, _ = self._estimate_value(self._center, self.success_rates[api_call])
 
-            # Compute average elapsed time
-            avg_elapsed_time = self._compute_avg_elap_time(api_call)
-
-            # Compute maximal difference of elapsed times
-            elapsed_times = self.avg_elapsed_times[api_call]
-            max_dev = max(map(lambda elap_time: abs(avg_elapsed_time - elap_time) / elap_time, elapsed_times))
+            # Compute deviance of elapsed times
+            deviance = self._estimate_deviance(self.avg_elapsed_times[api_call])
 
             # Save values in percents (multiplication by 100.0)
             self.estimations[api_call] = {
-                'required_success': round(100.0 * avg_suc_rate - 5.0, 2),
-                'allowed_deviance': round(100.0 * max_dev + 5.0, 2)
+                'required_success': round(100.0 * suc_rate - margin, 2),
+                'allowed_deviance': round(100.0 * deviance + margin, 2)
             }
 
+            # Allowed deviances of percentiles are computed in the same way as deviance of average
+            percentile_deviances = {}
+            for key, elapsed_times in self.percentiles[api_call].items():
+                deviance = self._estimate_deviance(elapsed_times)
+                percentile_deviances[key] = round(100.0 * deviance + margin, 2)
+            if percentile_deviances:
+                self.estimations[api_call]['allowed_percentile_deviance'] = percentile_deviances
+
+            for key, throughputs in self.throughputs[api_call].items():
+                deviance = self._estimate_deviance(throughputs, floor=THROUGHPUT_FLOOR)
+                self.estimations[api_call]['allowed_%s_deviance' % key] = round(100.0 * deviance + margin, 2)
+
+    def _estimate_deviance(self, elapsed_times, floor=ELAPSED_FLOOR):
+        """
+        Compute allowed deviance of elapsed times. When bootstrap is used, then the upper
+        bound of confidence interval is used, thus one run does not decide the deviance.
+        :param floor: lower bound of values, by which deviances are divided
+        """
+        deviance, interval = self._estimate_value(lambda values: self._deviance(values, floor), elapsed_times)
+        if interval is None:
+            return deviance
+        return interval[1]
+
     def _write_results(self):
         """
         Write new file with expected deviations
@@ -173,37 +395,244 @@ class Estimator(object):
         if output_file is None:
             print(output_text)
         else:
-            with open(output_file, 'w') as json_file:
+            with open_output(output_file) as json_file:
                 json_file.write(output_text)
 
+    def _update_state(self):
+        """
+        Load running state, add results of new runs to it and save it
+        :return: dictionary API call -> value -> RunningStats
+        """
+        window = self.options.window
+        state = {}
+        sources = set()
+        if os.path.exists(self.options.state):
+            saved_state = load_json(self.options.state)
+            # Values out of a smaller window are not kept, thus the state can not be reused with another window
+            if saved_state['window'] != window:
+                logger.error("State file %s keeps the last %d runs (0 for all runs), use the same --window "
+                             "or a new state file" % (self.options.state, saved_state['window']))
+                sys.exit(1)
+            sources = set(saved_state.get('sources', []))
+            for api_call, api_call_state in saved_state['api_calls'].items():
+                state[api_call] = dict((key, RunningStats.from_dict(data, window))
+                                       for key, data in api_call_state.items())
+
+        for filename in self.options.add or []:
+            source = os.path.abspath(filename)
+            if source in sources:
+                logger.warning("Results file %s was already added to the state file, it is skipped" % filename)
+                continue
+            perf_test_result = load_json(filename)
+            error = results_error(perf_test_result)
+            if error is not None:
+                logger.error("File %s is not results parsed by parse-jtl.py -p: %s" % (filename, error))
+                sys.exit(1)
+            sources.add(source)
+            for api_call, api_call_result in perf_test_result.items():
+                api_call_state = state.setdefault(api_call, {})
+                for key, value in self._result_values(api_call_result).items():
+                    api_call_state.setdefault(key, RunningStats(window)).add(value)
+
+        if self.options.add:
+            saved_state = {
+                'version': STATE_VERSION,
+                'window': window,
+                'sources': sorted(sources),
+                'api_calls': dict((api_call, dict((key, stats.to_dict()) for key, stats in api_call_state.items()))
+                                  for api_call, api_call_state in state.items())
+            }
+            with open_output(self.options.state) as state_file:
+                json.dump(saved_state, state_file, sort_keys=True)
+        return state
+
+    def _estimate_from_state(self, state):
+        """
+        Compute estimation of baseline or deviances from running mean and standard
+        deviation. Baseline is the mean and allowed deviance is multiple of relative
+        standard deviation of the runs, thus --method, --deviance and --bootstrap
+        are not used.
+        :param state: dictionary API call -> value -> RunningStats
+        :return: None
+        """
+        margin = self.options.margin
+        for api_call, api_call_state in state.items():
+            suc_rate = api_call_state['success_rate'].mean
+            percentile_stats = dict((key, stats) for key, stats in api_call_state.items()
+                                    if key not in ('success_rate', 'average') + THROUGHPUT_KEYS)
+            throughput_stats = dict((key, stats) for key, stats in api_call_state.items()
+                                    if key in THROUGHPUT_KEYS)
+            if self.options.type == 'baseline':
+                self.estimations[api_call] = {
+                    'average': round(api_call_state['average'].mean + margin, 2),
+                    'success_%': round(100.0 * suc_rate - margin, 2),
+                }
+                for key, stats in percentile_stats.items():
+                    self.estimations[api_call][key] = round(stats.mean + margin, 2)
+                for key, stats in throughput_stats.items():
+                    self.estimations[api_call][key] = significant(stats.mean)
+                continue
+
+            def deviance(stats, floor=ELAPSED_FLOOR):
+                return round(100.0 * self.options.stddev_factor * stats.stddev / max(stats.mean, floor) + margin, 2)
+
+            self.estimations[api_call] = {
+                'required_success': round(100.0 * suc_rate - margin, 2),
+                'allowed_deviance': deviance(api_call_state['average'])
+            }
+            if percentile_stats:
+                self.estimations[api_call]['allowed_percentile_deviance'] = dict(
+                    (key, deviance(stats)) for key, stats in percentile_stats.items())
+            for key, stats in throughput_stats.items():
+                self.estimations[api_call]['allowed_%s_deviance' % key] = deviance(stats, THROUGHPUT_FLOOR)
+
     def perform(self):
         """
         Perform all necessary action to estimate new expected deviations
         :return: None
         """
-        self._read_results()
-        self._estimate()
-        self._write_results()
+        if self.options.state:
+            with self.profiler.phase('update-state') as phase:
+                phase.add_rows(len(self.options.add or []))
+                state = self._update_state()
+            with self.profiler.phase('estimate') as phase:
+                phase.add_rows(len(state))
+                self._estimate_from_state(state)
+            with self.profiler.phase('write'):
+                self._write_results()
+            return
+        with self.profiler.phase('load') as phase:
+            if self.options.history:
+                self._read_history()
+            else:
+                self._read_results()
+            phase.add_rows(len(self.perf_test_results))
+        with self.profiler.phase('estimate') as phase:
+            phase.add_rows(sum(len(result) for result in self.perf_test_results.values()))
+            self._estimate()
+        with self.profiler.phase('write'):
+            self._write_results()
 
 
-def main():
+def parse_options(args=None):
+    """
+    Parse command line options
+    :param args: list of arguments (default: arguments of the program)
+    :return: options
+    """
     parser = argparse.ArgumentParser()
     parser.add_argument('-d', '--directory',
                         action='store', dest='directory',
                         default=None,
                         help='Folder with results of performance tests')
+    parser.add_argument('--history',
+                        action='store', dest='history',
+                        default=None,
+                        help='History of results (SQLite) used instead of folder with results')
+    parser.add_argument('--test',
+                        action='store', dest='test',
+                        default=None,
+                        help='Name of performance test loaded from history of results')
+    parser.add_argument('--branch',
+                        action='store', dest='branch',
+                        default=None,
+                        help='Candlepin branch loaded from history of results (default: all branches)')
+    parser.add_argument('--last',
+                        type=int, dest='last',
+                        default=10,
+                        help='Number of the last runs loaded from history of results (default: 10)')
+    parser.add_argument('--state',
+                        action='store', dest='state',
+                        default=None,
+                        help='State file with running mean and variance of results used instead of '
+                             'folder with results, baseline is the mean of runs and allowed deviance '
+                             'is given by --stddev-factor (--method, --deviance and --bootstrap are not used)')
+    parser.add_argument('--add',
+                        action='append', dest='add',
+                        default=None,
+                        help='JSON file with new results added to the state file (can be used more times)')
+    parser.add_argument('--window',
+                        type=int, dest='window',
+                        default=10,
+                        help='Number of the last runs kept in the state file, 0 keeps all runs, it can not be '
+                             'changed for existing state file (default: 10)')
+    parser.add_argument('--stddev-factor',
+                        type=float, dest='stddev_factor',
+                        default=3.0,
+                        help='Allowed deviance estimated from the state file is this multiple of relative '
+                             'standard deviation of runs, unlike deviance of runs from baseline used for '
+                             'folder with results, e.g. maximal deviance by --deviance max (default: 3).')
     parser.add_argument('-o', '--output',
                         action='store', dest='output',
                         default=None,
-                        help='Output json file with expected deviances')
+                        help='Output json file with expected deviances, it is compressed, '
+                             'when its name ends with .gz, .xz or .zst')
     parser.add_argument('-t', '--type',
                         choices=['deviances', 'baseline'], dest='type',
                         default='deviances',
                         help='Type of estimation to compute (default: deviances).')
-    options = parser.parse_args()
+    parser.add_argument('-m', '--method',
+                        choices=['mean', 'median', 'trimmed'], dest='method',
+                        default='mean',
+                        help='Baseline of runs (default: mean).')
+    parser.add_argument('--trim',
+                        type=float, dest='trim',
+                        default=0.1,
+                        help='Fraction of the lowest and the highest runs removed by trimmed mean (default: 0.1).')
+    parser.add_argument('--deviance',
+                        choices=['max', 'percentile', 'mad'], dest='deviance',
+                        default='max',
+                        help='Allowed deviance is maximal or percentile of deviances of runs from baseline, '
+                             'or multiple of median absolute deviation of runs (default: max).')
+    parser.add_argument('--deviance-percentile',
+                        type=float, dest='deviance_percentile',
+                        default=90.0,
+                        help='Percentile of deviances of runs used by percentile deviance (default: 90).')
+    parser.add_argument('--mad-factor',
+                        type=float, dest='mad_factor',
+                        default=3.0,
+                        help='Multiple of median absolute deviation used by mad deviance (default: 3).')
+    parser.add_argument('--bootstrap',
+                        type=int, dest='bootstrap',
+                        default=0,
+                        help='Number of bootstrap resamples of runs used for confidence intervals, '
+                             'allowed deviance is the upper bound of its interval (default: 0, no bootstrap).')
+    parser.add_argument('--confidence',
+                        type=float, dest='confidence',
+                        default=95.0,
+                        help='Confidence level of bootstrap intervals in percents (default: 95).')
+    parser.add_argument('--seed',
+                        type=int, dest='seed',
+                        default=0,
+                        help='Seed of random generator of bootstrap (default: 0).')
+    parser.add_argument('--margin',
+                        type=float, dest='margin',
+                        default=5.0,
+                        help='Margin added to baseline and allowed deviances and subtracted '
+                             'from success rates (default: 5).')
+    add_profile_arguments(parser)
+    options = parser.parse_args(args)
+    if options.add and not options.state:
+        parser.error('When option --add is used, then --state option has to be used too.')
+    if options.window < 0:
+        parser.error('Window has to be positive number or 0.')
+    if options.history and not options.test:
+        parser.error('When option --history is used, then --test option has to be used too.')
+    if not 0.0 <= options.trim < 0.5:
+        parser.error('Trimmed fraction has to be in interval <0, 0.5).')
+    if not 0.0 < options.confidence < 100.0:
+        parser.error('Confidence level has to be in interval (0, 100).')
+    return options
 
-    deviance_estimator = Estimator(options)
-    deviance_estimator.perform()
+
+def main():
+    options = parse_options()
+    profiler = Profiler.from_options(options, 'param_estimator')
+    try:
+        deviance_estimator = Estimator(options, profiler)
+        deviance_estimator.perform()
+    finally:
+        profiler.finish()
 
 
 if __name__ == '__main__':
@@ -23,25 +23,36 @@ Command line for parsing results of candlepin ferformance tests.
 from __future__ import print_function
 
 import csv
+import glob
 import json
 import logging
+import os
+import sys
+import time
 from argparse import ArgumentParser, SUPPRESS
 
-# Import matplotlib & force the use of the Agg backend to support systems without displays
-try:
-    import matplotlib
-    matplotlib.use('Agg')
-    import matplotlib.pyplot as plt
-    import numpy as np
-except ImportError:
-    print("Failed to import matplotlib & numpy")
-    matplotlib = None
-    plt = None
-    np = None
+from jtl_compression import is_compressed, missing_module, load_json, open_output
+from jtl_profile import Profiler, add_profile_arguments
+from jtl_samples import TOP_K, MAX_FAILED, SampleIndex, format_sample
+from jtl_stats import PERCENTILES, TOTAL_LABEL, percentile_key, aggregate_files, aggregate_rows, \
+    detect_steady_state, trim_results, total_stats, module_available, numpy_worthwhile, JtlTail, LatencyHistogram
+
+# Importing of numpy and matplotlib takes longer than parsing of small results
+# files, thus they are only looked up here and imported by modes using them
+HAS_NUMPY = module_available('numpy')
+HAS_MATPLOTLIB = module_available('matplotlib')
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)-7s %(message)s")
 logger = logging.getLogger('parse-jtl')
 
+# Average elapsed time clearly violates expected results in --follow mode,
+# when its deviance is bigger than allowed deviance multiplied by this factor
+FOLLOW_ABORT_DEVIANCE_FACTOR = 2.0
+
+# Criteria compared by -c only when they are enabled by --gate, besides success
+# rate and deviance of average elapsed time, which are compared always
+GATES = ('percentiles', 'throughput', 'total')
+
 
 class Colors(object):
     """
@@ -59,20 +70,21 @@ class Colors(object):
 
 
 def parse_options():
-    usage = "%(prog)s [options]  results_file"
+    usage = "%(prog)s [options]  results_file [results_file ...]"
     parser = ArgumentParser(usage=usage)
     parser.add_argument("--pretty-print",
                         action="store_true",
                         dest="pretty_print",
                         help="Parse and pretty print")
-    if np and plt:
+    if HAS_NUMPY:
         parser.add_argument("--generate-histograms",
-                            metavar="histograms.pdf",
+                            metavar="histograms.pdf|histograms.html",
                             dest="generate_histograms",
-                            help="Name of PDF file to store charts of the results.")
+                            help="Name of PDF file (requires matplotlib) or HTML file with SVG charts "
+                                 "to store charts of the results.")
     else:
         # Do not show help for generating of histograms, when
-        # numpy and matplotlib are not installed
+        # numpy is not installed
         parser.add_argument('--generate-histograms',
                             metavar="histograms.pdf",
                             dest="generate_histograms",
@@ -88,6 +100,11 @@ def parse_options():
     parser.add_argument("-e", "--expected", default=None,
                         dest="expected",
                         help="Success criteria dictionary, only used with -c")
+    parser.add_argument("--gate", default=[], action="append",
+                        choices=GATES, dest="gates",
+                        help="With -c, compare also allowed deviances of percentiles, allowed deviances of "
+                             "throughput and concurrency or results of all API calls together (TOTAL), "
+                             "when they are in success criteria dictionary, can be used several times")
     parser.add_argument("-b", "--baseline", default=None,
                         dest="baseline",
                         help="Dictionary to compare with, only used with -c and --pretty-print")
@@ -96,12 +113,99 @@ def parse_options():
                         help="Bypass using colors in output")
     parser.add_argument("-o", "--output",
                         dest="output",
-                        help="Output file to write the result to.")
+                        help="Output file to write the result to, it is compressed, when its name "
+                             "ends with .gz, .xz or .zst.")
+    parser.add_argument("-j", "--jobs", default=1, type=int,
+                        dest="jobs",
+                        help="Number of processes used for parsing of results file (default: 1)")
+    parser.add_argument("--backend", default="auto",
+                        choices=["auto", "python", "numpy"], dest="backend",
+                        help="Aggregate rows one by one (python) or in chunks with vectorized "
+                             "operations (numpy). The auto backend is numpy, when it is installed and "
+                             "results files have at least 16 MiB.")
+    parser.add_argument("--no-cache", default=False,
+                        dest="no_cache", action="store_true",
+                        help="Do not use or write columnar cache of results file (results_file.columns)")
+    parser.add_argument("--sample-index",
+                        metavar="samples.json",
+                        dest="sample_index",
+                        help="Write index of the slowest and failed samples of every API call with their "
+                             "byte offsets in results files, it is compressed, when its name ends with "
+                             ".gz, .xz or .zst (results files are parsed without numpy and cache)")
+    parser.add_argument("--top-k", default=TOP_K, type=int,
+                        dest="top_k",
+                        help="Number of the slowest samples of API call in --sample-index (default: %d)" % TOP_K)
+    parser.add_argument("--max-failed", default=MAX_FAILED, type=int,
+                        dest="max_failed",
+                        help="Maximal number of failed samples of API call in --sample-index (default: %d)"
+                             % MAX_FAILED)
+    parser.add_argument("--timeline",
+                        metavar="timeline.json|timeline.csv",
+                        dest="timeline",
+                        help="Name of JSON or CSV file to store throughput, error rate and "
+                             "percentiles of API calls in time windows.")
+    parser.add_argument("--window", default=10, type=float,
+                        dest="window",
+                        help="Length of time window of timeline in seconds (default: 10)")
+    parser.add_argument("--exclude-ramp", default=False,
+                        dest="exclude_ramp", action="store_true",
+                        help="Exclude detected warm-up and ramp-down of the test from results, "
+                             "percentiles and histograms")
+    parser.add_argument("-f", "--follow", default=False,
+                        dest="follow", action="store_true",
+                        help="Follow results file written by running test, print summaries and "
+                             "exit with error, when results clearly violate -e (and -b) criteria")
+    parser.add_argument("--interval", default=60, type=float,
+                        dest="interval",
+                        help="Seconds between summaries printed in --follow mode (default: 60)")
+    parser.add_argument("--idle-timeout", default=120, type=float,
+                        dest="idle_timeout",
+                        help="Stop following results file, when it has not grown for this number "
+                             "of seconds (default: 120)")
+    parser.add_argument("--min-samples", default=100, type=int,
+                        dest="min_samples",
+                        help="Minimal number of samples of API call checked in --follow mode (default: 100)")
+    parser.add_argument("--history",
+                        metavar="history.sqlite",
+                        dest="history",
+                        help="Append results with histograms of elapsed times to history of results "
+                             "(requires --test and --branch)")
+    parser.add_argument("--test",
+                        dest="test",
+                        help="Name of performance test stored in history of results")
+    parser.add_argument("--branch",
+                        dest="branch",
+                        help="Candlepin branch or version stored in history of results")
+    parser.add_argument("--regression-test",
+                        choices=["mannwhitney", "ks"],
+                        dest="regression_test",
+                        help="With -c, test also whether distribution of elapsed times of every API call "
+                             "is slower than baseline distribution from --baseline-history "
+                             "(Mann-Whitney U or Kolmogorov-Smirnov test)")
+    parser.add_argument("--baseline-history",
+                        metavar="history.sqlite",
+                        dest="baseline_history",
+                        help="History of results with baseline distributions of elapsed times, histograms of "
+                             "the last runs of --test and --branch are merged")
+    parser.add_argument("--last", default=10, type=int,
+                        dest="last",
+                        help="Number of the last runs of --baseline-history used as baseline (default: 10)")
+    parser.add_argument("--alpha", default=0.01, type=float,
+                        dest="alpha",
+                        help="Significance level of regression test (default: 0.01)")
+    parser.add_argument("--min-effect", default=0.56, type=float,
+                        dest="min_effect",
+                        help="Minimal probability that current elapsed time is bigger than baseline "
+                             "elapsed time considered as regression (default: 0.56)")
+    parser.add_argument("--confidence", default=95.0, type=float,
+                        dest="confidence",
+                        help="Confidence level of interval of effect size in percents (default: 95)")
+    add_profile_arguments(parser)
 
     options, args = parser.parse_known_args()
 
-    if len(args) != 1:
-        parser.error("You must provide only one results file to parse/compare")
+    if len(args) == 0:
+        parser.error("You must provide at least one results file to parse/compare")
 
     if not options.parse and not options.compare and not options.pretty_print:
         parser.error("You have to choose one of the commands: -p, --pretty-print or -c")
@@ -110,6 +214,40 @@ def parse_options():
         if not options.baseline or not options.expected:
             parser.error("When option -c is used, then both -b and -e options have to be used too.")
 
+    if options.jobs < 1:
+        parser.error("Number of jobs has to be positive number.")
+
+    if options.window <= 0:
+        parser.error("Length of time window has to be positive number.")
+
+    if options.follow and len(args) != 1:
+        parser.error("You must provide only one results file to follow")
+
+    if options.follow and options.sample_index:
+        parser.error("Index of samples can not be written in --follow mode.")
+
+    if options.top_k < 1 or options.max_failed < 0:
+        parser.error("Number of the slowest samples has to be positive number and number of failed "
+                     "samples can not be negative.")
+
+    if options.backend == 'numpy' and not HAS_NUMPY:
+        parser.error("The numpy backend requires numpy.")
+
+    if options.generate_histograms:
+        if not HAS_NUMPY:
+            parser.error("Generating of histograms requires numpy.")
+        if not HAS_MATPLOTLIB and not options.generate_histograms.endswith(('.html', '.htm')):
+            parser.error("Generating of PDF file with histograms requires matplotlib, "
+                         "use HTML file instead.")
+
+    if options.history and (not options.test or not options.branch):
+        parser.error("When option --history is used, then both --test and --branch options have to be used too.")
+
+    if options.regression_test:
+        if not options.compare or not options.baseline_history or not options.test:
+            parser.error("When option --regression-test is used, then -c, --baseline-history and --test "
+                         "options have to be used too.")
+
     if options.no_colors is True:
         Colors.NO_COLOR = True
 
@@ -128,26 +266,137 @@ def compare_success_rates(api_call, current_success_rate, required_success_rate)
     return ""
 
 
-def compare_elapsed_times(api_call, current_elapsed_time, baseline_elapsed_time, allowed_deviance):
+def compare_elapsed_times(api_call, current_elapsed_time, baseline_elapsed_time, allowed_deviance,
+                          metric='avg'):
     """
     Compare elapsed time of API call to baseline API call.
+    :param metric: name of compared value (average or percentile) used in message
     :return: Error message, when elapsed time is too big
     """
     if baseline_elapsed_time == 0:
         baseline_elapsed_time = 1
     deviance = ((current_elapsed_time - baseline_elapsed_time) * 100) / baseline_elapsed_time
     if deviance > allowed_deviance:
-        return "API call: %s [FAILED] current avg: %sms, base line avg: %sms, " \
+        return "API call: %s [FAILED] current %s: %sms, base line %s: %sms, " \
                "dev: %s%%, allowed dev: %4.1f%%\n" \
-               % (api_call.ljust(50, '.'), current_elapsed_time,
-                  baseline_elapsed_time, deviance, allowed_deviance)
+               % (api_call.ljust(50, '.'), metric, current_elapsed_time,
+                  metric, baseline_elapsed_time, deviance, allowed_deviance)
     return ""
 
 
-def compare_csv(input_dict, baseline_dict, deviance_dict):
+def compare_percentiles(api_call, values, baseline_values, allowed_deviances):
+    """
+    Compare percentiles of elapsed time of API call to baseline API call.
+    Only percentiles listed in allowed_deviances and present in both current
+    and baseline results are compared.
+    :param allowed_deviances: dictionary e.g. {"p99": 50.0, "p99.9": 100.0}
+    :return: Error messages of all percentiles, which are too big
+    """
+    result = ""
+    for percent in PERCENTILES:
+        key = percentile_key(percent)
+        if key not in allowed_deviances or key not in values or key not in baseline_values:
+            continue
+        result += compare_elapsed_times(
+            api_call,
+            values[key],
+            baseline_values[key],
+            allowed_deviances[key],
+            metric=key
+        )
+    return result
+
+
+def compare_throughputs(api_call, values, baseline_values, deviances):
+    """
+    Compare throughput (requests per second) and effective concurrency of API call
+    to baseline API call. Throughput fails, when it is lower than baseline more than
+    allowed_throughput_deviance, concurrency fails, when it is higher than baseline
+    more than allowed_concurrency_deviance. Values without allowed deviance or missing
+    in current or baseline results are not compared.
+    :param deviances: dictionary with success criteria of API call
+    :return: Error messages of all values, which are out of limits
+    """
+    result = ""
+    allowed_deviance = deviances.get('allowed_throughput_deviance')
+    if allowed_deviance is not None and 'throughput' in values and baseline_values.get('throughput'):
+        deviance = (baseline_values['throughput'] - values['throughput']) * 100.0 / baseline_values['throughput']
+        if deviance > allowed_deviance:
+            result += "API call: %s [FAILED] current throughput: %sreq/s, base line throughput: %sreq/s, " \
+                      "dev: -%.1f%%, allowed dev: %4.1f%%\n" \
+                      % (api_call.ljust(50, '.'), values['throughput'], baseline_values['throughput'],
+                         deviance, allowed_deviance)
+    allowed_deviance = deviances.get('allowed_concurrency_deviance')
+    if allowed_deviance is not None and 'concurrency' in values and baseline_values.get('concurrency'):
+        deviance = (values['concurrency'] - baseline_values['concurrency']) * 100.0 / baseline_values['concurrency']
+        if deviance > allowed_deviance:
+            result += "API call: %s [FAILED] current concurrency: %s, base line concurrency: %s, " \
+                      "dev: %.1f%%, allowed dev: %4.1f%%\n" \
+                      % (api_call.ljust(50, '.'), values['concurrency'], baseline_values['concurrency'],
+                         deviance, allowed_deviance)
+    return result
+
+
+def compare_distributions(api_call, regression):
+    """
+    Format result of regression test of distribution of elapsed times
+    :param regression: dictionary returned by jtl_regression.regression_test()
+    :return: Error message, when current elapsed times are significantly slower
+    """
+    if regression is None or not regression['regression']:
+        return ""
+    return "API call: %s [FAILED] %s regression, p-value: %.2g, P(current > base line): %.3f " \
+           "(CI %.3f - %.3f)\n" % (api_call.ljust(50, '.'), regression['method'], regression['p_value'],
+                                    regression['effect'], regression['interval'][0], regression['interval'][1])
+
+
+def test_regressions(current_histograms, baseline_histograms, options):
+    """
+    Run regression test of every API call, which has baseline distribution
+    :param current_histograms: dictionary label -> LatencyHistogram of current results
+    :param baseline_histograms: dictionary label -> LatencyHistogram of baseline
+    :return: dictionary label -> result of jtl_regression.regression_test()
+    """
+    from jtl_regression import regression_test
+    regressions = {}
+    for key, histogram in current_histograms.items():
+        baseline = baseline_histograms.get(key)
+        if baseline is None or baseline.total == 0 or histogram.total == 0:
+            continue
+        regressions[key] = regression_test(histogram, baseline, method=options.regression_test,
+                                           alpha=options.alpha, min_effect=options.min_effect,
+                                           confidence=options.confidence)
+    return regressions
+
+
+def format_samples(key, samples, count=3):
+    """
+    Format the slowest and the first failed samples of API call
+    :param key: API call
+    :param samples: SampleIndex
+    :param count: number of formatted samples of both kinds
+    :return: text, empty string, when there are no indexed samples of the API call
+    """
+    if samples is None or key not in samples.labels:
+        return ""
+    label_samples = samples.labels[key]
+    output_txt = ""
+    for sample in label_samples.slowest_samples()[:count]:
+        output_txt += "    slowest: %s\n" % format_sample(samples.sample_to_dict(sample))
+    for sample in label_samples.failed[:count]:
+        output_txt += "    failed (%d in total): %s\n" % (label_samples.failed_count,
+                                                         format_sample(samples.sample_to_dict(sample)))
+    return output_txt
+
+
+def compare_csv(input_dict, baseline_dict, deviance_dict, regressions=None, samples=None, gates=()):
     result = ""
     failures = 0
+    regressions = regressions or {}
     for key, values in input_dict.items():
+        # Results of all API calls are compared only, when they are gated and have criteria
+        if key == TOTAL_LABEL and ('total' not in gates or key not in deviance_dict or key not in baseline_dict):
+            continue
         # Check success rate
         succ_rate = compare_success_rates(
                         key,
@@ -171,160 +420,499 @@ def compare_csv(input_dict, baseline_dict, deviance_dict):
                 elap_time = Colors.RED + elap_time + Colors.ENDC
             result += elap_time
             failures += 1
+        # Check tail latency, when it is gated and allowed deviances of percentiles are set
+        perc_time = ""
+        if 'percentiles' in gates:
+            perc_time = compare_percentiles(
+                key,
+                values,
+                baseline_dict[key],
+                deviance_dict[key].get('allowed_percentile_deviance', {})
+            )
+        if perc_time != "":
+            failures += perc_time.count("\n")
+            if Colors.NO_COLOR is False:
+                perc_time = Colors.RED + perc_time + Colors.ENDC
+            result += perc_time
+        # Check throughput and concurrency, when they are gated and their allowed deviances are set
+        thr_rate = ""
+        if 'throughput' in gates:
+            thr_rate = compare_throughputs(key, values, baseline_dict[key], deviance_dict[key])
+        if thr_rate != "":
+            failures += thr_rate.count("\n")
+            if Colors.NO_COLOR is False:
+                thr_rate = Colors.YELLOW + thr_rate + Colors.ENDC
+            result += thr_rate
+        # Check distribution of elapsed times, when regression test is used
+        distribution = compare_distributions(key, regressions.get(key))
+        if distribution != "":
+            failures += 1
+            if Colors.NO_COLOR is False:
+                distribution = Colors.RED + distribution + Colors.ENDC
+            result += distribution
         # When everything is OK, then add current API call to output
-        if succ_rate == "" and elap_time == "":
+        if succ_rate == "" and elap_time == "" and perc_time == "" and thr_rate == "" and distribution == "":
             info = "API call: %s [OK]\n" % key.ljust(50, '.')
+            if key in regressions:
+                info = "API call: %s [OK] P(current > base line): %.3f (CI %.3f - %.3f)\n" % (
+                    key.ljust(50, '.'), regressions[key]['effect'],
+                    regressions[key]['interval'][0], regressions[key]['interval'][1])
             if Colors.NO_COLOR is False:
                 result += Colors.GREEN + Colors.BOLD + info + Colors.ENDC
             else:
                 result += info
+        else:
+            # Drill-down to samples of failed API call, when they are indexed
+            result += format_samples(key, samples)
     return result, failures
 
 
-def generate_histograms(filename, result_set):
-    rows = len(result_set.keys())
-    figure_num = 1
-    bin_size = 15  # Normalize to 15 buckets for each histogram
-
-    # figure height = 5 per row so that it is large enough
-    plt.figure(1, figsize=(20, 5 * rows))
-    for key, result in sorted(result_set.items()):
-        data_array = np.asarray(result['data'], dtype=np.integer)
-
-        # Plot the raw data
-        plt.subplot(rows, 2, figure_num)
-        plt.xlabel("Miliseconds")
-        plt.ylabel("Sample Count")
-        plt.hist(data_array, bins=bin_size)
-        plt.title(key + " (sample size: {samples})\n avg = {avg}, median = {median}, "
-                        "std_dev={std_dev}".format(
-                            samples=len(data_array),
-                            avg=int(np.average(data_array)),
-                            median=int(np.median(data_array)),
-                            std_dev=int(np.std(data_array))
-                        ))
-        plt.grid(True)
-        figure_num += 1
-
-        # Remove outliers (over over 95 percentile) and plot that as well
-        percentile = int(np.percentile(data_array, 95))
-        data_array_minimized = data_array[data_array < percentile]
-
-        # Skip plot if there is no data
-        if len(data_array_minimized) == 0:
-            figure_num += 1
+def generate_histograms(filename, result_set, histograms):
+    """
+    Generate histograms of elapsed times of all API calls. Every API call is
+    rendered to its own page of PDF file or to its own charts of HTML file,
+    when name of the file ends with .html.
+    :param filename: name of PDF or HTML file
+    :param result_set: dictionary with results
+    :param histograms: dictionary API call -> LatencyHistogram
+    :return: None
+    """
+    # Rendering of histograms requires numpy and matplotlib, thus they are imported only when used
+    import jtl_report
+    jtl_report.write_report(filename, result_set, histograms)
+
+
+def expand_input_files(args):
+    """
+    Expand glob patterns in names of results files. Patterns can be
+    quoted in command line to avoid limits of shell.
+    :param args: list of file names or glob patterns
+    :return: List of file names
+    """
+    input_files = []
+    for arg in args:
+        matches = sorted(glob.glob(arg))
+        if matches:
+            input_files.extend(f for f in matches if f not in input_files)
+        elif arg not in input_files:
+            input_files.append(arg)
+    return input_files
+
+
+def parse_csv(input_files, jobs=1, window=None, exclude_ramp=False, cache=False,
+              backend='python', histograms=False, profiler=None, samples=None):
+    """
+    Parse CSV files with results of performance test. Each file is processed
+    one row at a time, only per-label accumulators are kept in memory.
+    Results of more files (e.g. from several JMeter load generators) are
+    merged and results of particular files are stored in 'sources' of
+    every API call.
+    :param input_files: list of CSV files
+    :param jobs: number of processes parsing parts of the files in parallel
+    :param window: length of time window of timeline in milliseconds
+    :param exclude_ramp: compute results only from steady state of the test (requires window)
+    :param cache: use columnar cache of the files, which is created by the first parsing
+    :param backend: 'python' or 'numpy' backend of aggregation
+    :param histograms: add histograms of elapsed times to results of every API call
+    :param profiler: Profiler measuring aggregation and summarization
+    :param samples: SampleIndex updated by the slowest and failed samples (see jtl_samples)
+    :return: tuple (dictionary with results, dictionary with timeline or None)
+    """
+    if profiler is None:
+        profiler = Profiler()
+    with profiler.phase('aggregate') as phase:
+        label_stats, source_stats = aggregate_files(input_files, jobs=jobs, window=window, cache=cache,
+                                                    backend=backend, samples=samples)
+        phase.add_rows(sum(stats.count for stats in label_stats.values()))
+    if len(input_files) == 1:
+        source_stats = {}
+    with profiler.phase('summarize') as phase:
+        phase.add_rows(len(label_stats))
+        return summarize_results(label_stats, source_stats, window=window, exclude_ramp=exclude_ramp,
+                                 histograms=histograms)
+
+
+def summarize_results(label_stats, source_stats, window=None, exclude_ramp=False, histograms=False):
+    """
+    Compute dictionary with results and timeline from accumulators
+    :param label_stats: dictionary label -> LabelStats
+    :param source_stats: dictionary filename -> dictionary label -> LabelStats
+    :param window: length of time window of timeline in milliseconds
+    :param exclude_ramp: compute results only from steady state of the test (requires window)
+    :param histograms: add histograms of elapsed times to results of every API call
+    :return: tuple (dictionary with results, dictionary with timeline or None)
+    """
+    timeline = None
+    if window:
+        steady_state = detect_steady_state(label_stats)
+        timeline = build_timeline(label_stats, window, steady_state)
+        if exclude_ramp and steady_state is not None:
+            label_stats = trim_results(label_stats, *steady_state)
+            source_stats = dict((source, trim_results(stats, *steady_state))
+                                for source, stats in source_stats.items())
+
+    # Throughput of API calls is computed over duration of the whole test, thus API call
+    # with a few samples does not get throughput of its short time span
+    total = total_stats(label_stats)
+    span = (total.start, total.end) if total is not None else None
+    results = dict((key, stats.to_dict(histogram=histograms, span=span)) for key, stats in label_stats.items())
+    if total is not None:
+        results[TOTAL_LABEL] = total.to_dict(histogram=histograms)
+    for source, source_label_stats in source_stats.items():
+        source_total = total_stats(source_label_stats)
+        source_span = (source_total.start, source_total.end) if source_total is not None else None
+        for key, stats in source_label_stats.items():
+            results[key].setdefault('sources', {})[source] = stats.to_dict(span=source_span)
+        if source_total is not None:
+            results[TOTAL_LABEL].setdefault('sources', {})[source] = source_total.to_dict()
+    return results, timeline
+
+
+def check_running_results(label_stats, baseline_dict, deviance_dict, min_samples):
+    """
+    Check results of running test, whether they clearly violate success criteria:
+    success rate is lower than required or deviance of average elapsed time is
+    FOLLOW_ABORT_DEVIANCE_FACTOR times bigger than allowed deviance. Only API
+    calls with at least min_samples samples are checked.
+    :return: Error messages of all violations
+    """
+    result = ""
+    for key, stats in sorted(label_stats.items()):
+        if stats.count < min_samples or key not in deviance_dict:
             continue
+        values = stats.to_dict()
+        result += compare_success_rates(key, values['success_%'], deviance_dict[key]['required_success'])
+        if baseline_dict is not None and key in baseline_dict:
+            result += compare_elapsed_times(
+                key,
+                values['average'],
+                baseline_dict[key]['average'],
+                deviance_dict[key]['allowed_deviance'] * FOLLOW_ABORT_DEVIANCE_FACTOR
+            )
+    return result
+
+
+def follow_csv(input_file, options, baseline_dict, deviance_dict, window=None):
+    """
+    Follow CSV file written by running performance test. New rows are added
+    to accumulators incrementally, summary is logged periodically. The program
+    exits with error, when results clearly violate success criteria.
+    :param input_file: CSV file
+    :param options: command line options
+    :param baseline_dict: dictionary with baseline results or None
+    :param deviance_dict: dictionary with success criteria or None
+    :return: Dictionary label -> LabelStats, when the file stopped growing
+    """
+    tail = JtlTail(input_file)
+    label_stats = {}
+    last_growth = last_summary = time.time()
+    while True:
+        offset = tail.offset
+        aggregate_rows(tail.read_rows(), results=label_stats, window=window)
+        now = time.time()
+        if tail.offset != offset:
+            last_growth = now
+            if deviance_dict is not None:
+                violations = check_running_results(label_stats, baseline_dict, deviance_dict,
+                                                   options.min_samples)
+                if violations != "":
+                    logger.error("Results of running test clearly violate success criteria:\n%s" % violations)
+                    sys.exit(1)
+        if now - last_summary >= options.interval:
+            last_summary = now
+            summary = "".join(
+                "{0}%, {1}ms, {2}ms, {3} calls, {4}\n".format(
+                    values["success_%"], values["average"], values[percentile_key(99)], values["count"], key)
+                for key, values in sorted((key, stats.to_dict()) for key, stats in label_stats.items())
+            )
+            logger.info("Results of running test (success %%, average, p99, calls, API):\n%s" % summary)
+        if now - last_growth >= options.idle_timeout:
+            logger.info("File %s has not grown for %d seconds" % (input_file, options.idle_timeout))
+            return label_stats
+        time.sleep(1)
+
+
+def build_timeline(label_stats, window, steady_state):
+    """
+    Compute throughput, error rate and percentiles of elapsed time of all
+    API calls in time windows
+    :param label_stats: dictionary label -> LabelStats with time windows
+    :param window: length of time window in milliseconds
+    :param steady_state: tuple with starts of the first and the last window of steady state
+    :return: Dictionary with timeline
+    """
+    timeline = {
+        'window_seconds': window / 1000.0,
+        'steady_state': None,
+        'labels': {}
+    }
+    if steady_state is not None:
+        timeline['steady_state'] = {'start': steady_state[0], 'end': steady_state[1] + window}
+    for key, stats in label_stats.items():
+        windows = []
+        for start, window_stats in sorted(stats.windows.items()):
+            window_result = window_stats.to_dict()
+            if steady_state is None or start < steady_state[0]:
+                phase = 'warm-up'
+            elif start > steady_state[1]:
+                phase = 'ramp-down'
+            else:
+                phase = 'steady'
+            window_info = {
+                'timestamp': start,
+                'phase': phase,
+                'count': window_stats.count,
+                'requests_per_s': round(window_stats.count * 1000.0 / window, 2),
+                'error_%': round((window_stats.count - window_stats.success) * 100.0 / window_stats.count, 2),
+                'average': window_result['average'],
+                'max': window_result['max']
+            }
+            for percent in PERCENTILES:
+                window_info[percentile_key(percent)] = window_result[percentile_key(percent)]
+            windows.append(window_info)
+        timeline['labels'][key] = windows
+    return timeline
+
+
+def write_timeline(filename, timeline):
+    """
+    Write timeline to JSON file or to CSV file, when name of the file ends with .csv
+    """
+    if not filename.endswith('.csv'):
+        with open(filename, 'w') as timeline_file:
+            json.dump(timeline, timeline_file, sort_keys=True, indent=2)
+        return
+    columns = ['timestamp', 'phase', 'count', 'requests_per_s', 'error_%', 'average'] + \
+        [percentile_key(percent) for percent in PERCENTILES] + ['max']
+    with open(filename, 'w') as timeline_file:
+        writer = csv.writer(timeline_file)
+        writer.writerow(['label'] + columns)
+        for key, windows in sorted(timeline['labels'].items()):
+            for window_info in windows:
+                writer.writerow([key] + [window_info[column] for column in columns])
 
-        plt.subplot(rows, 2, figure_num)
-        plt.xlabel("Miliseconds")
-        plt.ylabel("Sample Count")
-        plt.title(key + " up to 95 percentile (sample size: {samples})\n avg = {avg}, median = {median}, "
-                        "std_dev={std_dev}, percentile cutoff={percentile}".format(
-                            avg=int(np.average(data_array_minimized)),
-                            median=int(np.median(data_array_minimized)),
-                            std_dev=int(np.std(data_array_minimized)),
-                            percentile=percentile,
-                            samples=len(data_array_minimized)
-                        ))
-        plt.hist(data_array_minimized, bins=bin_size)
-        plt.grid(True)
-        figure_num += 1
 
-    plt.tight_layout()
-    plt.savefig(filename)
+def store_history(filename, test, branch, results, input_files):
+    """
+    Append results to history of results
+    :param filename: name of SQLite database with history
+    :param test: name of performance test
+    :param branch: candlepin branch or version
+    :param results: dictionary with results containing histograms
+    :param input_files: list of parsed results files
+    :return: None
+    """
+    from jtl_history import ResultsHistory
+    history = ResultsHistory(filename)
+    try:
+        run_id = history.add_run(test, branch, results, source=", ".join(input_files))
+    finally:
+        history.close()
+    logger.debug("Results stored in history %s as run %d" % (filename, run_id))
 
 
-def parse_csv(input_file):
+def load_baseline_histograms(filename, test, branch, last):
     """
-    Parse CSV with results of performance test
-    :param input_file: CSV file
-    :return: Dictionary with results
+    Load baseline distributions of elapsed times from history of results
+    :return: dictionary label -> LatencyHistogram merged from the last runs
     """
-    results = {}
-    with open(input_file, 'rb') as f:
-        reader = csv.reader(f)
-        next(reader, None)
-        for row in reader:
-            if row[2] not in results:
-                results[row[2]] = {'count': 0, 'elapsed': 0, 'success': 0, 'data': []}
-            results[row[2]]["count"] += 1
-            results[row[2]]["elapsed"] += int(row[1])
-            if row[7] == "true":
-                results[row[2]]["success"] += 1
-            results[row[2]]['data'].append(row[1])
+    from jtl_history import ResultsHistory
+    history = ResultsHistory(filename)
+    try:
+        return history.merged_histograms(test, branch, last)
+    finally:
+        history.close()
 
-    for key, result in results.items():
-        results[key]["success_%"] = (result["success"] * 100) / result["count"]
-        results[key]["average"] = (result["elapsed"]) / result["count"]
-        results[key]["num_calls"] = len(result['data'])
 
-    return results
+def format_sources(result):
+    """
+    Format results of particular results files (load generators) of one API call
+    :return: Text with one line for every source
+    """
+    output_txt = ""
+    for source, source_result in sorted(result.get('sources', {}).items()):
+        output_txt += "    {0}%, {1}ms, p99 {2}ms, {3} calls, {4}req/s, {5}\n".format(
+            source_result["success_%"],
+            source_result["average"],
+            source_result[percentile_key(99)],
+            source_result["count"],
+            source_result.get("throughput", "??"),
+            source
+        )
+    return output_txt
 
 
-def main():
-    (options, args) = parse_options()
-    input_file = args[0]
-    logger.debug("Opening %s" % input_file)
-    current_results = parse_csv(input_file)
+def run(options, args, profiler):
+    """
+    Parse results files and perform the chosen command
+    :param options: command line options
+    :param args: names or patterns of results files
+    :param profiler: Profiler measuring phases of the run
+    """
+    input_files = expand_input_files(args)
+    logger.debug("Opening %s" % ", ".join(input_files))
+    missing = missing_module(input_files)
+    if missing is not None:
+        logger.error("Reading of compressed file %s requires module %s" % missing)
+        sys.exit(1)
+    if options.follow and os.path.isfile(input_files[0]) and is_compressed(input_files[0]):
+        logger.error("Compressed file %s can not be followed" % input_files[0])
+        sys.exit(1)
+    # Time windows are needed for timeline and detection of warm-up and ramp-down
+    window = None
+    if options.timeline or options.exclude_ramp:
+        window = int(options.window * 1000)
     baseline_data = None
     expected_success_rate = None
 
-    # Load file with baseline results
-    if options.baseline:
-        with open(options.baseline, 'r') as baseline_file:
-            baseline_data = json.load(baseline_file)
-
-    if options.expected:
-        # Load file with expected success rates for all performance tests
-        with open(options.expected, 'r') as expected_success_rate_file:
-            expected_success_rate = json.load(expected_success_rate_file)
-
-    if options.generate_histograms and np and plt:
-        generate_histograms(filename=options.generate_histograms, result_set=current_results)
+    baseline_histograms = {}
+    if options.baseline or options.expected or options.regression_test:
+        with profiler.phase('load-baseline'):
+            # Load file with baseline results
+            if options.baseline:
+                baseline_data = load_json(options.baseline)
+
+            if options.expected:
+                # Load file with expected success rates for all performance tests
+                expected_success_rate = load_json(options.expected)
+
+            # Baseline distributions are loaded before current results can be appended to the same history
+            if options.regression_test:
+                baseline_histograms = load_baseline_histograms(options.baseline_history, options.test,
+                                                               options.branch, options.last)
+    # Histograms of elapsed times are needed by history, regression tests and charts of histograms only
+    histograms = bool(options.history or options.regression_test or options.generate_histograms)
+    samples = None
+    if options.sample_index:
+        samples = SampleIndex(options.top_k, options.max_failed)
+
+    if options.follow:
+        with profiler.phase('follow') as phase:
+            label_stats = follow_csv(input_files[0], options, baseline_data, expected_success_rate,
+                                     window=window)
+            phase.add_rows(sum(stats.count for stats in label_stats.values()))
+        with profiler.phase('summarize') as phase:
+            phase.add_rows(len(label_stats))
+            current_results, timeline = summarize_results(label_stats, {}, window=window,
+                                                          exclude_ramp=options.exclude_ramp,
+                                                          histograms=histograms)
+    else:
+        # Columnar cache and numpy backend require numpy
+        cache = HAS_NUMPY and not options.no_cache
+        backend = options.backend
+        if backend == 'auto':
+            backend = 'numpy' if HAS_NUMPY and numpy_worthwhile(input_files) else 'python'
+        current_results, timeline = parse_csv(input_files, jobs=options.jobs, window=window,
+                                              exclude_ramp=options.exclude_ramp, cache=cache,
+                                              backend=backend, histograms=histograms, profiler=profiler,
+                                              samples=samples)
+    if any('throughput' not in result for result in current_results.values()):
+        logger.warning("Timestamps of results are not in milliseconds since epoch (JMeter property "
+                       "jmeter.save.saveservice.timestamp_format), throughput and timeline are not computed")
+    if samples is not None:
+        with profiler.phase('sample-index') as phase:
+            phase.add_rows(len(samples.labels))
+            with open_output(options.sample_index) as index_file:
+                json.dump(samples.to_dict(), index_file, sort_keys=True, indent=2)
+    if options.history:
+        with profiler.phase('store-history') as phase:
+            phase.add_rows(len(current_results))
+            store_history(options.history, options.test, options.branch, current_results, input_files)
+    # Histograms are not a part of output
+    current_histograms = {}
+    if histograms:
+        for key, result in current_results.items():
+            current_histograms[key] = LatencyHistogram.from_pairs(result.pop('histogram'))
+
+    if options.timeline:
+        with profiler.phase('timeline'):
+            write_timeline(options.timeline, timeline)
+
+    if options.generate_histograms:
+        with profiler.phase('generate-histograms') as phase:
+            phase.add_rows(len(current_results))
+            # Histogram of all API calls has no chart
+            generate_histograms(filename=options.generate_histograms, result_set=current_results,
+                                histograms=dict((key, histogram) for key, histogram in current_histograms.items()
+                                                if key != TOTAL_LABEL))
 
     if options.parse:
         output_txt = json.dumps(current_results, sort_keys=True, indent=2)
     elif options.pretty_print:
+        percentile_keys = [percentile_key(percent) for percent in PERCENTILES] + ['max']
         if options.baseline:
-            output_txt = "success % (baseline %), average time elapsed (baseline), API\n"
+            output_txt = "success % (baseline %), average time elapsed (baseline), " \
+                         "{0} (baseline), throughput (baseline), API\n".format(", ".join(percentile_keys))
         else:
-            output_txt = "success %, average time elapsed, API\n"
+            output_txt = "success %, average time elapsed, {0}, throughput, API\n".format(", ".join(percentile_keys))
         for key, result in sorted(current_results.items()):
             if options.baseline:
                 try:
                     base_result = baseline_data[key]
                 except KeyError:
                     base_result = {"success_%": "??", "average": "??"}
-                output_txt += "{0}% ({1}%), {2}ms ({3}ms), {4}\n".format(
+                percentiles_txt = ", ".join(
+                    "{0}ms ({1}ms)".format(result[p_key], base_result.get(p_key, "??"))
+                    for p_key in percentile_keys
+                )
+                output_txt += "{0}% ({1}%), {2}ms ({3}ms), {4}, {5}req/s ({6}req/s), {7}\n".format(
                     result["success_%"],
                     base_result["success_%"],
                     result["average"],
                     base_result["average"],
+                    percentiles_txt,
+                    result.get("throughput", "??"),
+                    base_result.get("throughput", "??"),
                     key
                 )
+                output_txt += format_sources(result)
             else:
-                output_txt += "{0}%, {1}ms, {2} \n".format(
+                percentiles_txt = ", ".join(
+                    "{0}ms".format(result[p_key]) for p_key in percentile_keys
+                )
+                output_txt += "{0}%, {1}ms, {2}, {3}req/s, {4} \n".format(
                     result["success_%"],
                     result["average"],
+                    percentiles_txt,
+                    result.get("throughput", "??"),
                     key
                 )
+                output_txt += format_sources(result)
     elif options.compare:
 
         # Compare current results with baseline results
-        output_txt, failures = compare_csv(current_results, baseline_data, expected_success_rate)
+        regressions = None
+        if options.regression_test:
+            with profiler.phase('regression-test') as phase:
+                phase.add_rows(len(current_histograms))
+                regressions = test_regressions(current_histograms, baseline_histograms, options)
+        with profiler.phase('compare') as phase:
+            phase.add_rows(len(current_results))
+            output_txt, failures = compare_csv(current_results, baseline_data, expected_success_rate,
+                                               regressions=regressions, samples=samples, gates=options.gates)
 
         # When current results are in limits, then output_txt is empty string
         if failures == 0:
-            print('All results in file: %s are in limits of allowed deviations.' % input_file)
+            print('All results in file: %s are in limits of allowed deviations.' % ", ".join(input_files))
     else:
         return
 
-    # Output results to file or stdout
-    if options.output is not None:
-        output_file = open(options.output, 'w+')
-        output_file.write(str(output_txt))
-    else:
-        print(output_txt)
+    # Output results to file or stdout, the file is compressed, when its name ends with .gz, .xz or .zst
+    with profiler.phase('output'):
+        if options.output is not None:
+            with open_output(options.output) as output_file:
+                output_file.write(str(output_txt))
+        else:
+            print(output_txt)
+
+
+def main():
+    (options, args) = parse_options()
+    profiler = Profiler.from_options(options, 'parse-jtl')
+    try:
+        run(options, args, profiler)
+    finally:
+        profiler.finish()
 
 
 if __name__ == "__main__":
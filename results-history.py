@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2017 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 3 (GPLv3). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv3
+# along with this software; if not, see
+# https://www.gnu.org/licenses/gpl-3.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv3. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+
+"""
+Command line for history of results of performance tests. It imports
+results parsed by parse-jtl.py -p (e.g. existing directory of results)
+and lists runs stored in the history.
+"""
+
+from __future__ import print_function
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+from jtl_compression import load_json
+from jtl_history import ResultsHistory, results_error
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)-7s %(message)s")
+logger = logging.getLogger('results-history')
+
+
+def parse_options():
+    parser = argparse.ArgumentParser(description="History of results of performance tests")
+    parser.add_argument("history", metavar="history.sqlite",
+                        help="SQLite database with history of results")
+    subparsers = parser.add_subparsers(dest="command")
+
+    import_parser = subparsers.add_parser("import", help="Append parsed results (JSON) to history, "
+                                                         "time of modification of file is time of the run")
+    import_parser.add_argument("--test", required=True, dest="test",
+                               help="Name of performance test")
+    import_parser.add_argument("--branch", required=True, dest="branch",
+                               help="Candlepin branch or version")
+    import_parser.add_argument("files", nargs="+",
+                               help="JSON files with results parsed by parse-jtl.py -p")
+
+    list_parser = subparsers.add_parser("list", help="List the last runs of test")
+    list_parser.add_argument("--test", required=True, dest="test",
+                             help="Name of performance test")
+    list_parser.add_argument("--branch", default=None, dest="branch",
+                             help="Candlepin branch or version (default: all branches)")
+    list_parser.add_argument("--last", type=int, default=10, dest="last",
+                             help="Number of the last runs (default: 10)")
+
+    options = parser.parse_args()
+    if options.command is None:
+        parser.error("You have to choose one of the commands: import or list")
+    return options
+
+
+def import_results(history, options):
+    """
+    Append results of JSON files to history, files are imported in the order of their time of modification.
+    All files are checked before the first one is imported.
+    """
+    loaded = []
+    for filename in sorted(options.files, key=os.path.getmtime):
+        try:
+            results = load_json(filename)
+        except ValueError:
+            logger.warning("Skipping %s, it is not JSON file with results" % filename)
+            continue
+        error = results_error(results)
+        if error is not None:
+            logger.error("File %s is not results parsed by parse-jtl.py -p: %s" % (filename, error))
+            sys.exit(1)
+        loaded.append((filename, results))
+    for filename, results in loaded:
+        run_id = history.add_run(options.test, options.branch, results,
+                                 timestamp=os.path.getmtime(filename), source=os.path.basename(filename))
+        logger.info("Imported %s as run %d" % (filename, run_id))
+
+
+def list_runs(history, options):
+    """
+    Print the last runs of test
+    """
+    for run_id, test, branch, timestamp, source in history.last_runs(options.test, options.branch, options.last):
+        print("{0}, {1}, {2}, {3}, {4}".format(
+            run_id, test, branch, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp)), source))
+
+
+def main():
+    options = parse_options()
+    history = ResultsHistory(options.history)
+    try:
+        {
+            'import': import_results,
+            'list': list_runs
+        }[options.command](history, options)
+    finally:
+        history.close()
+
+
+if __name__ == '__main__':
+    main()
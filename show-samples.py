@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2017 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 3 (GPLv3). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv3
+# along with this software; if not, see
+# https://www.gnu.org/licenses/gpl-3.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv3. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+
+"""
+Drill-down to the slowest and failed samples of API calls stored in index
+of samples written by parse-jtl.py --sample-index. Original rows of results
+files are read directly at offsets of the samples.
+"""
+
+from __future__ import print_function
+
+import argparse
+import logging
+import os
+import sys
+
+from jtl_compression import missing_module, load_json
+from jtl_samples import format_sample, read_lines_at
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)-7s %(message)s")
+logger = logging.getLogger('show-samples')
+
+
+def parse_options():
+    parser = argparse.ArgumentParser(description="Show the slowest and failed samples of API calls")
+    parser.add_argument("sample_index",
+                        help="Index of samples written by parse-jtl.py --sample-index")
+    parser.add_argument("-l", "--label", default=None, action="append", dest="labels",
+                        help="API call to show, can be used more times (default: all API calls)")
+    parser.add_argument("-n", "--count", default=None, type=int, dest="count",
+                        help="Number of shown samples of both kinds per API call (default: all indexed samples)")
+    parser.add_argument("--failed", default=False, action="store_true", dest="failed",
+                        help="Show only failed samples")
+    parser.add_argument("--rows", default=False, action="store_true", dest="rows",
+                        help="Show original rows of samples read from results files")
+    options = parser.parse_args()
+    if options.count is not None and options.count < 0:
+        parser.error("Number of samples can not be negative.")
+    return options
+
+
+def read_rows(samples):
+    """
+    Read original rows of samples, every results file is opened only once
+    :param samples: list of dictionaries with samples
+    :return: dictionary (file, offset) -> row
+    """
+    offsets = {}
+    for sample in samples:
+        offsets.setdefault(sample['file'], []).append(sample['offset'])
+    rows = {}
+    for filename, file_offsets in offsets.items():
+        if not os.path.isfile(filename):
+            logger.warning("Results file %s does not exist, its rows are not shown" % filename)
+            continue
+        for offset, line in read_lines_at(filename, file_offsets).items():
+            rows[(filename, offset)] = line
+    return rows
+
+
+def main():
+    options = parse_options()
+    index = load_json(options.sample_index)
+    labels = options.labels or sorted(index['labels'])
+    unknown = [label for label in labels if label not in index['labels']]
+    if unknown:
+        logger.error("API calls not found in index of samples: %s" % ", ".join(unknown))
+        sys.exit(1)
+
+    shown = []
+    for label in labels:
+        label_samples = index['labels'][label]
+        slowest = [] if options.failed else label_samples['slowest'][:options.count]
+        failed = label_samples['failed'][:options.count]
+        shown.append((label, label_samples['failed_count'], slowest, failed))
+
+    rows = {}
+    if options.rows:
+        missing = missing_module(index['files'])
+        if missing is not None:
+            logger.error("Reading of compressed file %s requires module %s" % missing)
+            sys.exit(1)
+        rows = read_rows([sample for _, _, slowest, failed in shown for sample in slowest + failed])
+
+    for label, failed_count, slowest, failed in shown:
+        print("API call: %s, %d failed samples" % (label, failed_count))
+        for kind, samples in (("slowest", slowest), ("failed", failed)):
+            for sample in samples:
+                print("  %s: %s" % (kind, format_sample(sample)))
+                if (sample['file'], sample['offset']) in rows:
+                    print("    %s" % rows[(sample['file'], sample['offset'])])
+
+
+if __name__ == '__main__':
+    main()
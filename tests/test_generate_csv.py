@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2017 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 3 (GPLv3). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv3
+# along with this software; if not, see
+# https://www.gnu.org/licenses/gpl-3.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv3. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+
+"""
+Tests of cache of csvs of generate-csv.py (Python 2 only) with fake database
+"""
+
+import argparse
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+if sys.version_info[0] == 2:
+    import imp
+    generate_csv = imp.load_source('generate_csv', os.path.join(ROOT, 'generate-csv.py'))
+
+# Owners of the fake database
+OWNERS = [str(owner) for owner in range(100, 115)]
+
+
+class FakeConnection(object):
+    """
+    Connection to fake database. Queries without ORDER BY return owners in
+    an order, which differs between connections, like a real database can.
+    """
+
+    def __init__(self, reverse):
+        self.reverse = reverse
+        self.excluded = set()
+
+    def close(self):
+        pass
+
+
+@unittest.skipIf(sys.version_info[0] != 2, "generate-csv.py requires Python 2")
+class SerialCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.csvs = [{'name': os.path.join(self.directory, 'csv%d.csv' % number), 'limit': '5',
+                      'projection': 'o.account', 'from': 'cp_owner o', 'owner_id_column': 'o.id'}
+                     for number in range(3)]
+        self.options = argparse.Namespace(snapshot='snapshot', type='mysql', database='candlepin', limit=5,
+                                          batch_size=1000)
+        self.cache = generate_csv.CsvCache(os.path.join(self.directory, 'cache'), 1024 * 1024)
+        self.connections = 0
+        self.generated = []
+        self.patched = dict((name, getattr(generate_csv, name)) for name in
+                            ('get_connection', 'create_excluded_owners_table', 'exclude_owners', 'write_csv'))
+        generate_csv.get_connection = self.get_connection
+        generate_csv.create_excluded_owners_table = lambda conn: None
+        generate_csv.exclude_owners = lambda conn, owner_ids, batch_size: conn.excluded.update(owner_ids)
+        generate_csv.write_csv = self.write_csv
+
+    def tearDown(self):
+        for name, function in self.patched.items():
+            setattr(generate_csv, name, function)
+        shutil.rmtree(self.directory)
+
+    def get_connection(self, options):
+        self.connections += 1
+        return FakeConnection(reverse=self.connections % 2 == 0)
+
+    def write_csv(self, conn, options, number, file_name, query):
+        owners = sorted(OWNERS, reverse=conn.reverse)
+        owner_ids = [owner for owner in owners if owner not in conn.excluded][:5]
+        with open(file_name, 'wb') as f:
+            writer = csv.writer(f, lineterminator="\n")
+            writer.writerow(['account', 'id'])
+            writer.writerows([('account-' + owner, owner) for owner in owner_ids])
+        self.generated.append(number)
+        return set(owner_ids), len(owner_ids)
+
+    def owner_sets(self):
+        return [generate_csv.read_owner_ids(csv_config['name']) for csv_config in self.csvs]
+
+    def assert_disjoint(self):
+        owner_sets = self.owner_sets()
+        for first in range(len(owner_sets)):
+            for second in range(first + 1, len(owner_sets)):
+                self.assertEqual(owner_sets[first] & owner_sets[second], set())
+
+    def cached_files(self):
+        return [os.path.join(self.cache.directory, name) for name in os.listdir(self.cache.directory)]
+
+    def test_all_restored(self):
+        generate_csv.generate_serially(self.csvs, self.options, self.cache)
+        self.assertEqual(self.generated, [0, 1, 2])
+        first_owners = self.owner_sets()
+        generate_csv.generate_serially(self.csvs, self.options, self.cache)
+        self.assertEqual(self.generated, [0, 1, 2])
+        self.assertEqual(self.owner_sets(), first_owners)
+        self.assert_disjoint()
+
+    def test_evicted_head_of_chain(self):
+        generate_csv.generate_serially(self.csvs, self.options, self.cache)
+        self.assert_disjoint()
+        # The head of the chain is the least recently used csv
+        head_owners = self.owner_sets()[0]
+        for age, path in enumerate(sorted(self.cached_files(),
+                                          key=lambda path: generate_csv.read_owner_ids(path) != head_owners)):
+            os.utime(path, (1000 + age, 1000 + age))
+        max_size = self.cache.max_size
+        self.cache.max_size = sum(os.path.getsize(path) for path in self.cached_files()) - 1
+        self.cache.evict()
+        self.cache.max_size = max_size
+        self.assertEqual(len(self.cached_files()), 2)
+        self.assertFalse(head_owners in [generate_csv.read_owner_ids(path) for path in self.cached_files()])
+
+        # Regenerated head uses other owners, thus following csvs can not be restored
+        generate_csv.generate_serially(self.csvs, self.options, self.cache)
+        self.assertNotEqual(self.owner_sets()[0], head_owners)
+        self.assert_disjoint()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2017 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 3 (GPLv3). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv3
+# along with this software; if not, see
+# https://www.gnu.org/licenses/gpl-3.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv3. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+
+"""
+Tests of history of results
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from jtl_history import ResultsHistory, results_error
+
+RESULT = {'count': 10, 'success': 9, 'average': 120, 'success_%': 90, 'p99': 300}
+
+
+class ImportResultsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.history = os.path.join(self.directory, 'history.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_json(self, name, data):
+        filename = os.path.join(self.directory, name)
+        with open(filename, 'w') as json_file:
+            json.dump(data, json_file)
+        return filename
+
+    def import_files(self, *filenames):
+        process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'results-history.py'), self.history,
+                                    'import', '--test', 'test', '--branch', 'master'] + list(filenames),
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        _, error = process.communicate()
+        return process.returncode, error.decode('utf-8')
+
+    def test_results_error(self):
+        self.assertIsNone(results_error({'GET x': RESULT, 'TOTAL': RESULT}))
+        self.assertIsNotNone(results_error([RESULT]))
+        self.assertIsNotNone(results_error({}))
+        self.assertIsNotNone(results_error({'GET x': 5}))
+        self.assertIn('average', results_error({'GET x': {'count': 10, 'success': 9, 'success_%': 90}}))
+
+    def test_invalid_results_not_imported(self):
+        valid = self.write_json('valid.json', {'GET x': RESULT})
+        invalid = self.write_json('invalid.json', {'version': 1, 'window': 10})
+        returncode, error = self.import_files(valid, invalid)
+        self.assertEqual(returncode, 1)
+        self.assertIn('invalid.json is not results', error)
+        self.assertNotIn('Traceback', error)
+        history = ResultsHistory(self.history)
+        try:
+            self.assertEqual(history.last_runs('test'), [])
+        finally:
+            history.close()
+
+        returncode, _ = self.import_files(valid)
+        self.assertEqual(returncode, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2017 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 3 (GPLv3). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv3
+# along with this software; if not, see
+# https://www.gnu.org/licenses/gpl-3.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv3. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+
+"""
+Tests of histograms of elapsed times computed from LatencyHistogram
+"""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import numpy as np
+    import jtl_report
+except ImportError:
+    np = None
+
+from jtl_stats import LatencyHistogram
+
+
+def histogram_of(values):
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.add(value)
+    return histogram
+
+
+@unittest.skipIf(np is None, "histograms require numpy")
+class ComputePageTest(unittest.TestCase):
+
+    def test_exact_buckets(self):
+        # Values lower than SUB_BUCKET_COUNT have buckets of width 1, thus charts are exact
+        values = [random.Random(1).randint(3, 120) for _ in range(1000)]
+        page = jtl_report.compute_page('GET x', histogram_of(values), min(values), max(values))
+        counts, edges = np.histogram(values, bins=jtl_report.BIN_COUNT)
+        self.assertEqual(page['charts'][0]['counts'], counts.tolist())
+        self.assertEqual(page['charts'][0]['edges'], edges.tolist())
+        self.assertIn("avg = %d, median = %d, std_dev=%d" % (
+            np.average(values), np.median(values), np.std(values)), page['charts'][0]['title'])
+
+    def test_wide_buckets(self):
+        generator = random.Random(2)
+        values = [int(generator.expovariate(1 / 300.0)) + 1 for _ in range(5000)]
+        histogram = histogram_of(values)
+        page = jtl_report.compute_page('GET x', histogram, min(values), max(values))
+        all_chart, minimized_chart = page['charts']
+        self.assertEqual(sum(all_chart['counts']), len(values))
+        self.assertEqual(all_chart['edges'][0], min(values))
+        self.assertEqual(all_chart['edges'][-1], max(values))
+        # Bins are off at most by samples of buckets split by edges of bins
+        counts = np.histogram(values, bins=jtl_report.BIN_COUNT)[0]
+        self.assertLessEqual(np.abs(np.asarray(all_chart['counts']) - counts).max(), len(values) * 0.01)
+        # Outliers over 95 percentile are removed
+        self.assertLess(minimized_chart['edges'][-1], histogram.percentile(95))
+        self.assertAlmostEqual(sum(minimized_chart['counts']), len(values) * 0.95, delta=len(values) * 0.01)
+
+    def test_single_value(self):
+        page = jtl_report.compute_page('GET x', histogram_of([500] * 3), 500, 500)
+        self.assertEqual(sum(page['charts'][0]['counts']), 3)
+        self.assertEqual(len(page['charts']), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2017 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 3 (GPLv3). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv3
+# along with this software; if not, see
+# https://www.gnu.org/licenses/gpl-3.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv3. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+
+"""
+Tests of streaming aggregation of JTL results
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jtl_stats import LatencyHistogram, TIMESTAMP, ELAPSED, aggregate_files, aggregate_rows, detect_steady_state, \
+    total_stats, trim_results
+
+try:
+    import numpy as np
+    import jtl_columns
+except ImportError:
+    np = None
+
+WINDOW = 1000
+
+
+def row(timestamp, elapsed, label='GET x', success=True):
+    """Return row of JTL file in the default JMeter CSV output"""
+    return [str(timestamp), str(elapsed), label, '200', 'OK', 'thread-1', 'text', 'true' if success else 'false']
+
+
+class LatencyHistogramTest(unittest.TestCase):
+
+    def test_bucket_width(self):
+        widths = []
+        for value in list(range(70000)) + [2 ** 31 - 1, 2 ** 40 + 12345]:
+            lowest, highest = LatencyHistogram.bucket_range(LatencyHistogram.bucket_index(value))
+            self.assertTrue(lowest <= value <= highest)
+            if value < LatencyHistogram.SUB_BUCKET_COUNT:
+                self.assertEqual(lowest, highest)
+            else:
+                widths.append((highest - lowest + 1) / float(lowest))
+        # The bound is reached by the lowest buckets of every power of two
+        self.assertEqual(max(widths), 1.0 / 2 ** LatencyHistogram.SUB_BUCKET_HALF_BITS)
+        self.assertEqual(max(widths), 1.0 / 64)
+
+    def test_percentile_error(self):
+        generator = random.Random(3)
+        values = sorted(int(generator.lognormvariate(6, 1.5)) for _ in range(10000))
+        histogram = LatencyHistogram()
+        for value in values:
+            histogram.add(value)
+        for percent in (1, 50, 90, 99, 99.9, 100):
+            exact = values[int(max(1, -(-len(values) * percent // 100))) - 1]
+            self.assertLessEqual(abs(histogram.percentile(percent) - exact), exact / 128.0)
+
+
+class ExcludeRampTest(unittest.TestCase):
+
+    def setUp(self):
+        # Slow samples of warm-up and ramp-down windows with low throughput
+        rows = [row(0, 5000), row(500, 4000)]
+        for window in range(1, 6):
+            rows.extend(row(window * WINDOW + number * 50, 100 + number) for number in range(10))
+        rows.append(row(6 * WINDOW, 9000))
+        self.rows = rows
+        self.results = aggregate_rows(rows, window=WINDOW)
+
+    def test_ramp_samples_excluded(self):
+        steady_state = detect_steady_state(self.results)
+        self.assertEqual(steady_state, (WINDOW, 5 * WINDOW))
+        stats = trim_results(self.results, *steady_state)['GET x']
+        self.assertEqual(stats.count, 50)
+        self.assertEqual(stats.histogram.total, 50)
+        self.assertEqual(max(stats.histogram.counts), LatencyHistogram.bucket_index(109))
+        result = stats.to_dict(histogram=True)
+        self.assertEqual(result['max'], 109)
+        self.assertEqual(result['p99.9'], 109)
+        self.assertEqual(sum(count for _, count in result['histogram']), 50)
+
+    @unittest.skipIf(np is None, "numpy backend requires numpy")
+    def test_numpy_backend(self):
+        results = jtl_columns.aggregate_columns(
+            ['GET x'], np.zeros(len(self.rows), dtype=np.int64),
+            np.asarray([int(r[ELAPSED]) for r in self.rows], dtype=np.int32),
+            np.asarray([int(r[TIMESTAMP]) for r in self.rows], dtype=np.int64),
+            np.ones(len(self.rows), dtype=bool), window=WINDOW)
+        expected = trim_results(self.results, WINDOW, 5 * WINDOW)['GET x'].to_dict(histogram=True)
+        self.assertEqual(trim_results(results, WINDOW, 5 * WINDOW)['GET x'].to_dict(histogram=True), expected)
+
+    def test_untrimmed_results_unchanged(self):
+        trim_results(self.results, WINDOW, 5 * WINDOW)
+        stats = self.results['GET x']
+        self.assertEqual(stats.count, 53)
+        self.assertEqual(stats.histogram.total, 53)
+        self.assertEqual(stats.max, 9000)
+
+
+class ThroughputTest(unittest.TestCase):
+
+    def setUp(self):
+        rows = [row(number * 100, 50) for number in range(100)]
+        rows.append(row(5000, 200, label='GET y'))
+        self.results = aggregate_rows(rows)
+        self.total = total_stats(self.results)
+        self.span = (self.total.start, self.total.end)
+
+    def test_single_sample(self):
+        # Throughput of one sample is not 1000 / elapsed time
+        result = self.results['GET y'].to_dict(span=self.span)
+        self.assertEqual(result['throughput'], 0.1005)
+        self.assertEqual(result['concurrency'], 0.0201)
+        self.assertEqual(self.results['GET y'].to_dict()['throughput'], 5.0)
+
+    def test_low_rates_not_quantized(self):
+        # Rates lower than 1 req/s keep significant digits instead of two decimal places
+        rates = [self.results['GET y'].to_dict(span=(0, duration))['throughput'] for duration in (40000, 47000, 60000)]
+        self.assertEqual(rates, [0.025, 0.02128, 0.01667])
+
+    def test_labels_add_up_to_total(self):
+        results = [stats.to_dict(span=self.span) for stats in self.results.values()]
+        total = self.total.to_dict()
+        # Values are rounded to 4 significant digits
+        self.assertAlmostEqual(sum(result['throughput'] for result in results), total['throughput'],
+                               delta=total['throughput'] * 1e-3)
+        self.assertAlmostEqual(sum(result['concurrency'] for result in results), total['concurrency'],
+                               delta=total['concurrency'] * 1e-3)
+
+
+class FormattedTimestampTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rows = [row('2017/07/14 02:40:00.%03d' % number, 100 + number) for number in range(20)]
+
+    def test_aggregated_without_timestamps(self):
+        stats = aggregate_rows(self.rows, window=WINDOW)['GET x']
+        self.assertEqual(stats.count, 20)
+        self.assertEqual(stats.windows, {})
+        result = stats.to_dict()
+        self.assertEqual(result['max'], 119)
+        self.assertNotIn('throughput', result)
+
+    @unittest.skipIf(np is None, "numpy backend requires numpy")
+    def test_numpy_backend_falls_back(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'results.jtl')
+            with open(filename, 'w') as jtl_file:
+                jtl_file.write('timeStamp,elapsed,label,responseCode,responseMessage,threadName,dataType,success\n')
+                jtl_file.writelines(','.join(r) + '\n' for r in self.rows)
+            results = aggregate_files([filename], backend='numpy', cache=True)[0]
+            self.assertEqual(results['GET x'].count, 20)
+            self.assertEqual(os.listdir(directory), ['results.jtl'])
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
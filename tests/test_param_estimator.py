@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2017 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 3 (GPLv3). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv3
+# along with this software; if not, see
+# https://www.gnu.org/licenses/gpl-3.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv3. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+
+"""
+Tests of estimation of baseline and allowed deviances
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import param_estimator
+
+
+def api_call_result(average, count=100, success=98, throughput=50.0):
+    return {'count': count, 'success': success, 'success_%': success * 100 // count, 'average': average,
+            'p99': average * 3, 'throughput': throughput, 'concurrency': average * throughput / 1000.0}
+
+
+class EstimatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.results_directory = os.path.join(self.directory, 'results')
+        os.mkdir(self.results_directory)
+        self.results = []
+        for run, average in enumerate([100, 110, 95, 105, 180]):
+            filename = os.path.join(self.results_directory, 'run-%d.json' % run)
+            with open(filename, 'w') as result_file:
+                json.dump({'GET x': api_call_result(average)}, result_file)
+            self.results.append(filename)
+        self.output = os.path.join(self.directory, 'output.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def estimate(self, *args):
+        options = param_estimator.parse_options(list(args) + ['-o', self.output])
+        param_estimator.Estimator(options).perform()
+        with open(self.output) as output_file:
+            return json.load(output_file)
+
+    def test_confidence_interval_only_with_bootstrap(self):
+        baseline = self.estimate('-d', self.results_directory, '-t', 'baseline')
+        self.assertEqual(baseline['GET x']['average'], 123.0)
+        self.assertNotIn('confidence_interval', baseline['GET x'])
+        baseline = self.estimate('-d', self.results_directory, '-t', 'baseline', '--bootstrap', '100')
+        self.assertEqual(baseline['GET x']['average'], 123.0)
+        lower, upper = baseline['GET x']['confidence_interval']['average']
+        self.assertTrue(lower <= 118.0 <= upper)
+
+
+    def add_to_state(self, *results):
+        args = ['--state', os.path.join(self.directory, 'state.json'), '-t', 'baseline']
+        for filename in results:
+            args.extend(['--add', filename])
+        return self.estimate(*args)
+
+    def test_state_skips_added_results(self):
+        self.add_to_state(*self.results[:3])
+        # The third result is added again
+        baseline = self.add_to_state(*self.results[2:])
+        self.assertEqual(baseline, self.add_to_state())
+        with open(os.path.join(self.directory, 'state.json')) as state_file:
+            state = json.load(state_file)
+        self.assertEqual(state['api_calls']['GET x']['average']['count'], 5)
+        self.assertEqual(len(state['sources']), 5)
+        self.assertEqual(baseline['GET x']['average'], 123.0)
+
+    def test_state_rejects_invalid_results(self):
+        invalid = os.path.join(self.directory, 'invalid.json')
+        with open(invalid, 'w') as invalid_file:
+            json.dump({'version': 2, 'window': 10}, invalid_file)
+        with self.assertRaises(SystemExit):
+            self.add_to_state(invalid)
+        self.assertFalse(os.path.exists(os.path.join(self.directory, 'state.json')))
+
+    def test_state_window_mismatch(self):
+        self.add_to_state(*self.results)
+        with self.assertRaises(SystemExit):
+            self.estimate('--state', os.path.join(self.directory, 'state.json'), '--window', '3')
+
+
+    def test_throughput_deviance_below_one(self):
+        # Rates of API calls lower than 1 req/s differ by about 40 %
+        low_rates_directory = os.path.join(self.directory, 'low-rates')
+        os.mkdir(low_rates_directory)
+        low_rates = []
+        for run, throughput in enumerate([0.02, 0.03, 0.025, 0.03]):
+            filename = os.path.join(low_rates_directory, 'run-%d.json' % run)
+            with open(filename, 'w') as result_file:
+                json.dump({'GET x': api_call_result(100, throughput=throughput)}, result_file)
+            low_rates.append(filename)
+        deviances = self.estimate('-d', low_rates_directory)
+        # Maximal deviance of 0.02 req/s from mean 0.02625 req/s plus margin
+        self.assertAlmostEqual(deviances['GET x']['allowed_throughput_deviance'], 36.25, places=1)
+        self.assertAlmostEqual(deviances['GET x']['allowed_concurrency_deviance'], 36.25, places=1)
+        self.add_to_state(*low_rates)
+        deviances = self.estimate('--state', os.path.join(self.directory, 'state.json'))
+        self.assertGreater(deviances['GET x']['allowed_throughput_deviance'], 50.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
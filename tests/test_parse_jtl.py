@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+#
+# Copyright (c) 2017 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 3 (GPLv3). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv3
+# along with this software; if not, see
+# https://www.gnu.org/licenses/gpl-3.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv3. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+
+"""
+Tests of comparison of results with baseline and success criteria
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Success rate and average elapsed time are in limits, tail latency, throughput
+# and results of all API calls together are not
+BASELINE = {
+    'GET x': {'average': 100, 'success_%': 100.0, 'p99': 100, 'throughput': 100.0},
+    'TOTAL': {'average': 10, 'success_%': 100.0},
+}
+EXPECTED = {
+    'GET x': {'required_success': 95.0, 'allowed_deviance': 10.0,
+              'allowed_percentile_deviance': {'p99': 10.0}, 'allowed_throughput_deviance': 10.0},
+    'TOTAL': {'required_success': 95.0, 'allowed_deviance': 10.0},
+}
+
+
+class GateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.results = os.path.join(self.directory, 'results.jtl')
+        with open(self.results, 'w') as jtl_file:
+            jtl_file.write('timeStamp,elapsed,label,responseCode,responseMessage,threadName,dataType,success\n')
+            for number in range(100):
+                elapsed = 500 if number in (25, 75) else 100
+                jtl_file.write('%d,%d,GET x,200,OK,thread-1,text,true\n' % (number * 100, elapsed))
+        for name, data in (('baseline.json', BASELINE), ('expected.json', EXPECTED)):
+            with open(os.path.join(self.directory, name), 'w') as json_file:
+                json.dump(data, json_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def compare(self, *gates):
+        command = [sys.executable, os.path.join(ROOT, 'parse-jtl.py'), '-c', self.results, '-n',
+                   '-b', os.path.join(self.directory, 'baseline.json'),
+                   '-e', os.path.join(self.directory, 'expected.json')]
+        for gate in gates:
+            command.extend(['--gate', gate])
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output, _ = process.communicate()
+        self.assertEqual(process.returncode, 0)
+        return output.decode('utf-8')
+
+    def test_not_gated_by_default(self):
+        output = self.compare()
+        self.assertIn('are in limits of allowed deviations', output)
+        self.assertNotIn('TOTAL', output)
+
+    def test_gated(self):
+        output = self.compare('percentiles')
+        self.assertIn('[FAILED] current p99', output)
+        self.assertNotIn('throughput', output)
+        output = self.compare('throughput', 'total')
+        self.assertIn('[FAILED] current throughput', output)
+        self.assertIn('API call: TOTAL', output)
+        self.assertNotIn('p99', output)
+
+
+if __name__ == '__main__':
+    unittest.main()